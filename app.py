@@ -6,6 +6,8 @@ import soltura
 import ipk
 import viabilidade
 import receita
+import historico
+import armazem
 
 # Configuração da página
 st.set_page_config(layout="wide")
@@ -17,6 +19,10 @@ if "pagina" not in st.session_state:
 def voltar_home():
     st.session_state.pagina = "home"
 
+def abrir_execucao(id_execucao):
+    st.session_state.execucao = id_execucao
+    st.session_state.pagina = "historico"
+
 # =========================
 # Tela inicial (HUB)
 # =========================
@@ -44,6 +50,17 @@ if st.session_state.pagina == "home":
         if st.button("📊 Fechamento", use_container_width=True):
             st.session_state.pagina = "receita"
 
+    # Execuções salvas: reabrem os resultados sem reprocessar os arquivos
+    st.markdown("---")
+    st.markdown("### 🕘 Execuções recentes")
+    historico.exibir_recentes(abrir_execucao)
+
+    # Armazém histórico: dados guardados pelos relatórios, consultados por período
+    st.markdown("---")
+    st.markdown("### 🗄️ Armazém histórico")
+    if st.button("Consultar o armazém"):
+        st.session_state.pagina = "armazem"
+
 # =========================
 # Relatórios
 # =========================
@@ -70,3 +87,11 @@ elif st.session_state.pagina == "viabilidade":
 elif st.session_state.pagina == "receita":
     st.button("⬅️ Voltar", on_click=voltar_home)
     receita.main()
+
+elif st.session_state.pagina == "historico":
+    st.button("⬅️ Voltar", on_click=voltar_home)
+    historico.exibir_execucao(st.session_state.get("execucao"))
+
+elif st.session_state.pagina == "armazem":
+    st.button("⬅️ Voltar", on_click=voltar_home)
+    armazem.exibir_armazem()
@@ -0,0 +1,280 @@
+import datetime
+import functools
+import glob
+import os
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+import formatacao
+import historico
+
+try:
+    import duckdb
+except ImportError:  # opcional: sem o DuckDB, as consultas do armazém são feitas com pandas
+    duckdb = None
+
+# ---------------- Armazém histórico ----------------
+# Os dados processados de cada relatório podem ser guardados em um armazém local e
+# colunar, que vai acumulando mês a mês: uma tabela por relatório, em Parquet
+# particionado por mês (armazem/<tabela>/mes=AAAA-MM/<origem>.parquet, onde origem é o
+# hash dos arquivos de entrada). Guardar de novo os mesmos arquivos substitui o que eles
+# tinham gravado, então nada é contado duas vezes.
+#
+# As consultas por período rodam em SQL com o DuckDB (embutido, lê os Parquet direto e
+# só as partições do período) quando ele está instalado (duckdb>=1.1, que permite isolar
+# a conexão na pasta do armazém). Sem ele, ou em versão que não aceita o isolamento, o
+# mesmo resumo mensal é feito com pandas lendo as partições do período; só a consulta SQL
+# livre fica de fora.
+#
+# Uso nos relatórios:
+#     armazem.exibir_guardar('km', lambda: agregar_diario(df), arquivo)
+
+PASTA_ARMAZEM = os.environ.get("SEMOB_ARMAZEM", "armazem")
+
+# Tabelas do armazém: grão guardado (dimensões) e métricas somáveis.
+# Tabelas com coluna 'Data' são particionadas pelas datas; as demais pelo mês de referência informado.
+TABELAS = {
+    "km": {
+        "nome": "📊 Quilometragem (dia x operadora x tipo de veículo)",
+        "dimensoes": ["Nome Operadora", "Desc. Tipo Veículo"],
+        "metricas": ["Km Percorrido", "Passageiros", "Viagens"],
+    },
+    "mco": {
+        "nome": "🚌 Passagens de Ônibus (mês x operadora x linha)",
+        "dimensoes": ["Nome Operadora", "Nome Linha"],
+        "metricas": ["Inteiras", "VT", "VT Integração", "Gratuidade", "Passagens",
+                     "Passagens Integração", "Estudantes", "Estudantes Integração"],
+    },
+    "receita": {
+        "nome": "📊 Fechamento (mês x operadora)",
+        "dimensoes": ["Nome Operadora"],
+        "metricas": ["Receita (R$)", "Total Passageiros", "Passageiro Equivalente"],
+    },
+    "viabilidade": {
+        "nome": "📊 Viabilidade (dia x hora x linha)",
+        "dimensoes": ["Código Externo Linha", "Hora"],
+        "metricas": ["Passageiros"],
+    },
+}
+
+def _pasta_tabela(tabela):
+    return os.path.join(PASTA_ARMAZEM, tabela)
+
+def _particao(tabela, mes):
+    return os.path.join(_pasta_tabela(tabela), f"mes={mes}")
+
+def guardar(tabela, df, origem, mes=None):
+    """
+    Grava os dados no armazém (substituindo o que a mesma origem tinha gravado).
+    Sem mes, o DataFrame precisa da coluna 'Data' e é dividido pelos meses dela.
+    Retorna os meses gravados.
+    """
+    for caminho in glob.glob(os.path.join(_pasta_tabela(tabela), "mes=*", f"{origem}.parquet")):
+        os.remove(caminho)
+
+    if mes is None:
+        grupos = df.groupby(df["Data"].dt.strftime("%Y-%m"))
+    else:
+        grupos = [(mes, df)]
+
+    meses = []
+    for mes_grupo, dados in grupos:
+        pasta = _particao(tabela, mes_grupo)
+        os.makedirs(pasta, exist_ok=True)
+        caminho = os.path.join(pasta, f"{origem}.parquet")
+        temporario = caminho + ".tmp"
+        dados.reset_index(drop=True).to_parquet(temporario, index=False)
+        os.replace(temporario, caminho)
+        meses.append(mes_grupo)
+    return meses
+
+def meses_disponiveis(tabela):
+    """Meses (AAAA-MM) com dados guardados na tabela, em ordem."""
+    return sorted(
+        os.path.basename(pasta).split("=", 1)[1]
+        for pasta in glob.glob(os.path.join(_pasta_tabela(tabela), "mes=*"))
+        if glob.glob(os.path.join(pasta, "*.parquet"))
+    )
+
+def tabelas_disponiveis():
+    """Tabelas do armazém que já têm algum dado guardado."""
+    return [tabela for tabela in TABELAS if meses_disponiveis(tabela)]
+
+# ---------------- Consultas ----------------
+def _isolar(conexao):
+    """Restringe a conexão à pasta do armazém: sem outros arquivos, rede ou extensões, e com a configuração travada."""
+    conexao.execute("SET allowed_directories = ?", [[os.path.abspath(PASTA_ARMAZEM)]])
+    conexao.execute("SET enable_external_access = false")
+    conexao.execute("SET lock_configuration = true")
+
+@functools.lru_cache(maxsize=1)
+def sql_disponivel():
+    """True se o DuckDB está instalado e aceita o isolamento da conexão (duckdb>=1.1)."""
+    if duckdb is None:
+        return False
+    conexao = duckdb.connect()
+    try:
+        _isolar(conexao)
+        return True
+    except duckdb.Error:
+        return False
+    finally:
+        conexao.close()
+
+def conectar():
+    """
+    Conexão DuckDB em memória com uma visão por tabela do armazém (sobre os Parquet).
+    Depois das visões criadas, a conexão só enxerga a pasta do armazém; se o DuckDB
+    instalado não aceita esse isolamento, nenhuma conexão é devolvida (RuntimeError).
+    """
+    if duckdb is None:
+        raise RuntimeError("DuckDB não está instalado (pip install duckdb)")
+    conexao = duckdb.connect()
+    try:
+        for tabela in tabelas_disponiveis():
+            arquivos = os.path.join(_pasta_tabela(tabela), "*", "*.parquet").replace("'", "''")
+            conexao.execute(
+                f"CREATE VIEW {tabela} AS SELECT * FROM read_parquet('{arquivos}', "
+                "hive_partitioning = true, hive_types = {'mes': VARCHAR}, union_by_name = true)"
+            )
+        _isolar(conexao)
+    except duckdb.Error as e:
+        conexao.close()
+        raise RuntimeError(f"não foi possível isolar a conexão do DuckDB (requer duckdb>=1.1): {e}") from e
+    return conexao
+
+def consultar(sql, parametros=None):
+    """
+    Roda uma consulta SQL sobre o armazém (tabelas: km, mco, receita, viabilidade) e devolve
+    um DataFrame. Só é aceito um único comando SELECT.
+    """
+    conexao = conectar()
+    try:
+        comandos = conexao.extract_statements(sql)
+        if len(comandos) != 1 or comandos[0].type != duckdb.StatementType.SELECT:
+            raise ValueError("apenas um único comando SELECT é permitido")
+        return conexao.execute(sql, parametros or []).df()
+    finally:
+        conexao.close()
+
+def _ler_periodo(tabela, inicio, fim):
+    """Sem DuckDB: lê só as partições do período, com a coluna mes."""
+    partes = []
+    for mes in meses_disponiveis(tabela):
+        if inicio <= mes <= fim:
+            for caminho in sorted(glob.glob(os.path.join(_particao(tabela, mes), "*.parquet"))):
+                partes.append(pd.read_parquet(caminho).assign(mes=mes))
+    return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=["mes"])
+
+def resumo_mensal(tabela, inicio, fim, dimensao=None):
+    """Soma das métricas por mês (e pela dimensão, se informada) entre os meses inicio e fim (AAAA-MM)."""
+    chaves = ["mes"] + ([dimensao] if dimensao else [])
+
+    if sql_disponivel():
+        conexao = conectar()
+        try:
+            colunas = set(conexao.execute(f"SELECT * FROM {tabela} LIMIT 0").df().columns)
+            metricas = [m for m in TABELAS[tabela]["metricas"] if m in colunas]
+            selecao = ", ".join(f'"{c}"' for c in chaves)
+            somas = ", ".join(f'SUM("{m}") AS "{m}"' for m in metricas)
+            resumo = conexao.execute(
+                f"SELECT {selecao}, {somas} FROM {tabela} WHERE mes BETWEEN ? AND ? "
+                f"GROUP BY {selecao} ORDER BY {selecao}",
+                [inicio, fim]
+            ).df()
+        finally:
+            conexao.close()
+    else:
+        dados = _ler_periodo(tabela, inicio, fim)
+        metricas = [m for m in TABELAS[tabela]["metricas"] if m in dados.columns]
+        resumo = dados.groupby(chaves, dropna=False)[metricas].sum().reset_index().sort_values(chaves, ignore_index=True)
+
+    if tabela == "km" and {"Passageiros", "Km Percorrido"} <= set(resumo.columns):
+        resumo["IPK"] = (resumo["Passageiros"] / resumo["Km Percorrido"].where(resumo["Km Percorrido"] > 0)).fillna(0)
+    return resumo.rename(columns={"mes": "Mês"})
+
+def variacao_anual(resumo, metrica, dimensao=None):
+    """Acrescenta a variação % da métrica em relação ao mesmo mês do ano anterior (quando ele existe)."""
+    anterior = resumo[["Mês"] + ([dimensao] if dimensao else []) + [metrica]].copy()
+    anterior["Mês"] = (pd.PeriodIndex(anterior["Mês"], freq="M") + 12).astype(str)
+    anterior = anterior.rename(columns={metrica: "anterior"})
+    resumo = resumo.merge(anterior, on=["Mês"] + ([dimensao] if dimensao else []), how="left")
+    base = resumo["anterior"].where(resumo["anterior"] != 0)
+    resumo[f"Var. % {metrica} (ano anterior)"] = ((resumo[metrica] - base) / base * 100).round(1)
+    return resumo.drop(columns="anterior")
+
+# ---------------- Telas ----------------
+@st.fragment
+def exibir_guardar(tabela, gerar, arquivos, por_mes=False):
+    """
+    Seção "Guardar no armazém histórico" (fragmento) de um relatório. gerar() monta os
+    dados só quando o botão é clicado. Com por_mes, pede o mês de referência (dados sem data).
+    """
+    with st.expander("🗄️ Guardar no armazém histórico"):
+        st.caption("Acumula os dados deste arquivo no armazém local, para consultas por período no HUB.")
+        mes = None
+        if por_mes:
+            referencia = st.date_input(
+                "Mês de referência dos dados:", value=datetime.date.today().replace(day=1),
+                format="DD/MM/YYYY", key=f"armazem_mes_{tabela}"
+            )
+            mes = referencia.strftime("%Y-%m")
+
+        if st.button("Guardar", key=f"armazem_guardar_{tabela}"):
+            try:
+                meses = guardar(tabela, gerar(), historico.assinatura_arquivos(arquivos)[:16], mes)
+                st.success(f"Dados guardados: {', '.join(meses) or 'nenhum mês'}.")
+            except Exception as e:
+                st.error(f"Não foi possível guardar no armazém: {e}")
+
+def exibir_armazem():
+    """Tela do armazém: resumo mensal de qualquer tabela em um período, com a variação anual."""
+    st.title("🗄️ Armazém Histórico")
+    if duckdb is None:
+        st.caption("DuckDB não instalado: resumos feitos com pandas (instale `duckdb>=1.1` para consultas SQL).")
+    elif not sql_disponivel():
+        st.caption(f"DuckDB {duckdb.__version__} não permite isolar as consultas: resumos feitos com pandas "
+                   "e sem consulta SQL livre (atualize para `duckdb>=1.1`).")
+
+    tabelas = tabelas_disponiveis()
+    if not tabelas:
+        st.info("Nenhum dado guardado ainda. Use \"🗄️ Guardar no armazém histórico\" nos relatórios.")
+        return
+
+    tabela = st.selectbox("Tabela:", tabelas, format_func=lambda t: TABELAS[t]["nome"], key="armazem_tabela")
+    meses = meses_disponiveis(tabela)
+    if len(meses) > 1:
+        inicio, fim = st.select_slider("Período:", options=meses, value=(meses[0], meses[-1]), key=f"armazem_periodo_{tabela}")
+    else:
+        inicio = fim = meses[0]
+    dimensao = st.selectbox("Detalhar por:", [None] + TABELAS[tabela]["dimensoes"],
+                            format_func=lambda d: "Total" if d is None else d, key=f"armazem_dimensao_{tabela}")
+
+    resumo = resumo_mensal(tabela, inicio, fim, dimensao)
+    if resumo.empty:
+        st.warning("Nenhum dado no período.")
+        return
+
+    metricas = [c for c in resumo.columns if c not in ("Mês", dimensao)]
+    metrica = st.selectbox("Métrica:", metricas, key=f"armazem_metrica_{tabela}")
+    resumo = variacao_anual(resumo, metrica, dimensao)
+
+    colunas_variacao = [c for c in resumo.columns if str(c).startswith("Var. %")]
+    formatado = formatacao.formatar_tabela_br(resumo, colunas=[c for c in metricas if c in resumo.columns])
+    formatado = formatacao.formatar_tabela_br(formatado, colunas=colunas_variacao, casas=1, na_rep="-")
+    formatacao.exibir_tabela(formatado, chave=f"armazem_resumo_{tabela}", use_container_width=True)
+
+    dados_grafico = resumo if dimensao is None else resumo.groupby(dimensao).filter(lambda g: g[metrica].sum() > 0)
+    fig = px.line(dados_grafico, x="Mês", y=metrica, color=dimensao, markers=True, title=f"{metrica} por mês")
+    st.plotly_chart(fig, use_container_width=True)
+
+    if sql_disponivel():
+        with st.expander("Consulta SQL"):
+            st.caption(f"Somente SELECT. Tabelas: {', '.join(tabelas)} (a coluna mes traz o mês AAAA-MM).")
+            sql = st.text_area("SQL:", value=f"SELECT mes, COUNT(*) AS registros FROM {tabela} GROUP BY mes ORDER BY mes",
+                               key="armazem_sql")
+            if st.button("Executar", key="armazem_executar"):
+                try:
+                    st.dataframe(consultar(sql), use_container_width=True, hide_index=True)
+                except Exception as e:
+                    st.error(f"Erro na consulta: {e}")
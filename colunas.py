@@ -0,0 +1,81 @@
+import functools
+import pandas as pd
+import streamlit as st
+from unidecode import unidecode
+
+# ---------------- Resolução de colunas ----------------
+# Cada relatório declara uma tabela de apelidos no formato
+#   {'Nome Padronizado': ['apelido 1', 'apelido 2', ...]}
+# e a resolução devolve o dicionário de renomeação + as colunas ausentes.
+#
+# Modos de comparação:
+#   'exato'  -> o nome normalizado da coluna deve ser igual a um dos apelidos
+#   'contem' -> o nome normalizado da coluna deve conter um dos apelidos
+
+def normalizar_nome(nome):
+    """Remove acentos e coloca em minúsculas (usado para comparar cabeçalhos)."""
+    return unidecode(str(nome)).lower()
+
+def _chave_tabela(tabela_aliases):
+    """Converte a tabela de apelidos em tupla (hashable) para servir de chave de cache."""
+    return tuple((destino, tuple(aliases)) for destino, aliases in tabela_aliases.items())
+
+@functools.lru_cache(maxsize=128)
+def _resolver(cabecalho, tabela, modo):
+    """Resolve os apelidos para um cabeçalho. Resultado cacheado pela assinatura do cabeçalho."""
+    # Normaliza cabeçalho e apelidos uma única vez
+    cabecalho_norm = [normalizar_nome(c) for c in cabecalho]
+
+    renomear = {}
+    for destino, aliases in tabela:
+        aliases_norm = [normalizar_nome(a) for a in aliases]
+        for col, col_norm in zip(cabecalho, cabecalho_norm):
+            if modo == 'contem':
+                encontrou = any(a in col_norm for a in aliases_norm)
+            else:
+                encontrou = col_norm in aliases_norm
+            if encontrou:
+                renomear[col] = destino
+                break
+
+    colunas_finais = [renomear.get(c, c) for c in cabecalho]
+    ausentes = tuple(destino for destino, _ in tabela if destino not in colunas_finais)
+    return tuple(renomear.items()), ausentes
+
+def resolver_colunas(colunas, tabela_aliases, modo='exato'):
+    """
+    Resolve as colunas de um arquivo contra a tabela de apelidos do relatório.
+    Retorna (dicionário de renomeação, lista de colunas ausentes).
+    Cabeçalhos iguais (mesmo layout de arquivo) reaproveitam o resultado em cache.
+    """
+    cabecalho = tuple(str(c) for c in colunas)
+    pares, ausentes = _resolver(cabecalho, _chave_tabela(tabela_aliases), modo)
+    # Devolve cópias para que o chamador possa alterar sem afetar o cache
+    return dict(pares), list(ausentes)
+
+def relatorio_divergencia(colunas, tabela_aliases, modo='exato'):
+    """Monta uma tabela com a situação de cada coluna esperada (encontrada ou ausente)."""
+    renomear, _ = resolver_colunas(colunas, tabela_aliases, modo)
+    origem_por_destino = {destino: origem for origem, destino in renomear.items()}
+
+    linhas = []
+    for destino, aliases in tabela_aliases.items():
+        origem = origem_por_destino.get(destino)
+        linhas.append({
+            'Coluna esperada': destino,
+            'Situação': '✅ Encontrada' if origem is not None else '❌ Ausente',
+            'Coluna no arquivo': origem if origem is not None else '',
+            'Nomes aceitos': ', '.join(aliases),
+        })
+    return pd.DataFrame(linhas)
+
+def exibir_divergencia(colunas, tabela_aliases, modo='exato'):
+    """Exibe no Streamlit o relatório de divergência de layout do arquivo."""
+    renomear, ausentes = resolver_colunas(colunas, tabela_aliases, modo)
+
+    st.error("❌ O layout do arquivo não corresponde ao esperado. Colunas ausentes: " + ", ".join(ausentes))
+    st.dataframe(relatorio_divergencia(colunas, tabela_aliases, modo), use_container_width=True, hide_index=True)
+
+    nao_utilizadas = [str(c) for c in colunas if str(c) not in renomear]
+    with st.expander(f"Colunas do arquivo não utilizadas ({len(nao_utilizadas)})"):
+        st.write(nao_utilizadas)
@@ -0,0 +1,127 @@
+import atexit
+import collections
+import os
+import shutil
+import tempfile
+import threading
+import pandas as pd
+import streamlit as st
+import tarefas
+
+# ---------------- Bases compartilhadas entre sessões ----------------
+# Quando dois usuários enviam o mesmo arquivo, a base já lida e tratada é uma só no
+# processo: o registro guarda os DataFrames pela chave da tarefa (hash do conteúdo) e
+# entrega o mesmo objeto a todas as sessões. As páginas só devem DERIVAR novos frames
+# dele (filtros, agrupamentos), nunca alterá-lo.
+#
+# O total em memória respeita ORCAMENTO_MB: passando do limite, as bases usadas há
+# mais tempo vão para Parquet em disco e voltam à memória quando pedidas de novo.
+#
+# O resultado de uma tarefa é registrado e a tarefa descartada sob a mesma trava em que
+# as sessões verificam o registro antes de enviar a tarefa: quem não acha a base acha a
+# tarefa (ou a base, se outra sessão acabou de publicá-la), e nada é lido duas vezes.
+#
+# Uso:
+#     df = dados_compartilhados.carregar(chave, funcao, arquivo, texto="Carregando...")
+
+ORCAMENTO_MB = float(os.environ.get("SEMOB_ORCAMENTO_MB", 1024))
+PASTA_DADOS = os.environ.get("SEMOB_PASTA_DADOS", os.path.join(tempfile.gettempdir(), "semob_dados"))
+
+@st.cache_resource
+def _registro():
+    """Registro do processo: bases em memória (ordem de uso), caminhos em disco e tamanhos."""
+    os.makedirs(PASTA_DADOS, exist_ok=True)
+    pasta = tempfile.mkdtemp(prefix="processo_", dir=PASTA_DADOS)
+    atexit.register(shutil.rmtree, pasta, ignore_errors=True)
+    return {
+        "memoria": collections.OrderedDict(),  # chave -> DataFrame
+        "tamanhos": {},                        # chave -> bytes em memória
+        "em_disco": {},                        # chave -> caminho do Parquet
+        "pasta": pasta,
+        "trava": threading.Lock(),
+    }
+
+def _tamanho(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+def obter(chave):
+    """Base registrada com a chave (da memória ou recarregada do disco), ou None."""
+    registro = _registro()
+    with registro["trava"]:
+        if chave in registro["memoria"]:
+            registro["memoria"].move_to_end(chave)
+            return registro["memoria"][chave]
+        caminho = registro["em_disco"].get(chave)
+
+    if caminho is None or not os.path.exists(caminho):
+        return None
+    df = pd.read_parquet(caminho)
+    publicar(chave, df)
+    return df
+
+def publicar(chave, df, tarefa=None):
+    """
+    Registra a base (somente leitura a partir daqui) e aplica o orçamento de memória.
+    Com tarefa, a tarefa que produziu a base é descartada junto, sob a mesma trava.
+    """
+    registro = _registro()
+    with registro["trava"]:
+        registro["memoria"][chave] = df
+        registro["memoria"].move_to_end(chave)
+        registro["tamanhos"][chave] = _tamanho(df)
+        _aplicar_orcamento(registro, manter=chave)
+        if tarefa is not None:
+            tarefas.descartar(tarefa)
+
+def _registrada(registro, chave):
+    return chave in registro["memoria"] or os.path.exists(registro["em_disco"].get(chave, ""))
+
+def submeter_se_ausente(chave_tarefa, funcao, *args, chaves=None):
+    """
+    Envia a tarefa (tarefas.submeter), a não ser que as bases que ela produz (chaves; por
+    padrão a própria chave_tarefa) já estejam registradas. Retorna True se já estão.
+    """
+    registro = _registro()
+    with registro["trava"]:
+        if all(_registrada(registro, chave) for chave in chaves or [chave_tarefa]):
+            return True
+        tarefas.submeter(chave_tarefa, funcao, *args)
+        return False
+
+def _aplicar_orcamento(registro, manter):
+    """Tira da memória as bases usadas há mais tempo até o total caber no orçamento."""
+    limite = ORCAMENTO_MB * 1024 ** 2
+    while sum(registro["tamanhos"].values()) > limite:
+        chave = next((c for c in registro["memoria"] if c != manter), None)
+        if chave is None:
+            break  # só sobrou a base atual, que fica mesmo acima do orçamento
+        df = registro["memoria"].pop(chave)
+        del registro["tamanhos"][chave]
+        if chave not in registro["em_disco"]:
+            caminho = os.path.join(registro["pasta"], f"{chave}.parquet")
+            try:
+                df.to_parquet(caminho)
+                registro["em_disco"][chave] = caminho
+            except Exception:
+                pass  # colunas sem representação em Parquet: a base será lida de novo se pedida
+
+def carregar(chave, funcao, *args, texto="Processando..."):
+    """
+    Devolve a base registrada com a chave; se não houver, roda funcao(*args) como tarefa
+    em segundo plano (tarefas.py), registra o resultado e o devolve.
+    """
+    while True:
+        df = obter(chave)
+        if df is not None:
+            return df
+        if submeter_se_ausente(chave, funcao, *args):
+            continue  # outra sessão acabou de publicar a base
+
+        try:
+            df = tarefas.aguardar(chave, texto)
+        except KeyError:
+            if tarefas.estado(chave) is not None:
+                raise  # erro da própria tarefa
+            continue  # publicada (e a tarefa descartada) por outra sessão nesse meio-tempo
+        publicar(chave, df, tarefa=chave)  # o resultado passa a viver só no registro
+        return df
@@ -0,0 +1,124 @@
+import contextlib
+import datetime
+import functools
+import json
+import os
+import time
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import RerunException, StopException
+
+# ---------------- Instrumentação de desempenho ----------------
+# Mede o tempo e a variação de memória de cada etapa do main() dos relatórios
+# (leitura, resolução de colunas, limpeza, agrupamento, gráficos, tabelas).
+#
+# Uso:
+#     @desempenho.instrumentar('km')
+#     def main():
+#         with desempenho.etapa('Leitura'):
+#             ...
+#
+# O painel "Performance" aparece ao final da página e pode gravar os tempos em
+# um arquivo JSON-lines local (caminho em SEMOB_LOG_DESEMPENHO).
+
+ARQUIVO_LOG = os.environ.get("SEMOB_LOG_DESEMPENHO", "desempenho.jsonl")
+CHAVE_ESTADO = "_desempenho"
+
+def _memoria_mb():
+    """Memória residente (RSS) do processo em MB, ou None se não for possível medir."""
+    try:
+        with open("/proc/self/statm") as f:
+            paginas_residentes = int(f.read().split()[1])
+        return paginas_residentes * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # ru_maxrss é o pico (KB no Linux); serve como aproximação quando /proc não existe
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        return None
+
+def iniciar(relatorio):
+    """Começa uma nova medição para a execução atual do relatório."""
+    st.session_state[CHAVE_ESTADO] = {"relatorio": relatorio, "etapas": []}
+
+def _registro_atual():
+    return st.session_state.get(CHAVE_ESTADO)
+
+@contextlib.contextmanager
+def etapa(nome):
+    """Mede o tempo e a variação de memória do bloco (a memória é a do processo inteiro)."""
+    inicio = time.perf_counter()
+    memoria_inicio = _memoria_mb()
+    try:
+        yield
+    finally:
+        registro = _registro_atual()
+        if registro is not None:
+            memoria_fim = _memoria_mb()
+            registro["etapas"].append({
+                "Etapa": nome,
+                "Tempo (s)": time.perf_counter() - inicio,
+                "Memória (MB)": (memoria_fim - memoria_inicio) if memoria_inicio is not None and memoria_fim is not None else None,
+            })
+
+def tabela_etapas():
+    """DataFrame com as etapas medidas na execução atual."""
+    registro = _registro_atual()
+    if not registro or not registro["etapas"]:
+        return pd.DataFrame(columns=["Etapa", "Tempo (s)", "Memória (MB)"])
+    return pd.DataFrame(registro["etapas"])
+
+def gravar_log():
+    """Acrescenta as etapas da execução atual ao arquivo JSON-lines de desempenho."""
+    registro = _registro_atual()
+    if not registro or not registro["etapas"]:
+        return
+    linha = {
+        "data_hora": datetime.datetime.now().isoformat(timespec="seconds"),
+        "relatorio": registro["relatorio"],
+        "etapas": registro["etapas"],
+    }
+    with open(ARQUIVO_LOG, "a", encoding="utf-8") as f:
+        f.write(json.dumps(linha, ensure_ascii=False) + "\n")
+
+def exibir_painel():
+    """Painel recolhível com o tempo de cada etapa da execução atual."""
+    tabela = tabela_etapas()
+    if tabela.empty:
+        return
+
+    with st.expander(f"⏱️ Performance ({tabela['Tempo (s)'].sum():.2f} s)"):
+        st.dataframe(
+            tabela.style.format({"Tempo (s)": "{:.3f}", "Memória (MB)": "{:+.1f}"}, na_rep="-"),
+            use_container_width=True,
+            hide_index=True
+        )
+        # Botão: uma linha no log por clique (uma caixa marcada gravaria a cada reexecução)
+        if st.button(f"Gravar tempos em {ARQUIVO_LOG}", key="desempenho_gravar_log"):
+            gravar_log()
+            st.caption("Tempos gravados.")
+
+def instrumentar(relatorio):
+    """
+    Decorador para o main() de um relatório: inicia a medição e mostra o painel ao final,
+    também quando o main() termina por erro (a exceção segue adiante). Depois de st.stop()
+    ou st.rerun() nada mais é desenhado na execução: a exceção segue sem o painel (as
+    saídas antecipadas dos relatórios usam return para o painel aparecer).
+    """
+    def decorador(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            iniciar(relatorio)
+            interrompido = False
+            try:
+                return func(*args, **kwargs)
+            except (StopException, RerunException):
+                interrompido = True
+                raise
+            finally:
+                if not interrompido:
+                    exibir_painel()
+        return wrapper
+    return decorador
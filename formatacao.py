@@ -0,0 +1,152 @@
+import math
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# ---------------- Formatação de números no padrão brasileiro ----------------
+# Formata colunas inteiras de uma vez (milhar com ponto, decimal com vírgula),
+# em vez de chamar str.format + replace célula por célula dentro do Styler.
+# O mesmo resultado é usado na tela e nos relatórios HTML.
+
+# Tabelas com mais linhas que isso são exibidas em páginas
+LINHAS_POR_PAGINA = 500
+
+# Acima deste número de linhas o destaque de linhas (Styler) é desligado na tela
+LIMITE_STYLER = 200
+
+def _unidades(absolutos, escala, truncar):
+    """
+    absolutos * escala levado a inteiro (arredondado ou truncado) pelo valor exato do
+    double, como no str.format: o produto é calculado sem erro como hi + lo (algoritmo
+    de Dekker) e os empates exatos vão para o par. Assim 2.675 vira 2,67 e 0.005 vira 0,01.
+    """
+    def dividir(a):
+        c = 134217729.0 * a
+        alto = c - (c - a)
+        return alto, a - alto
+
+    hi = absolutos * escala
+    ah, al = dividir(absolutos)
+    bh, bl = dividir(np.float64(escala))
+    lo = ((ah * bh - hi) + ah * bl + al * bh) + al * bl
+
+    piso = np.floor(hi)
+    fracao = hi - piso
+    if truncar:
+        # hi pode ter sido arredondado para cima até o inteiro (o valor exato fica logo abaixo)
+        return (piso - ((fracao == 0) & (lo < 0))).astype(np.int64)
+    meio = fracao - 0.5
+    acima = (meio > 0) | ((meio == 0) & ((lo > 0) | ((lo == 0) & (piso % 2 == 1))))
+    return (piso + acima).astype(np.int64)
+
+def _textos_br(numeros, casas, truncar):
+    """
+    Monta os textos de todos os números de uma vez: os dígitos são escritos da
+    direita para a esquerda em uma matriz de bytes (uma linha por número) e a
+    matriz é convertida em strings no final.
+    """
+    escala = 10 ** casas
+    unidades = _unidades(np.abs(numeros), escala, truncar)
+    inteiros = unidades // escala
+
+    n_digitos = np.floor(np.log10(np.maximum(inteiros, 1))).astype(np.int64) + 1
+    max_digitos = int(n_digitos.max()) if len(numeros) else 1
+    decimais = casas + 1 if casas else 0
+    largura = 1 + max_digitos + (max_digitos - 1) // 3 + decimais
+
+    matriz = np.full((len(numeros), largura), ord(" "), dtype=np.uint8)
+    pos = largura - 1
+
+    # Casas decimais e vírgula
+    resto = unidades % escala
+    for _ in range(casas):
+        matriz[:, pos] = ord("0") + resto % 10
+        resto //= 10
+        pos -= 1
+    if casas:
+        matriz[:, pos] = ord(",")
+        pos -= 1
+
+    # Parte inteira, com ponto a cada 3 dígitos
+    resto = inteiros
+    for j in range(max_digitos):
+        ativo = j < n_digitos
+        if j and j % 3 == 0:
+            matriz[ativo, pos] = ord(".")
+            pos -= 1
+        matriz[ativo, pos] = ord("0") + resto[ativo] % 10
+        resto = resto // 10
+        pos -= 1
+
+    # Sinal logo à esquerda do primeiro dígito
+    comprimento = n_digitos + (n_digitos - 1) // 3 + decimais
+    # (como no str.format, negativos que arredondam para zero mantêm o sinal; int() descarta)
+    negativos = np.flatnonzero((numeros < 0) & (unidades > 0) if truncar else np.signbit(numeros))
+    matriz[negativos, largura - comprimento[negativos] - 1] = ord("-")
+
+    return np.char.lstrip(matriz.view(f"S{largura}").ravel().astype(str))
+
+def formatar_serie_br(serie, casas=2, truncar=False, na_rep=""):
+    """
+    Converte uma coluna numérica em textos no padrão brasileiro, de forma vetorizada.
+    truncar=True descarta as casas em vez de arredondar (como int(valor)).
+    Valores não numéricos ficam como estão; ausentes viram na_rep.
+    """
+    valores = pd.to_numeric(serie, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    validos = np.isfinite(valores)
+
+    texto = np.full(len(valores), na_rep, dtype=object)
+    texto[validos] = _textos_br(valores[validos], casas, truncar)
+
+    # Textos originais (ex.: nomes) são mantidos
+    nao_numericos = ~validos & serie.notna().to_numpy()
+    texto[nao_numericos] = serie[nao_numericos].astype(str).to_numpy()
+    return pd.Series(texto, index=serie.index, name=serie.name)
+
+def formatar_numero_br(valor, casas=2, truncar=False):
+    """Formata um único número no padrão brasileiro."""
+    return formatar_serie_br(pd.Series([valor]), casas=casas, truncar=truncar).iloc[0]
+
+def formatar_tabela_br(df, colunas=None, casas=2, truncar=False, na_rep=""):
+    """
+    Cópia do DataFrame com as colunas numéricas (ou as informadas em colunas)
+    convertidas em texto no padrão brasileiro.
+    """
+    if colunas is None:
+        colunas = df.select_dtypes(include="number").columns
+    formatado = df.copy()
+    for coluna in colunas:
+        formatado[coluna] = formatar_serie_br(df[coluna], casas=casas, truncar=truncar, na_rep=na_rep)
+    return formatado
+
+def exibir_tabela(df, chave, linha_destaque=None, estilo_destaque=None, **opcoes_dataframe):
+    """
+    Mostra uma tabela já formatada. Tabelas pequenas podem ter uma linha destacada
+    (Styler); tabelas grandes são mostradas sem Styler e, acima de LINHAS_POR_PAGINA,
+    em páginas (o st.dataframe já é virtualizado, a paginação limita o que vai ao navegador).
+    """
+    if len(df) > LINHAS_POR_PAGINA:
+        _tabela_paginada(df, chave, linha_destaque, estilo_destaque, opcoes_dataframe)
+    else:
+        _mostrar_tabela(df, linha_destaque, estilo_destaque, opcoes_dataframe)
+
+@st.fragment
+def _tabela_paginada(df, chave, linha_destaque, estilo_destaque, opcoes_dataframe):
+    """Tabela em páginas; trocar de página reexecuta só este fragmento, não a página inteira."""
+    paginas = math.ceil(len(df) / LINHAS_POR_PAGINA)
+    pagina = st.number_input(
+        f"Página (de {paginas}, {len(df)} linhas)",
+        min_value=1, max_value=paginas, value=1, step=1, key=f"{chave}_pagina"
+    )
+    inicio = (pagina - 1) * LINHAS_POR_PAGINA
+    _mostrar_tabela(df.iloc[inicio:inicio + LINHAS_POR_PAGINA], linha_destaque, estilo_destaque, opcoes_dataframe)
+
+def _mostrar_tabela(df, linha_destaque, estilo_destaque, opcoes_dataframe):
+    if linha_destaque is not None and len(df) <= LIMITE_STYLER and linha_destaque in df.index:
+        dados = df.style.apply(
+            lambda row: [estilo_destaque if row.name == linha_destaque else ''] * len(row), axis=1
+        )
+    else:
+        dados = df
+
+    st.dataframe(dados, **opcoes_dataframe)
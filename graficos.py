@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+# ---------------- Camada de dados dos gráficos ----------------
+# Reduz os dados ANTES de montar os gráficos Plotly: tudo o que vai para o
+# gráfico é serializado e enviado ao navegador a cada rerun, então categorias
+# demais (ex.: centenas de linhas) ou séries longas deixam a página pesada.
+
+# Número máximo de barras por gráfico (as demais viram "Outras")
+LIMITE_CATEGORIAS = 25
+
+# Número máximo de pontos por série em gráficos de linha
+LIMITE_PONTOS = 500
+
+def top_n_com_outras(df, categoria, valor, n=LIMITE_CATEGORIAS, rotulo="Outras"):
+    """
+    Mantém as n-1 categorias de maior valor e soma o restante em uma única
+    categoria "Outras (k)". Se houver até n categorias, devolve tudo ordenado.
+    """
+    ordenado = df.sort_values(valor, ascending=False, kind="stable")
+    if len(ordenado) <= n:
+        return ordenado.reset_index(drop=True)
+
+    principais = ordenado.iloc[:n - 1]
+    restantes = ordenado.iloc[n - 1:]
+    outras = pd.DataFrame({categoria: [f"{rotulo} ({len(restantes)})"], valor: [restantes[valor].sum()]})
+    return pd.concat([principais[[categoria, valor]], outras], ignore_index=True)
+
+def reduzir_serie(df, x, y, grupo=None, max_pontos=LIMITE_PONTOS):
+    """
+    Reduz séries longas para no máximo ~max_pontos por série, mantendo em cada
+    intervalo o ponto mínimo e o máximo (os picos continuam visíveis).
+    Os intervalos são contados na ordem de x (cada série é ordenada por x antes de
+    reduzir). Séries curtas são devolvidas sem alteração.
+    """
+    if grupo is None:
+        return _reduzir_uma_serie(df, x, y, max_pontos)
+
+    partes = [_reduzir_uma_serie(parte, x, y, max_pontos) for _, parte in df.groupby(grupo, sort=False)]
+    if not partes:
+        return df
+    return pd.concat(partes, ignore_index=True)
+
+def _reduzir_uma_serie(df, x, y, max_pontos):
+    if len(df) <= max_pontos:
+        return df
+    if not df[x].is_monotonic_increasing:
+        df = df.sort_values(x, kind="stable")
+
+    # Cada intervalo contribui com 2 pontos (mínimo e máximo)
+    intervalos = max(max_pontos // 2, 1)
+    posicao_intervalo = np.arange(len(df)) * intervalos // len(df)
+    valores = pd.to_numeric(df[y], errors="coerce").fillna(0).to_numpy()
+
+    serie = pd.Series(valores).groupby(posicao_intervalo)
+    manter = np.union1d(serie.idxmin().to_numpy(), serie.idxmax().to_numpy())
+    return df.iloc[manter]
+
+def altura_barras_horizontais(n_categorias, por_categoria=35, minimo=400, maximo=1000):
+    """Altura do gráfico de barras horizontais proporcional ao número de barras."""
+    return max(minimo, min(n_categorias * por_categoria, maximo))
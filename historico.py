@@ -0,0 +1,179 @@
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import pandas as pd
+import streamlit as st
+import formatacao
+
+# ---------------- Histórico de execuções ----------------
+# Cada execução de um relatório é guardada em disco: as tabelas de resultado em
+# Parquet (colunar e compacto) e uma linha no índice (JSON-lines) com o relatório,
+# a assinatura dos arquivos de entrada e os parâmetros usados. O HUB lista as
+# execuções recentes e reabre qualquer uma sem reprocessar os arquivos.
+#
+# Estrutura:
+#     historico/indice.jsonl
+#     historico/<id>/<n>.parquet    (uma tabela por arquivo, na ordem de exibição)
+
+PASTA_HISTORICO = os.environ.get("SEMOB_HISTORICO", "historico")
+ARQUIVO_INDICE = "indice.jsonl"
+
+NOMES_RELATORIOS = {
+    "km": "📊 Quilometragem",
+    "mco": "🚌 Passagens de Ônibus",
+    "soltura": "🚍 Soltura",
+    "ipk": "📊 IPK",
+    "viabilidade": "📊 Viabilidade",
+    "receita": "📊 Fechamento",
+}
+
+def _caminho_indice():
+    return os.path.join(PASTA_HISTORICO, ARQUIVO_INDICE)
+
+def assinatura_arquivos(arquivos):
+    """Hash do conteúdo dos arquivos enviados (guardado na sessão por file_id, para não recalcular)."""
+    if not isinstance(arquivos, (list, tuple)):
+        arquivos = [arquivos]
+
+    cache = st.session_state.setdefault("_historico_hash_arquivos", {})
+    h = hashlib.sha1()
+    for arquivo in arquivos:
+        chave = getattr(arquivo, "file_id", None) or arquivo.name
+        if chave not in cache:
+            cache[chave] = hashlib.sha1(arquivo.getvalue()).hexdigest()
+        h.update(arquivo.name.encode())
+        h.update(cache[chave].encode())
+    return h.hexdigest()
+
+def _id_execucao(relatorio, assinatura_entrada, parametros):
+    texto = json.dumps([relatorio, assinatura_entrada, parametros], sort_keys=True, ensure_ascii=False, default=str)
+    return f"{relatorio}_{hashlib.sha1(texto.encode()).hexdigest()[:16]}"
+
+def salvar_execucao(relatorio, arquivos, parametros, tabelas):
+    """
+    Guarda as tabelas de resultado da execução (se ainda não existir uma igual).
+    tabelas: dicionário {título: DataFrame}; tabelas vazias ou None são ignoradas, e sem
+    nenhuma tabela nada é gravado. Retorna o id da execução.
+
+    Cada gravação monta as tabelas em uma pasta temporária própria e a renomeia para a
+    pasta da execução; se outra sessão gravou a mesma execução antes, a pasta dela fica
+    e esta gravação conta como feita.
+    """
+    assinatura_entrada = assinatura_arquivos(arquivos)
+    id_execucao = _id_execucao(relatorio, assinatura_entrada, parametros)
+    pasta = os.path.join(PASTA_HISTORICO, id_execucao)
+    tabelas = {titulo: df for titulo, df in tabelas.items() if df is not None and not df.empty}
+    if os.path.isdir(pasta) or not tabelas:
+        return id_execucao
+
+    os.makedirs(PASTA_HISTORICO, exist_ok=True)
+    temporaria = tempfile.mkdtemp(prefix=f"{id_execucao}.", suffix=".tmp", dir=PASTA_HISTORICO)
+    try:
+        for i, df in enumerate(tabelas.values()):
+            df.to_parquet(os.path.join(temporaria, f"{i}.parquet"))
+        os.rename(temporaria, pasta)
+    except OSError:
+        shutil.rmtree(temporaria, ignore_errors=True)
+        if os.path.isdir(pasta):
+            return id_execucao  # gravada por outra sessão nesse meio-tempo
+        raise
+    except Exception:
+        shutil.rmtree(temporaria, ignore_errors=True)
+        raise
+
+    nomes_arquivos = [a.name for a in (arquivos if isinstance(arquivos, (list, tuple)) else [arquivos])]
+    registro = {
+        "id": id_execucao,
+        "data_hora": datetime.datetime.now().isoformat(timespec="seconds"),
+        "relatorio": relatorio,
+        "arquivos": nomes_arquivos,
+        "assinatura_entrada": assinatura_entrada,
+        "parametros": parametros,
+        "tabelas": list(tabelas),
+    }
+    with open(_caminho_indice(), "a", encoding="utf-8") as f:
+        f.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+    return id_execucao
+
+def registrar(relatorio, arquivos, parametros, tabelas):
+    """
+    Botão "Salvar no histórico" do relatório: a execução (parâmetros e tabelas da tela)
+    só é gravada quando o usuário pede, sem interromper o relatório se algo falhar.
+    """
+    if not st.button(
+        "🕘 Salvar no histórico",
+        key=f"historico_salvar_{relatorio}",
+        help="Guarda as tabelas desta tela para reabrir pelo HUB sem reprocessar os arquivos."
+    ):
+        return
+    try:
+        salvar_execucao(relatorio, arquivos, parametros, tabelas)
+        st.success("Execução salva: disponível em \"Execuções recentes\" no HUB.")
+    except Exception as e:
+        st.caption(f"⚠️ Não foi possível salvar esta execução no histórico: {e}")
+
+def listar_execucoes(limite=20):
+    """Execuções mais recentes primeiro (apenas as que ainda existem em disco)."""
+    if not os.path.exists(_caminho_indice()):
+        return []
+    with open(_caminho_indice(), encoding="utf-8") as f:
+        registros = [json.loads(linha) for linha in f if linha.strip()]
+    registros = [r for r in registros if os.path.isdir(os.path.join(PASTA_HISTORICO, r["id"]))]
+    return registros[::-1][:limite]
+
+def carregar_execucao(id_execucao):
+    """Registro do índice e tabelas ({título: DataFrame}) de uma execução salva."""
+    registro = next((r for r in listar_execucoes(limite=None) if r["id"] == id_execucao), None)
+    if registro is None:
+        return None, {}
+    pasta = os.path.join(PASTA_HISTORICO, id_execucao)
+    tabelas = {
+        titulo: pd.read_parquet(os.path.join(pasta, f"{i}.parquet"))
+        for i, titulo in enumerate(registro["tabelas"])
+    }
+    return registro, tabelas
+
+# ---------------- Telas ----------------
+def _descricao(registro):
+    nome = NOMES_RELATORIOS.get(registro["relatorio"], registro["relatorio"])
+    data_hora = datetime.datetime.fromisoformat(registro["data_hora"]).strftime("%d/%m/%Y %H:%M")
+    return f"{nome} — {', '.join(registro['arquivos'])} ({data_hora})"
+
+def exibir_recentes(ao_abrir, limite=10):
+    """Lista as execuções recentes; ao_abrir(id) é chamado pelo botão "Abrir"."""
+    registros = listar_execucoes(limite)
+    if not registros:
+        st.caption("Nenhuma execução salva ainda.")
+        return
+
+    for registro in registros:
+        col1, col2 = st.columns([6, 1])
+        with col1:
+            st.markdown(_descricao(registro))
+        with col2:
+            st.button("Abrir", key=f"historico_abrir_{registro['id']}", on_click=ao_abrir, args=(registro["id"],))
+
+def exibir_execucao(id_execucao):
+    """Mostra as tabelas de uma execução salva, sem reprocessar os arquivos."""
+    registro, tabelas = carregar_execucao(id_execucao)
+    if registro is None:
+        st.error("Execução não encontrada no histórico.")
+        return
+
+    st.title(_descricao(registro))
+    if registro["parametros"]:
+        st.caption(" · ".join(f"{chave}: {valor}" for chave, valor in registro["parametros"].items()))
+
+    for i, (titulo, df) in enumerate(tabelas.items()):
+        st.subheader(titulo)
+        # Contagens sem casas decimais, demais valores com 2 casas
+        formatado = formatacao.formatar_tabela_br(df, colunas=df.select_dtypes(include="float").columns)
+        formatado = formatacao.formatar_tabela_br(formatado, colunas=df.select_dtypes(include="integer").columns, casas=0)
+        formatacao.exibir_tabela(
+            formatado,
+            chave=f"historico_{id_execucao}_{i}",
+            use_container_width=True
+        )
@@ -1,10 +1,177 @@
 # ipk_app.py
 # -*- coding: utf-8 -*-
 
+import numpy as np
 import pandas as pd
+from pandas.tseries.api import guess_datetime_format
 import streamlit as st
 import re
+import colunas
+import desempenho
+import historico
+import leitura
 
+# Colunas fixas do arquivo: C (Operadora), J (Passageiros) e L (KM)
+COLUNAS_POSICAO = {2: "Operadora", 9: "Passageiros", 11: "KM"}
+
+# Dimensões opcionais de detalhamento, encontradas pelo nome no cabeçalho
+DIMENSOES_IPK = {
+    "Linha": ["Código Externo Linha", "Codigo Externo Linha", "Cod. Externo Linha", "Nome Linha", "Linha"],
+    "Data Hora": ["Data Hora Início", "Data Hora Inicio", "Início Viagem", "Inicio Viagem", "Data Coleta", "Data"],
+}
+
+# Valores de data tratados como vazios pelo pd.to_datetime (não servem para inferir o formato)
+VAZIOS_DATA = ('', 'now', 'today', 'NaT', 'nat', 'NAT', 'nan', 'NaN', 'NAN')
+
+# ---------------- Motor de cálculo do IPK ----------------
+def preparar_ipk(df, formato_data=None):
+    """
+    Converte as colunas numéricas, remove linhas inválidas / sem passageiros e extrai
+    a operadora principal (Rosa ou Sao Joao). Retorna o DataFrame e as contagens de linhas.
+    formato_data (de detectar_formato_data) é o mesmo para o arquivo inteiro ou todos os blocos.
+    """
+    df["Passageiros"] = pd.to_numeric(df["Passageiros"], errors="coerce")
+    df["KM"] = pd.to_numeric(df["KM"], errors="coerce")
+
+    # Remove linhas com valores inválidos (NaN) e onde Passageiros é 0
+    df = df.dropna(subset=["Passageiros", "KM"])
+    df = df[df["Passageiros"] > 0]
+    linhas_validas = len(df)
+
+    # Padronização e extração do nome da operadora
+    df = df.assign(Operadora_Principal=df["Operadora"].astype(str).str.extract(r"(Rosa|Sao Joao)", flags=re.IGNORECASE, expand=False))
+    df = df.dropna(subset=["Operadora_Principal"])
+    df["Operadora_Principal"] = df["Operadora_Principal"].str.title()
+
+    # Código da linha sempre como texto (evita tipos diferentes entre blocos de leitura)
+    if "Linha" in df.columns:
+        df["Linha"] = df["Linha"].astype(str).str.strip()
+
+    # Dimensões de data e hora derivadas da coluna de data/hora (quando existir)
+    if "Data Hora" in df.columns:
+        data_hora = converter_data_hora(df["Data Hora"], formato_data)
+        df["Data"] = data_hora.dt.normalize()
+        df["Hora"] = data_hora.dt.hour
+
+    return df, {"validas": linhas_validas, "operadora": len(df)}
+
+def detectar_formato_data(serie):
+    """
+    Formato da data/hora inferido do primeiro valor preenchido: ISO (AAAA-MM-DD) ou com o
+    dia primeiro (DD/MM/AAAA, com ou sem hora). Retorna (encontrado, formato); o formato é
+    None quando o valor não é texto (ex.: datas do Excel) ou não foi reconhecido.
+    """
+    for valor in serie:
+        if pd.isna(valor) or valor in VAZIOS_DATA:
+            continue
+        if type(valor) is not str:
+            return True, None
+        return True, guess_datetime_format(valor, dayfirst=not re.match(r"\s*\d{4}", valor))
+    return False, None
+
+def converter_data_hora(serie, formato=None):
+    """Converte as datas com o formato detectado; sem formato, lê com o dia primeiro (padrão brasileiro)."""
+    if formato:
+        return pd.to_datetime(serie, errors="coerce", format=formato)
+    return pd.to_datetime(serie, errors="coerce", dayfirst=True)
+
+def agregar_ipk(df, dimensoes):
+    """Pré-agrega Passageiros e KM por operadora e pelas dimensões informadas (grão mais fino)."""
+    chaves = ["Operadora_Principal"] + list(dimensoes)
+    return df.groupby(chaves, dropna=False)[["Passageiros", "KM"]].sum().reset_index()
+
+def calcular_ipk(resumo):
+    """IPK = Passageiros / KM, vetorizado e com divisão segura (KM <= 0 resulta em 0)."""
+    km = resumo["KM"].to_numpy(dtype=float)
+    passageiros = resumo["Passageiros"].to_numpy(dtype=float)
+    resumo["IPK"] = np.divide(passageiros, km, out=np.zeros_like(km), where=km > 0)
+    return resumo
+
+def resumir_ipk(base, dimensoes=()):
+    """Reagrupa a base pré-agregada pelas dimensões escolhidas (sem reler as linhas brutas) e calcula o IPK."""
+    chaves = ["Operadora_Principal"] + list(dimensoes)
+    resumo = base.groupby(chaves, dropna=False)[["Passageiros", "KM"]].sum().reset_index()
+    return calcular_ipk(resumo)
+
+def mapear_colunas(cabecalho):
+    """Monta o dicionário de renomeação: colunas C, J, L + dimensões opcionais encontradas no cabeçalho."""
+    if len(cabecalho) <= max(COLUNAS_POSICAO):
+        raise ValueError(f"o arquivo tem apenas {len(cabecalho)} colunas")
+
+    renomear = {cabecalho[pos]: nome for pos, nome in COLUNAS_POSICAO.items()}
+
+    # Dimensões opcionais: só as que existem no arquivo e não coincidem com C, J ou L
+    renomear_dim, _ = colunas.resolver_colunas(cabecalho, DIMENSOES_IPK)
+    for origem, destino in renomear_dim.items():
+        if origem not in renomear:
+            renomear[origem] = destino
+    return renomear
+
+def tipos_colunas(renomear):
+    """Código da linha lido como texto (CSV/TXT), igual na leitura inteira e em todos os blocos."""
+    return {origem: str for origem, destino in renomear.items() if destino == "Linha"}
+
+def dimensoes_disponiveis(df):
+    """Dimensões de detalhamento presentes no DataFrame já preparado."""
+    return [d for d in ["Linha", "Data", "Hora"] if d in df.columns]
+
+@st.cache_data
+def carregar_base_ipk(arquivo):
+    """Lê o arquivo e devolve a base pré-agregada no grão mais fino disponível."""
+    opcoes = {"engine_excel": "openpyxl", "sep": ";", "decimal": ","}
+    renomear = mapear_colunas(leitura.ler_cabecalho(arquivo, **opcoes))
+
+    df = leitura.ler_arquivo(arquivo, usecols=list(renomear), dtype=tipos_colunas(renomear), **opcoes)
+    total_linhas = len(df)
+    df = df.rename(columns=renomear)
+
+    formato_data = detectar_formato_data(df["Data Hora"])[1] if "Data Hora" in df.columns else None
+    df, contagens = preparar_ipk(df, formato_data)
+    dimensoes = dimensoes_disponiveis(df)
+    contagens["total"] = total_linhas
+    return agregar_ipk(df, dimensoes), dimensoes, contagens
+
+# ---------------- Modo streaming (CSV/TXT) ----------------
+def carregar_base_ipk_streaming(arquivo, progresso=None, tamanho_bloco=None):
+    """
+    Lê CSV/TXT em blocos (leitura.agregar_em_blocos), filtrando e pré-agregando cada
+    bloco, e mantém apenas as somas parciais de Passageiros e KM por grupo. A memória
+    não cresce com o número de linhas. progresso(linhas_lidas, fracao) é chamado após cada bloco.
+    """
+    opcoes = {"sep": ";", "decimal": ","}
+    renomear = mapear_colunas(leitura.ler_cabecalho(arquivo, **opcoes))
+    formato = {}  # formato da data, inferido do primeiro valor preenchido (como na leitura inteira)
+
+    def agregar(bloco):
+        total = len(bloco)
+        bloco = bloco.rename(columns=renomear)
+        if "data" not in formato and "Data Hora" in bloco.columns:
+            encontrado, formato_data = detectar_formato_data(bloco["Data Hora"])
+            if encontrado:
+                formato["data"] = formato_data
+        bloco, contagens = preparar_ipk(bloco, formato.get("data"))
+        contagens["total"] = total
+        return agregar_ipk(bloco, dimensoes_disponiveis(bloco)), contagens
+
+    base, contagens = leitura.agregar_em_blocos(
+        arquivo, agregar, combinar_parciais, usecols=list(renomear), tamanho_bloco=tamanho_bloco, progresso=progresso,
+        dtype=tipos_colunas(renomear), **opcoes
+    )
+    return base, dimensoes_disponiveis(base), contagens
+
+def combinar_parciais(parciais):
+    """Soma as bases parciais (uma por bloco) e as contagens de linhas."""
+    bases = [base for base, _ in parciais]
+    contagens = {c: sum(contagens_bloco[c] for _, contagens_bloco in parciais) for c in ("total", "validas", "operadora")}
+    return resumir_parciais(bases, dimensoes_disponiveis(bases[0]) if bases else []), contagens
+
+def resumir_parciais(parciais, dimensoes):
+    """Soma as bases parciais (uma por bloco) em uma única base."""
+    if not parciais:
+        return pd.DataFrame(columns=["Operadora_Principal"] + list(dimensoes) + ["Passageiros", "KM"])
+    return agregar_ipk(pd.concat(parciais, ignore_index=True), dimensoes)
+
+@desempenho.instrumentar('ipk')
 def main():
     st.title("Índice de Passageiros por KM por Operadora")
 
@@ -12,60 +179,93 @@ def main():
     arquivo = st.file_uploader("Escolha o arquivo (Excel, CSV ou TXT)", type=["xlsx", "csv", "txt"])
 
     if arquivo is not None:
+        # Modo streaming disponível para CSV/TXT (arquivos grandes demais para a memória);
+        # ligado automaticamente quando a leitura inteira passaria do orçamento de memória
+        modo_streaming = False
+        if not arquivo.name.endswith(".xlsx"):
+            try:
+                usecols = list(mapear_colunas(leitura.ler_cabecalho(arquivo, sep=";", decimal=",")))
+            except Exception:
+                usecols = None
+            acima_do_orcamento = leitura.excede_orcamento(arquivo, usecols=usecols, sep=";", decimal=",")
+            modo_streaming = st.checkbox(
+                "Modo streaming (leitura em blocos, para arquivos muito grandes)",
+                value=acima_do_orcamento,
+                disabled=acima_do_orcamento,
+                help="Lê o arquivo em blocos e mantém só as somas por operadora, usando memória constante."
+            )
+            if acima_do_orcamento:
+                st.caption("O arquivo passaria do orçamento de memória na leitura inteira: modo streaming ativado automaticamente.")
+
         # Ler arquivo dependendo da extensão
         try:
-            colunas_para_ler = [2, 9, 11] # Colunas C, J, L (índices 2, 9, 11)
-            if arquivo.name.endswith(".xlsx"):
-                df = pd.read_excel(arquivo, usecols=colunas_para_ler, engine='openpyxl')
-            else:  # CSV ou TXT
-                # Alteração principal: definindo o separador como ';' para garantir a leitura correta
-                df = pd.read_csv(arquivo, usecols=colunas_para_ler, sep=';', decimal=',')
-            
-            st.success(f"Arquivo lido com sucesso. Total de linhas: {len(df)}")
+            with desempenho.etapa('Leitura e pré-agregação'):
+                if modo_streaming:
+                    # Resultado guardado na sessão para não reler o arquivo a cada interação
+                    chave = f"ipk_streaming_{arquivo.file_id}"
+                    if chave not in st.session_state:
+                        barra = st.progress(0.0, text="Lendo arquivo em blocos...")
+
+                        def progresso(linhas_lidas, fracao):
+                            barra.progress(fracao, text=f"{linhas_lidas:,} linhas processadas".replace(",", "."))
+
+                        st.session_state[chave] = carregar_base_ipk_streaming(arquivo, progresso)
+                        barra.empty()
+                    base, dimensoes, contagens = st.session_state[chave]
+                else:
+                    base, dimensoes, contagens = carregar_base_ipk(arquivo)
+            st.success(f"Arquivo lido com sucesso. Total de linhas: {contagens['total']}")
 
         except Exception as e:
             st.error(f"Erro ao ler o arquivo. Certifique-se de que ele tem as colunas C, J e L: {e}")
-            st.stop()
-
-        # Renomear colunas para facilitar
-        df.columns = ["Operadora", "Passageiros", "KM"]
-
-        # Converte colunas numéricas
-        df["Passageiros"] = pd.to_numeric(df["Passageiros"], errors="coerce")
-        df["KM"] = pd.to_numeric(df["KM"], errors="coerce")
-        
-        # Remove linhas com valores inválidos (NaN) e onde Passageiros é 0
-        df = df.dropna(subset=["Passageiros", "KM"])
-        df = df[df["Passageiros"] > 0]
-        
-        st.info(f"Linhas após remover NaN e Passageiros = 0: {len(df)}")
-        
-        if df.empty:
+            return
+
+        st.info(f"Linhas após remover NaN e Passageiros = 0: {contagens['validas']}")
+
+        if contagens["validas"] == 0:
             st.warning("Nenhuma linha restante após a filtragem inicial. Verifique se as colunas de Passageiros e KM têm dados válidos e se há passageiros > 0.")
-            st.stop()
-
-        # Padronização e extração do nome da operadora
-        df["Operadora_Principal"] = df["Operadora"].str.extract(r"(Rosa|Sao Joao)", flags=re.IGNORECASE, expand=False)
-        
-        # Remove linhas onde a extração não encontrou "Rosa" ou "Sao Joao"
-        df = df.dropna(subset=["Operadora_Principal"])
-        
-        st.info(f"Linhas restantes após filtrar por operadora (Rosa ou Sao Joao): {len(df)}")
-        
-        if df.empty:
+            return
+
+        st.info(f"Linhas restantes após filtrar por operadora (Rosa ou Sao Joao): {contagens['operadora']}")
+
+        if base.empty:
             st.warning("Nenhuma linha restante após filtrar por operadora. Verifique se 'Rosa' ou 'Sao Joao' aparecem nos nomes da coluna 'Operadora' (C).")
-            st.stop()
-        
-        # Padroniza os nomes extraídos para "Rosa" e "Sao Joao"
-        df["Operadora_Principal"] = df["Operadora_Principal"].str.title().replace('Sao Joao', 'Sao Joao')
-        
-        # Agrupar, somar e calcular o IPK
-        resumo = df.groupby("Operadora_Principal")[["Passageiros", "KM"]].sum().reset_index()
-        
-        # Evita divisão por zero
-        resumo["IPK"] = resumo.apply(lambda row: row["Passageiros"] / row["KM"] if row["KM"] > 0 else 0, axis=1)
+            return
+
+        # IPK por operadora
+        with desempenho.etapa('Cálculo do IPK'):
+            resumo = resumir_ipk(base)
 
         st.subheader("Índice de Passageiros por KM")
-        
+
         # Exibe a tabela final
-        st.dataframe(resumo[["Operadora_Principal", "IPK"]].rename(columns={"Operadora_Principal": "Operadora"}))
\ No newline at end of file
+        st.dataframe(resumo[["Operadora_Principal", "IPK"]].rename(columns={"Operadora_Principal": "Operadora"}))
+
+        # Detalhamento opcional (linha, data e hora), calculado sobre a base pré-agregada
+        detalhe = None
+        dimensoes_escolhidas = []
+        if dimensoes:
+            st.subheader("Detalhamento do IPK")
+            dimensoes_escolhidas = st.multiselect("Detalhar por:", options=dimensoes)
+
+            if dimensoes_escolhidas:
+                with desempenho.etapa('Detalhamento'):
+                    detalhe = resumir_ipk(base, dimensoes_escolhidas)
+                    if "Data" in detalhe.columns:
+                        detalhe["Data"] = detalhe["Data"].dt.date
+                st.dataframe(
+                    detalhe.rename(columns={"Operadora_Principal": "Operadora"}),
+                    use_container_width=True,
+                    hide_index=True
+                )
+
+        # Histórico: botão para guardar os resultados desta execução no HUB
+        historico.registrar(
+            "ipk",
+            arquivo,
+            {"Detalhar por": dimensoes_escolhidas},
+            {
+                "Índice de Passageiros por KM": resumo.rename(columns={"Operadora_Principal": "Operadora"}),
+                "Detalhamento do IPK": detalhe.rename(columns={"Operadora_Principal": "Operadora"}) if detalhe is not None else None,
+            }
+        )
@@ -1,8 +1,31 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 from unidecode import unidecode
 import io
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import armazem
+import colunas
+import dados_compartilhados
+import desempenho
+import formatacao
+import historico
+import leitura
+import relatorio_html
+import tarefas
+
+# ---------------- Colunas esperadas ----------------
+# Apelidos aceitos para cada coluna (comparação por "contém", sem acento e minúscula)
+COLUNAS_KM = {
+    'Nome Operadora': ['Nome Operadora', 'Nome Garagem'],
+    'Distância': ['Distância', 'Distancia'],
+    'Passageiros': ['Passageiros'],
+    'Intervalo Viagem': ['Intervalo Viagem'],
+    'Desc. Tipo Veículo': ['Desc. Tipo Veículo', 'Tipo Veiculo', 'Tipo de Veículo'],
+    'Código Externo Linha': ['Código Externo Linha', 'Codigo Externo Linha', 'codigo externo linha'],
+    'Viagem': ['Viagem']
+}
 
 # ---------------- Funções auxiliares ----------------
 def calcular_km_falha(operadora, km_percorrido):
@@ -38,36 +61,158 @@ def formatar_br(val):
     """Formata um float para o padrão brasileiro (milhar com ponto, decimal com vírgula)."""
     # Se for float/int, formata com vírgula para milhares e ponto para decimal
     if isinstance(val, (float, int)):
-        return "{:,.2f}".format(val).replace(",", "X").replace(".", ",").replace("X", ".")
+        return formatacao.formatar_numero_br(val)
     return val
 
+def exibir_tabela_km(tabela, colunas, chave):
+    """Mostra a tabela na tela com as colunas de Km formatadas de uma vez e a linha de total destacada."""
+    formatacao.exibir_tabela(
+        formatacao.formatar_tabela_br(tabela, colunas=colunas),
+        chave=chave,
+        linha_destaque='Total Geral (Km)',
+        estilo_destaque=relatorio_html.ESTILO_DESTAQUE,
+        use_container_width=True
+    )
+
+# ---------------- Leitura e limpeza das viagens ----------------
+def ler_viagens(arquivo, nrows=None, dtype=None):
+    """
+    Leitura adaptativa do arquivo de viagens (';' em UTF-8 ou Latin-1, com fallback para tabulação),
+    a partir da cópia em disco do upload (memory_map). nrows=0 lê só o cabeçalho.
+    """
+    caminho = leitura.em_disco(arquivo)
+    try:
+        return pd.read_csv(caminho, encoding='utf-8', sep=';', memory_map=True, nrows=nrows, dtype=dtype)
+    except UnicodeDecodeError:
+        return pd.read_csv(caminho, encoding='latin1', sep=';', memory_map=True, nrows=nrows, dtype=dtype)
+    except Exception:
+        try:
+            return pd.read_csv(caminho, sep=';', memory_map=True, nrows=nrows, dtype=dtype)
+        except Exception:
+            return pd.read_csv(caminho, sep='\t', memory_map=True, nrows=nrows, dtype=dtype)
+
+def tipos_colunas(rename_dict):
+    """
+    Código da linha lido como texto: com um código em branco, o pandas leria a coluna
+    como número decimal ("101.0") só nos blocos em que o branco aparece.
+    """
+    return {coluna: str for coluna, nome in rename_dict.items() if nome == 'Código Externo Linha'}
+
+def limpar_viagens(df):
+    """
+    Remove a VIAFEIRA e as viagens que não são normais, converte distância (km),
+    passageiros e intervalo, e descarta viagens sem passageiros com menos de
+    5 minutos (exceto as linhas especiais 128 e 129).
+    """
+    df = df[~df['Nome Operadora'].str.contains('VIAFEIRA', case=False, na=False)].copy()
+    df = df[df['Viagem'] == 'Nor.'].copy()
+
+    intervalo_td = pd.to_timedelta(df['Intervalo Viagem'], errors='coerce')
+    df['Intervalo_min'] = intervalo_td.dt.total_seconds() / 60.0
+    mask_na = df['Intervalo_min'].isna()
+    df.loc[mask_na, 'Intervalo_min'] = pd.to_numeric(df.loc[mask_na, 'Intervalo Viagem'], errors='coerce')
+
+    df['Passageiros'] = pd.to_numeric(df['Passageiros'], errors='coerce').fillna(0)
+    df['Código Externo Linha'] = df['Código Externo Linha'].astype(str).str.strip()
+    df['Codigo_Num'] = pd.to_numeric(df['Código Externo Linha'].str.extract(r'(\d+)')[0], errors='coerce')
+    df['Distância (km)'] = pd.to_numeric(df['Distância'], errors='coerce').fillna(0) / 1000.0
+    if 'Data Coleta' in df.columns:
+        df['Data Coleta'] = pd.to_datetime(df['Data Coleta'], errors='coerce', dayfirst=True)
+
+    especiais_mask = df['Codigo_Num'].isin([128, 129])
+    remover_mask = (df['Passageiros'] == 0) & (df['Intervalo_min'] < 5)
+    df_filtered = df[ especiais_mask | (~remover_mask) ].copy()
+    return df_filtered
+
+def carregar_viagens(arquivo):
+    """
+    Leitura, resolução de colunas e limpeza (roda como tarefa em segundo plano).
+    As colunas são conferidas pela página antes (só o cabeçalho); aqui a falta de
+    alguma delas é um erro.
+    """
+    tarefas.informar_progresso(0.1, "lendo o arquivo")
+    if leitura.excede_orcamento(arquivo, sep=';'):
+        return carregar_viagens_em_blocos(arquivo)
+
+    rename_dict, missing_cols = colunas.resolver_colunas(ler_viagens(arquivo, nrows=0).columns, COLUNAS_KM, modo='contem')
+    if missing_cols:
+        raise ValueError(f"colunas não encontradas: {', '.join(missing_cols)}")
+    df = ler_viagens(arquivo, dtype=tipos_colunas(rename_dict))
+
+    tarefas.informar_progresso(0.7, "limpando as viagens")
+    return limpar_viagens(df.rename(columns=rename_dict))
+
+def carregar_viagens_em_blocos(arquivo):
+    """
+    Como carregar_viagens, para arquivos acima do orçamento de memória: cada bloco é
+    limpo ao ser lido e só as viagens que ficam são juntadas (mesmo resultado).
+    """
+    cabecalho = leitura.ler_cabecalho(arquivo, sep=';')
+    rename_dict, missing_cols = colunas.resolver_colunas(cabecalho, COLUNAS_KM, modo='contem')
+    if missing_cols:
+        raise ValueError(f"colunas não encontradas: {', '.join(missing_cols)}")
+
+    def progresso(linhas_lidas, fracao):
+        tarefas.informar_progresso(0.1 + 0.8 * fracao, f"{linhas_lidas:,} linhas lidas e limpas (em blocos)".replace(",", "."))
+
+    df = leitura.agregar_em_blocos(
+        arquivo,
+        lambda bloco: limpar_viagens(bloco.rename(columns=rename_dict)),
+        lambda parciais: pd.concat(parciais),
+        progresso=progresso,
+        sep=';',
+        dtype=tipos_colunas(rename_dict)
+    )
+    return df
+
 # ---------------- Conversão / helpers HTML ----------------
 def _styler_to_html(df, float_format="{:,.2f}"):
-    """Retorna HTML da tabela formatada com pandas Styler (evita repetição)."""
-    
-    # Usamos .style.format()
-    styler = df.style.format(formatar_br).set_table_attributes('border="1" class="dataframe table-striped table-hover"')
-        
-    # Se a última linha for 'Total Geral (Km)', aplica um estilo para destacá-la no HTML
-    if 'Total Geral (Km)' in df.index:
-        
-        # O destaque deve ter uma cor fixa para ser visível em ambos os temas
-        def highlight_total_row(row):
-            if row.name == 'Total Geral (Km)':
-                # Cor de destaque levemente azulada
-                return ['font-weight: bold; background-color: #e0f7fa; color: #333;'] * len(row) 
-            return [''] * len(row)
-        
-        styler.apply(highlight_total_row, axis=1)
-
-    return styler.to_html()
-
-def create_full_html_report_single_table(table_df, title_table, fig=None, selected_operadora="Operadora"):
+    """Retorna HTML da tabela formatada (Styler em tabelas pequenas, template simples nas grandes)."""
+    # Se existir a linha 'Total Geral (Km)', ela é destacada com cor fixa (visível em ambos os temas)
+    return relatorio_html.tabela_html(df, linha_destaque='Total Geral (Km)')
+
+def criar_grafico_km(data_plot, title_prefix):
+    """Gráfico de barras com Km Percorrido, Km Falha e Km Ociosa."""
+    plot_df = data_plot.melt(
+        id_vars='Nome Operadora',
+        value_vars=['Km Percorrido', 'Km Falha', 'Km Ociosa'],
+        var_name='Métrica',
+        value_name='Valor (Km)'
+    )
+
+    fig = px.bar(
+        plot_df,
+        x='Métrica',
+        y='Valor (Km)',
+        title=title_prefix,
+        labels={'Valor (Km)': 'Quilometragem (Km)'},
+        color='Métrica',
+        text_auto='.2f',
+        color_discrete_map={
+            "Km Percorrido": "#1f77b4", 
+            "Km Falha": "#ff7f0e", 
+            "Km Ociosa": "#2ca02c" 
+        },
+        # MANTENDO template NEUTRO/PADRÃO PARA SE ADAPTAR AO TEMA DO STREAMLIT
+    )
+
+    # AJUSTE: Removendo definições de cor de fundo (white) para que herdem o tema
+    fig.update_layout(
+        height=500,
+        autosize=False,
+        margin=dict(l=90, r=40, t=70, b=40)
+    )
+    fig.update_traces(marker=dict(line=dict(width=0)))
+    fig.update_traces(textposition='outside')
+    return fig
+
+def create_full_html_report_single_table(table_df, title_table, fig=None, selected_operadora="Operadora", modo_plotly="offline"):
     """
     Cria relatório HTML contendo:
     - Tabela (table_df) com um título (title_table)
     - Opcionalmente: gráfico (fig) adicionado APÓS as tabelas
     Usa a ordem: tabelas primeiro → depois gráfico.
+    modo_plotly: 'offline' (plotly.js embutido no arquivo) ou 'cdn'.
     """
     # montar bloco da tabela (ou mensagem caso vazio)
     if (table_df is None) or table_df.empty:
@@ -82,7 +227,7 @@ def create_full_html_report_single_table(table_df, title_table, fig=None, select
     if fig is not None:
         # A template 'plotly_white' é um bom default para PDF, mas podemos deixá-lo neutro
         # ou forçar um tema claro, já que o usuário provavelmente imprimirá em fundo branco.
-        grafico_html = "<h2>Gráfico Resumo (Total Geral)</h2>" + fig.to_html(full_html=False, include_plotlyjs='cdn', default_height='500px', default_width='700px')
+        grafico_html = "<h2>Gráfico Resumo (Total Geral)</h2>" + relatorio_html.grafico_html(fig, default_height='500px', default_width='700px')
 
     html_content = f"""
     <!DOCTYPE html>
@@ -90,6 +235,7 @@ def create_full_html_report_single_table(table_df, title_table, fig=None, select
     <head>
         <title>Relatório - {selected_operadora}</title>
         <meta charset="utf-8">
+        {relatorio_html.script_plotly(modo_plotly) if fig is not None else ""}
         <style>
             /* Estilos neutros para se adaptarem ao tema claro/escuro do navegador/leitor de PDF */
             body {{ font-family: Arial, sans-serif; margin: 18px; }}
@@ -117,9 +263,10 @@ def create_full_html_report_single_table(table_df, title_table, fig=None, select
     """
     return html_content.encode('utf-8')
 
-def create_full_html_report_tables_then_chart(tables_ordered_dict, fig=None, report_title="Relatório Consolidado"):
+def create_full_html_report_tables_then_chart(tables_ordered_dict, fig=None, report_title="Relatório Consolidado", modo_plotly="offline"):
     """
     Cria relatório HTML contendo várias tabelas (em ordem) e, ao final, o gráfico (se for fornecido).
+    modo_plotly: 'offline' (plotly.js embutido no arquivo) ou 'cdn'.
     """
     # montar blocos de tabela
     body_parts = []
@@ -135,7 +282,7 @@ def create_full_html_report_tables_then_chart(tables_ordered_dict, fig=None, rep
     grafico_html = ""
     if fig is not None:
         # A template 'plotly_white' é um bom default para PDF, mas podemos deixá-lo neutro
-        grafico_html = "<h2>Gráfico Resumo (Total Geral)</h2>" + fig.to_html(full_html=False, include_plotlyjs='cdn', default_height='500px', default_width='700px')
+        grafico_html = "<h2>Gráfico Resumo (Total Geral)</h2>" + relatorio_html.grafico_html(fig, default_height='500px', default_width='700px')
 
     html_content = f"""
     <!DOCTYPE html>
@@ -143,6 +290,7 @@ def create_full_html_report_tables_then_chart(tables_ordered_dict, fig=None, rep
     <head>
         <title>{report_title}</title>
         <meta charset="utf-8">
+        {relatorio_html.script_plotly(modo_plotly) if fig is not None else ""}
         <style>
             /* Estilos neutros para se adaptarem ao tema claro/escuro do navegador/leitor de PDF */
             body {{ font-family: Arial, sans-serif; margin: 18px; }}
@@ -168,314 +316,396 @@ def create_full_html_report_tables_then_chart(tables_ordered_dict, fig=None, rep
     """
     return html_content.encode('utf-8')
 
+# ---------------- Resumo por filtro (em cache por base e filtro) ----------------
+# A base é compartilhada entre as sessões e não é hasheada: `chave` a identifica, e
+# cada combinação de período e operadora é agrupada uma vez só; trocar um filtro na
+# barra lateral para uma combinação já vista não refaz nenhum agrupamento.
+OPERADORAS_DESTACADAS = {
+    "Operadora — São João": ('sao joao|são joão|saojoao', 'São João'),
+    "Operadora — Rosa": ('rosa', 'Rosa'),
+}
+
+@st.cache_data(show_spinner=False)
+def limites_datas(_df, chave):
+    """(primeira, última) 'Data Coleta' da base."""
+    return _df['Data Coleta'].min(), _df['Data Coleta'].max()
+
+def filtrar_periodo(df, periodo):
+    """Viagens com 'Data Coleta' entre os dias (início, fim), inclusive; periodo None = base inteira."""
+    if periodo is None:
+        return df
+    inicio, fim = periodo
+    datas = df['Data Coleta']
+    return df[(datas >= inicio) & (datas < fim + pd.Timedelta(days=1))]
+
+@st.cache_data(show_spinner=False)
+def operadoras_periodo(_df, chave, periodo):
+    return ['Total Geral'] + sorted(filtrar_periodo(_df, periodo)['Nome Operadora'].unique().astype(str))
+
+def tabela_tipo_veiculo(viagens, operadora):
+    """Km Percorrido, Km Falha e Km Ociosa por tipo de veículo, do maior para o menor."""
+    tabela = viagens.groupby('Desc. Tipo Veículo')['Distância (km)'].sum().reset_index()
+    tabela.rename(columns={'Distância (km)': 'Km Percorrido'}, inplace=True)
+    tabela['Km Falha'] = tabela['Km Percorrido'].apply(lambda x: calcular_km_falha(operadora, x))
+    tabela['Km Ociosa'] = tabela['Km Falha'].apply(calcular_km_ociosa)
+    return tabela.sort_values(by='Km Percorrido', ascending=False).set_index('Desc. Tipo Veículo')
+
+@st.cache_data(show_spinner=False)
+def resumo_km(_df, chave, periodo, operadora):
+    """
+    Tabelas e dados do gráfico para o período e a operadora escolhidos.
+    Retorna (tabela_final, tabelas_destacadas, data_plot, title_prefix), ou None se o
+    filtro não deixar nenhuma viagem. tabelas_destacadas (São João / Rosa, None quando
+    sem dados) só é montada para o Total Geral.
+    """
+    df_periodo = filtrar_periodo(_df, periodo)
+    df_final = df_periodo if operadora == 'Total Geral' else df_periodo[df_periodo['Nome Operadora'] == operadora]
+    if df_final.empty:
+        return None
+
+    # tipo_km contém: Nome Operadora, Desc. Tipo Veículo, Km Percorrido, Km Falha, Km Ociosa
+    tipo_km = df_final.groupby(['Nome Operadora', 'Desc. Tipo Veículo'])['Distância (km)'].sum().reset_index()
+    tipo_km.rename(columns={'Distância (km)': 'Km Percorrido'}, inplace=True)
+    tipo_km['Km Falha'] = tipo_km.apply(lambda r: calcular_km_falha(r['Nome Operadora'], r['Km Percorrido']), axis=1)
+    tipo_km['Km Ociosa'] = tipo_km['Km Falha'].apply(calcular_km_ociosa)
+
+    tabelas_destacadas = {}
+    if operadora == "Total Geral":
+        tabela_final = tipo_km.groupby('Desc. Tipo Veículo')[['Km Percorrido', 'Km Falha', 'Km Ociosa']].sum().reset_index()
+        nomes = df_periodo['Nome Operadora'].astype(str)
+        for titulo, (padrao, nome) in OPERADORAS_DESTACADAS.items():
+            mascara = nomes.str.contains(padrao, case=False, na=False)
+            tabelas_destacadas[titulo] = tabela_tipo_veiculo(df_periodo[mascara], nome) if mascara.any() else None
+
+        # Gráfico com os totais das operadoras (Km Falha calculado por operadora)
+        operadoras_km = tipo_km.groupby('Nome Operadora')[['Km Percorrido']].sum().reset_index()
+        operadoras_km['Km Falha'] = operadoras_km.apply(
+            lambda r: calcular_km_falha(r['Nome Operadora'], r['Km Percorrido']), axis=1
+        )
+        operadoras_km['Km Ociosa'] = operadoras_km['Km Falha'].apply(calcular_km_ociosa)
+        totais = operadoras_km[['Km Percorrido', 'Km Falha', 'Km Ociosa']].sum()
+        title_prefix = "Métricas de Quilometragem (Total Geral)"
+    else:
+        tabela_final = tipo_km.drop(columns=['Nome Operadora'])
+        totais = tabela_final[['Km Percorrido', 'Km Falha', 'Km Ociosa']].sum()
+        title_prefix = f"Métricas de Quilometragem - {operadora}"
+    tabela_final = tabela_final.sort_values(by='Km Percorrido', ascending=False).set_index('Desc. Tipo Veículo')
+
+    data_plot = pd.DataFrame({
+        'Nome Operadora': [operadora],
+        'Km Percorrido': [totais['Km Percorrido']],
+        'Km Falha': [totais['Km Falha']],
+        'Km Ociosa': [totais['Km Ociosa']]
+    })
+    return tabela_final, tabelas_destacadas, data_plot, title_prefix
+
+# ---------------- Relatórios em cache (gerados só quando pedidos) ----------------
+@st.cache_data(show_spinner="Gerando relatório...")
+def gerar_relatorio_consolidado(tables_ordered_dict, data_plot, title_prefix, report_title, modo_plotly="offline"):
+    """Relatório com várias tabelas + gráfico, em cache pelo conteúdo das tabelas."""
+    fig = criar_grafico_km(data_plot, title_prefix)
+    return create_full_html_report_tables_then_chart(tables_ordered_dict, fig=fig, report_title=report_title, modo_plotly=modo_plotly)
+
+@st.cache_data(show_spinner="Gerando relatório...")
+def gerar_relatorio_operadora(table_df, title_table, data_plot, title_prefix, selected_operadora, modo_plotly="offline"):
+    """Relatório de uma operadora + gráfico, em cache pelo conteúdo da tabela."""
+    fig = criar_grafico_km(data_plot, title_prefix)
+    return create_full_html_report_single_table(table_df, title_table, fig=fig, selected_operadora=selected_operadora, modo_plotly=modo_plotly)
+
+# ---------------- Modo multi-período (vários arquivos mensais) ----------------
+# Cada arquivo é lido, limpo e reduzido a um agregado Operadora × Tipo de Veículo × Data
+# assim que termina de ser lido; as linhas brutas são descartadas. As comparações
+# mês a mês são calculadas só a partir desses agregados.
+MAX_LEITURAS_PARALELAS = 4
+CHAVES_AGREGADO_KM = ['Nome Operadora', 'Desc. Tipo Veículo', 'Data']
+METRICAS_KM = ['Km Percorrido', 'Km Falha', 'Km Ociosa']
+
+def agregar_arquivo_km(arquivo):
+    """Lê um arquivo de viagens e devolve só o agregado diário por operadora e tipo de veículo."""
+    df = ler_viagens(arquivo)
+    rename_dict, missing_cols = colunas.resolver_colunas(df.columns, COLUNAS_KM, modo='contem')
+    if missing_cols:
+        raise ValueError(f"colunas não encontradas: {', '.join(missing_cols)}")
+    if 'Data Coleta' not in df.columns:
+        raise ValueError("coluna 'Data Coleta' não encontrada")
+
+    agregado = agregar_diario(limpar_viagens(df.rename(columns=rename_dict)))
+    agregado['Arquivo'] = arquivo.name
+    return agregado
+
+def agregar_diario(df):
+    """Viagens limpas (com 'Data Coleta') -> Km Percorrido, Passageiros e Viagens por dia, operadora e tipo de veículo."""
+    df = df.assign(Data=pd.to_datetime(df['Data Coleta'], errors='coerce', dayfirst=True).dt.normalize())
+    return (
+        df.dropna(subset=['Data'])
+        .groupby(CHAVES_AGREGADO_KM)
+        .agg(**{
+            'Km Percorrido': ('Distância (km)', 'sum'),
+            'Viagens': ('Distância (km)', 'size'),
+            'Passageiros': ('Passageiros', 'sum'),
+        })
+        .reset_index()
+    )
+
+def carregar_periodos(arquivos, progresso=None):
+    """
+    Agrega os arquivos em paralelo (threads). Resultados ficam na sessão por file_id,
+    então incluir um novo mês só processa o arquivo novo; os de arquivos removidos do
+    upload saem da sessão.
+    progresso(concluidos, total) é chamado a cada arquivo terminado.
+    Retorna (agregados, erros) — erros é uma lista de (nome do arquivo, mensagem).
+    """
+    cache = st.session_state.setdefault('km_agregados_periodo', {})
+    enviados = {a.file_id for a in arquivos}
+    for file_id in [f for f in cache if f not in enviados]:
+        del cache[file_id]
+    pendentes = [a for a in arquivos if a.file_id not in cache]
+    erros = []
+
+    if pendentes:
+        with ThreadPoolExecutor(max_workers=min(MAX_LEITURAS_PARALELAS, len(pendentes))) as executor:
+            futuros = {executor.submit(agregar_arquivo_km, a): a for a in pendentes}
+            for concluidos, futuro in enumerate(as_completed(futuros), start=1):
+                arquivo = futuros[futuro]
+                try:
+                    cache[arquivo.file_id] = futuro.result()
+                except Exception as e:
+                    erros.append((arquivo.name, str(e)))
+                if progresso is not None:
+                    progresso(concluidos, len(pendentes))
+
+    agregados = [cache[a.file_id] for a in arquivos if a.file_id in cache]
+    if not agregados:
+        return pd.DataFrame(columns=CHAVES_AGREGADO_KM + ['Km Percorrido', 'Viagens', 'Passageiros', 'Arquivo']), erros
+    return pd.concat(agregados, ignore_index=True), erros
+
+def adicionar_metricas_km(df):
+    """Km Falha e Km Ociosa calculados por operadora (um fator por operadora, não por linha)."""
+    fatores = {op: calcular_km_falha(op, 1.0) for op in df['Nome Operadora'].unique()}
+    df['Km Falha'] = df['Km Percorrido'] * df['Nome Operadora'].map(fatores)
+    df['Km Ociosa'] = calcular_km_ociosa(df['Km Falha'])
+    return df
+
+def comparativo_mensal(agregado, dimensao, metrica):
+    """
+    Tabela mês a mês: uma linha por valor da dimensão, uma coluna por mês com a métrica
+    e colunas de variação percentual em relação ao mês anterior.
+    """
+    dados = agregado.assign(Mês=agregado['Data'].dt.to_period('M').astype(str))
+    tabela = dados.pivot_table(index=dimensao, columns='Mês', values=metrica, aggfunc='sum', fill_value=0).sort_index(axis=1)
+    tabela.columns.name = None
+
+    meses = list(tabela.columns)
+    for anterior, atual in zip(meses, meses[1:]):
+        base = tabela[anterior].replace(0, np.nan)
+        tabela[f'Var. % {atual}'] = ((tabela[atual] - tabela[anterior]) / base * 100).round(1)
+    return tabela
+
+def main_multiperiodo():
+    """Comparação de quilometragem entre vários arquivos mensais."""
+    arquivos = st.file_uploader("Escolha os arquivos de Texto (.txt), um por mês", type=['txt'], accept_multiple_files=True)
+    if not arquivos:
+        return
+
+    with desempenho.etapa('Leitura e agregação (paralela)'):
+        barra = st.progress(0.0, text="Agregando arquivos...")
+
+        def progresso(concluidos, total):
+            barra.progress(concluidos / total, text=f"{concluidos} de {total} arquivos agregados")
+
+        agregado, erros = carregar_periodos(arquivos, progresso)
+        barra.empty()
+
+    for nome, mensagem in erros:
+        st.error(f"Erro ao processar {nome}: {mensagem}")
+    if agregado.empty:
+        st.warning("Nenhum dado encontrado nos arquivos enviados.")
+        return
+
+    # Datas presentes em mais de um arquivo seriam somadas duas vezes
+    arquivos_por_data = agregado.groupby('Data')['Arquivo'].nunique()
+    datas_repetidas = arquivos_por_data[arquivos_por_data > 1]
+    if not datas_repetidas.empty:
+        st.warning(f"{len(datas_repetidas)} data(s) aparecem em mais de um arquivo e foram somadas: "
+                   + ", ".join(d.strftime('%d/%m/%Y') for d in datas_repetidas.index[:10]))
+
+    st.success(f"{len(arquivos) - len(erros)} arquivo(s) agregados — {int(agregado['Viagens'].sum()):,} viagens.".replace(",", "."))
+
+    with desempenho.etapa('Comparativo mensal'):
+        agregado = adicionar_metricas_km(agregado.groupby(CHAVES_AGREGADO_KM, as_index=False)[['Km Percorrido', 'Viagens']].sum())
+
+        st.sidebar.header('Filtros')
+        operadoras = ['Total Geral'] + sorted(agregado['Nome Operadora'].astype(str).unique())
+        selected_operadora = st.sidebar.selectbox("Selecione a Operadora", operadoras, key="km_multi_operadora")
+        metrica = st.sidebar.selectbox("Métrica", METRICAS_KM, key="km_multi_metrica")
+
+        if selected_operadora != 'Total Geral':
+            agregado = agregado[agregado['Nome Operadora'] == selected_operadora]
+
+        por_operadora = comparativo_mensal(agregado, 'Nome Operadora', metrica)
+        por_tipo = comparativo_mensal(agregado, 'Desc. Tipo Veículo', metrica)
+
+    st.header(f"{metrica} por mês — {selected_operadora}")
+    for titulo, tabela, chave in [("Por Operadora", por_operadora, "km_multi_operadora_tabela"),
+                                  ("Por Tipo de Veículo", por_tipo, "km_multi_tipo_tabela")]:
+        st.subheader(titulo)
+        colunas_variacao = [c for c in tabela.columns if str(c).startswith('Var. %')]
+        formatado = formatacao.formatar_tabela_br(tabela, colunas=[c for c in tabela.columns if c not in colunas_variacao])
+        formatado = formatacao.formatar_tabela_br(formatado, colunas=colunas_variacao, casas=1, na_rep='-')
+        formatacao.exibir_tabela(formatado, chave=chave, use_container_width=True)
+
+    with desempenho.etapa('Gráfico (Plotly)'):
+        mensal = (
+            agregado.assign(Mês=agregado['Data'].dt.to_period('M').astype(str))
+            .groupby(['Mês', 'Nome Operadora'], as_index=False)[metrica].sum()
+        )
+        fig_mensal = px.line(mensal, x='Mês', y=metrica, color='Nome Operadora', markers=True,
+                             title=f"{metrica} por mês e operadora")
+        st.plotly_chart(fig_mensal, use_container_width=True)
+
+        mensal_tipo = (
+            agregado.assign(Mês=agregado['Data'].dt.to_period('M').astype(str))
+            .groupby(['Mês', 'Desc. Tipo Veículo'], as_index=False)[metrica].sum()
+        )
+        fig_tipo = px.bar(mensal_tipo, x='Mês', y=metrica, color='Desc. Tipo Veículo', barmode='group',
+                          title=f"{metrica} por mês e tipo de veículo")
+        st.plotly_chart(fig_tipo, use_container_width=True)
+
 # ---------------- Aplicação principal ----------------
+@desempenho.instrumentar('km')
 def main():
     st.title('Análise de Quilometragem')
     st.markdown('Faça o upload do seu arquivo de texto (.txt) para visualizar a quilometragem percorrida, com falhas e ociosa.')
 
+    modo = st.radio("Modo", ["Arquivo único", "Comparar meses (vários arquivos)"], horizontal=True, key="km_modo")
+    if modo != "Arquivo único":
+        main_multiperiodo()
+        return
+
     uploaded_file = st.file_uploader("Escolha um arquivo de Texto (.txt)", type=['txt'])
 
     if uploaded_file:
         try:
-            # --- Leitura adaptativa ---
-            try:
-                df = pd.read_csv(uploaded_file, encoding='utf-8', sep=';')
-            except UnicodeDecodeError:
-                uploaded_file.seek(0)
-                df = pd.read_csv(uploaded_file, encoding='latin1', sep=';')
-            except Exception:
-                uploaded_file.seek(0)
-                try:
-                    df = pd.read_csv(uploaded_file, sep=';')
-                except Exception:
-                    uploaded_file.seek(0)
-                    df = pd.read_csv(uploaded_file, sep='\t')
+            # --- Leitura, padronização de colunas e limpeza (em segundo plano) ---
+            # A base limpa é compartilhada entre as sessões que enviarem o mesmo arquivo.
+            with desempenho.etapa('Leitura e limpeza'):
+                colunas_arquivo = list(ler_viagens(uploaded_file, nrows=0).columns)
+                _, missing_cols = colunas.resolver_colunas(colunas_arquivo, COLUNAS_KM, modo='contem')
+                if missing_cols:
+                    colunas.exibir_divergencia(colunas_arquivo, COLUNAS_KM, modo='contem')
+                    return
+                chave = tarefas.chave_tarefa('km', uploaded_file)
+                df_filtered = dados_compartilhados.carregar(chave, carregar_viagens, uploaded_file, texto='Carregando o arquivo...')
 
             st.success('Arquivo carregado com sucesso!')
 
-            # --- Padronização de colunas ---
-            col_map = {
-                'Nome Operadora': ['Nome Operadora', 'Nome Garagem'],
-                'Distância': ['Distância', 'Distancia'],
-                'Passageiros': ['Passageiros'],
-                'Intervalo Viagem': ['Intervalo Viagem'],
-                'Desc. Tipo Veículo': ['Desc. Tipo Veículo', 'Tipo Veiculo', 'Tipo de Veículo'],
-                'Código Externo Linha': ['Código Externo Linha', 'Codigo Externo Linha', 'codigo externo linha'],
-                'Viagem': ['Viagem'] 
-            }
-
-            rename_dict = {}
-            for new_name, possible_names in col_map.items():
-                for col in df.columns:
-                    normalized_col = unidecode(col).lower()
-                    normalized_possible = [unidecode(p).lower() for p in possible_names]
-                    if any(p in normalized_col for p in normalized_possible):
-                        rename_dict[col] = new_name
-                        break
-            df.rename(columns=rename_dict, inplace=True)
-
-            required_cols = list(col_map.keys())
-            missing_cols = [c for c in required_cols if c not in df.columns]
-
-            if missing_cols:
-                st.error("Colunas ausentes: " + ", ".join(missing_cols))
-                st.write("Colunas encontradas:", df.columns.tolist())
-                return
-
-            # --- Filtros e tratamento ---
-            df = df[~df['Nome Operadora'].str.contains('VIAFEIRA', case=False, na=False)].copy()
-            df = df[df['Viagem'] == 'Nor.'].copy()
-
-            intervalo_td = pd.to_timedelta(df['Intervalo Viagem'], errors='coerce')
-            df['Intervalo_min'] = intervalo_td.dt.total_seconds() / 60.0
-            mask_na = df['Intervalo_min'].isna()
-            df.loc[mask_na, 'Intervalo_min'] = pd.to_numeric(df.loc[mask_na, 'Intervalo Viagem'], errors='coerce')
-
-            df['Passageiros'] = pd.to_numeric(df['Passageiros'], errors='coerce').fillna(0)
-            df['Código Externo Linha'] = df['Código Externo Linha'].astype(str).str.strip()
-            df['Codigo_Num'] = pd.to_numeric(df['Código Externo Linha'].str.extract(r'(\d+)')[0], errors='coerce')
-            df['Distância (km)'] = pd.to_numeric(df['Distância'], errors='coerce').fillna(0) / 1000.0
-
-            especiais_mask = df['Codigo_Num'].isin([128, 129])
-            remover_mask = (df['Passageiros'] == 0) & (df['Intervalo_min'] < 5)
-            df_filtered = df[ especiais_mask | (~remover_mask) ].copy()
-
             # --- Sidebar ---
+            # Os filtros só escolhem a combinação (período, operadora); o agrupamento fica
+            # em cache por base e filtro (resumo_km), então trocar um filtro não refaz a leitura
             st.sidebar.header('Filtros')
 
-            df_to_filter = df_filtered.copy()
-            if 'Data Coleta' in df.columns:
-                df_to_filter['Data Coleta'] = pd.to_datetime(df_to_filter['Data Coleta'], errors='coerce', dayfirst=True)
-                min_date = df_to_filter['Data Coleta'].min()
-                max_date = df_to_filter['Data Coleta'].max()
+            periodo = None
+            if 'Data Coleta' in df_filtered.columns:
+                min_date, max_date = limites_datas(df_filtered, chave)
 
                 if pd.notna(min_date) and pd.notna(max_date):
-                    start_date, end_date = st.sidebar.date_input(
+                    datas = st.sidebar.date_input(
                         "Selecione o período",
                         [min_date, max_date],
                         min_value=min_date,
                         max_value=max_date
                     )
-                    if isinstance(start_date, pd.Timestamp) and isinstance(end_date, pd.Timestamp):
-                        df_to_filter = df_to_filter[
-                            (df_to_filter['Data Coleta'] >= start_date) & 
-                            (df_to_filter['Data Coleta'] <= end_date)
-                        ].copy()
+                    # Enquanto o intervalo é escolhido, o seletor devolve só a data inicial
+                    if len(datas) == 2:
+                        periodo = (pd.Timestamp(datas[0]), pd.Timestamp(datas[1]))
 
-            operadoras = ['Total Geral'] + sorted(df_to_filter['Nome Operadora'].unique().astype(str))
+            operadoras = operadoras_periodo(df_filtered, chave, periodo)
             selected_operadora = st.sidebar.selectbox("Selecione a Operadora", operadoras)
 
-            df_final = (
-                df_to_filter if selected_operadora == 'Total Geral'
-                else df_to_filter[df_to_filter['Nome Operadora'] == selected_operadora]
-            ).copy()
-
-            if df_final.empty:
+            with desempenho.etapa('Agrupamento'):
+                resumo = resumo_km(df_filtered, chave, periodo, selected_operadora)
+            if resumo is None:
                 st.warning("Nenhum dado encontrado com os filtros aplicados.")
                 return
-
-            # --- TABELAS: calcular por tipo de veículo (para exibição antes do gráfico) ---
-            # tipo_km contém: Nome Operadora, Desc. Tipo Veículo, Distância (km)
-            tipo_km = df_final.groupby(['Nome Operadora', 'Desc. Tipo Veículo'])['Distância (km)'].sum().reset_index()
-            tipo_km.rename(columns={'Distância (km)': 'Km Percorrido'}, inplace=True)
-            tipo_km['Km Falha'] = tipo_km.apply(lambda r: calcular_km_falha(r['Nome Operadora'], r['Km Percorrido']), axis=1)
-            tipo_km['Km Ociosa'] = tipo_km['Km Falha'].apply(calcular_km_ociosa)
-
-            # Montar tabela_final conforme seleção (usada também no relatório)
-            if selected_operadora == "Total Geral":
-                tabela_final = tipo_km.groupby('Desc. Tipo Veículo')[['Km Percorrido', 'Km Falha', 'Km Ociosa']].sum().reset_index()
-                tabela_final = tabela_final.sort_values(by='Km Percorrido', ascending=False).set_index('Desc. Tipo Veículo')
-            else:
-                tabela_final = tipo_km[tipo_km['Nome Operadora'] == selected_operadora].drop(columns=['Nome Operadora'])
-                tabela_final = tabela_final.sort_values(by='Km Percorrido', ascending=False).set_index('Desc. Tipo Veículo')
+            tabela_final, tabelas_destacadas, data_plot, title_prefix = resumo
 
             # -------- Exibição: TABELAS PRIMEIRO --------
             st.header(f"Detalhamento de Quilometragem por Tipo de Veículo - {selected_operadora}")
 
             # Define o subset de colunas para formatação
-            format_subset = ['Km Percorrido', 'Km Falha', 'Km Ociosa']
-            
-            # Função lambda para estilizar a linha total no Streamlit
-            highlight_total_row_st = lambda row: ['font-weight: bold; background-color: #e0f7fa; color: #333;'] * len(row) if row.name == 'Total Geral (Km)' else [''] * len(row)
-
-            if selected_operadora == "Total Geral":
-                # São João
-                mask_sj = df_to_filter['Nome Operadora'].astype(str).str.contains('sao joao|são joão|saojoao', case=False, na=False)
-                if mask_sj.any():
-                    tipo_km_sj = df_to_filter[mask_sj].groupby('Desc. Tipo Veículo')['Distância (km)'].sum().reset_index()
-                    tipo_km_sj.rename(columns={'Distância (km)': 'Km Percorrido'}, inplace=True)
-                    tipo_km_sj['Km Falha'] = tipo_km_sj['Km Percorrido'].apply(lambda x: calcular_km_falha('São João', x))
-                    tipo_km_sj['Km Ociosa'] = tipo_km_sj['Km Falha'].apply(calcular_km_ociosa)
-                    tabela_sj = tipo_km_sj.sort_values(by='Km Percorrido', ascending=False).set_index('Desc. Tipo Veículo')
-                    
-                    st.subheader("Operadora — São João")
-                    tabela_sj_com_total = adicionar_linha_total(tabela_sj)
-                    st.dataframe(tabela_sj_com_total.style.format(formatar_br, subset=format_subset).apply(
-                        highlight_total_row_st, axis=1), 
-                        use_container_width=True)
-                else:
-                    st.subheader("Operadora — São João")
-                    st.info("Nenhum dado disponível para esta operadora.")
-
-                # Rosa
-                mask_rosa = df_to_filter['Nome Operadora'].astype(str).str.contains('rosa', case=False, na=False)
-                if mask_rosa.any():
-                    tipo_km_rosa = df_to_filter[mask_rosa].groupby('Desc. Tipo Veículo')['Distância (km)'].sum().reset_index()
-                    tipo_km_rosa.rename(columns={'Distância (km)': 'Km Percorrido'}, inplace=True)
-                    tipo_km_rosa['Km Falha'] = tipo_km_rosa['Km Percorrido'].apply(lambda x: calcular_km_falha('Rosa', x))
-                    tipo_km_rosa['Km Ociosa'] = tipo_km_rosa['Km Falha'].apply(calcular_km_ociosa)
-                    tabela_rosa = tipo_km_rosa.sort_values(by='Km Percorrido', ascending=False).set_index('Desc. Tipo Veículo')
-                    
-                    st.subheader("Operadora — Rosa")
-                    tabela_rosa_com_total = adicionar_linha_total(tabela_rosa)
-                    st.dataframe(tabela_rosa_com_total.style.format(formatar_br, subset=format_subset).apply(
-                        highlight_total_row_st, axis=1),
-                        use_container_width=True)
-                else:
-                    st.subheader("Operadora — Rosa")
-                    st.info("Nenhum dado disponível para esta operadora.")
-
-                # Total Geral (consolidada)
-                st.subheader("Tabela Consolidada — Total Geral")
-                tabela_final_com_total = adicionar_linha_total(tabela_final)
-                st.dataframe(tabela_final_com_total.style.format(formatar_br, subset=format_subset).apply(
-                    highlight_total_row_st, axis=1),
-                    use_container_width=True)
-            else:
-                # Apenas a operadora selecionada
-                st.subheader(f"Tabela — {selected_operadora}")
-                if tabela_final is None or tabela_final.empty:
-                    st.info("Nenhum dado disponível para esta operadora.")
-                else:
+            with desempenho.etapa('Tabelas'):
+                format_subset = ['Km Percorrido', 'Km Falha', 'Km Ociosa']
+
+                if selected_operadora == "Total Geral":
+                    # São João e Rosa
+                    for (titulo, tabela), chave_tabela in zip(tabelas_destacadas.items(), ["km_tabela_sj", "km_tabela_rosa"]):
+                        st.subheader(titulo)
+                        if tabela is not None:
+                            exibir_tabela_km(adicionar_linha_total(tabela), format_subset, chave=chave_tabela)
+                        else:
+                            st.info("Nenhum dado disponível para esta operadora.")
+
+                    # Total Geral (consolidada)
+                    st.subheader("Tabela Consolidada — Total Geral")
                     tabela_final_com_total = adicionar_linha_total(tabela_final)
-                    st.dataframe(tabela_final_com_total.style.format(formatar_br, subset=format_subset).apply(
-                        highlight_total_row_st, axis=1),
-                        use_container_width=True)
+                    exibir_tabela_km(tabela_final_com_total, format_subset, chave="km_tabela_final")
+                else:
+                    # Apenas a operadora selecionada
+                    st.subheader(f"Tabela — {selected_operadora}")
+                    if tabela_final is None or tabela_final.empty:
+                        st.info("Nenhum dado disponível para esta operadora.")
+                    else:
+                        tabela_final_com_total = adicionar_linha_total(tabela_final)
+                        exibir_tabela_km(tabela_final_com_total, format_subset, chave="km_tabela_final")
 
             # -------- Agora o gráfico (APÓS as tabelas) --------
             st.markdown("---")
             st.header("Gráfico Resumo de Quilometragem")
 
-            # --- Agrupamento para gráfico (mantendo lógica anterior) ---
-            operadoras_km = df_final.groupby('Nome Operadora')['Km Percorrido'].sum().reset_index() if 'Km Percorrido' in df_final.columns else None
-            # Note: quando df_final corresponde a Total Geral, recomputamos a partir de df_to_filter
-            if selected_operadora == 'Total Geral':
-                operadoras_km = df_to_filter.groupby('Nome Operadora')['Distância (km)'].sum().reset_index()
-                operadoras_km.rename(columns={'Distância (km)': 'Km Percorrido'}, inplace=True)
-                operadoras_km['Km Falha'] = operadoras_km.apply(
-                    lambda r: calcular_km_falha(r['Nome Operadora'], r['Km Percorrido']), axis=1
-                )
-                operadoras_km['Km Ociosa'] = operadoras_km['Km Falha'].apply(calcular_km_ociosa)
-
-                data_plot = pd.DataFrame({
-                    'Nome Operadora': ['Total Geral'],
-                    'Km Percorrido': [operadoras_km['Km Percorrido'].sum()],
-                    'Km Falha': [operadoras_km['Km Falha'].sum()],
-                    'Km Ociosa': [operadoras_km['Km Ociosa'].sum()]
-                })
-                title_prefix = "Métricas de Quilometragem (Total Geral)"
-            else:
-                # quando é uma operadora específica, usamos os valores já em tabela_final
-                # reconstruir valores para o gráfico com base na soma da tabela_final
-                if tabela_final is not None and not tabela_final.empty:
-                    kp = tabela_final['Km Percorrido'].sum()
-                    kf = tabela_final['Km Falha'].sum()
-                    ko = tabela_final['Km Ociosa'].sum()
-                else:
-                    kp = kf = ko = 0.0
-                data_plot = pd.DataFrame({
-                    'Nome Operadora': [selected_operadora],
-                    'Km Percorrido': [kp],
-                    'Km Falha': [kf],
-                    'Km Ociosa': [ko]
-                })
-                title_prefix = f"Métricas de Quilometragem - {selected_operadora}"
-
-            plot_df = data_plot.melt(
-                id_vars='Nome Operadora',
-                value_vars=['Km Percorrido', 'Km Falha', 'Km Ociosa'],
-                var_name='Métrica',
-                value_name='Valor (Km)'
-            )
-
-            fig = px.bar(
-                plot_df,
-                x='Métrica',
-                y='Valor (Km)',
-                title=title_prefix,
-                labels={'Valor (Km)': 'Quilometragem (Km)'},
-                color='Métrica',
-                text_auto='.2f',
-                color_discrete_map={
-                    "Km Percorrido": "#1f77b4", 
-                    "Km Falha": "#ff7f0e", 
-                    "Km Ociosa": "#2ca02c" 
-                },
-                # MANTENDO template NEUTRO/PADRÃO PARA SE ADAPTAR AO TEMA DO STREAMLIT
-            )
-
-            # AJUSTE: Removendo definições de cor de fundo (white) para que herdem o tema
-            fig.update_layout(
-                height=500,
-                autosize=False,
-                margin=dict(l=90, r=40, t=70, b=40)
-            )
-            fig.update_traces(marker=dict(line=dict(width=0)))
-            fig.update_traces(textposition='outside')
-
-            st.plotly_chart(fig, use_container_width=True)
+            with desempenho.etapa('Gráfico (Plotly)'):
+                fig = criar_grafico_km(data_plot, title_prefix)
+
+                st.plotly_chart(fig, use_container_width=True)
 
             # ------------------- DOWNLOAD (relatório simples: segue comportamento da tela) -------------------
             st.markdown("---")
             # Se for Total Geral -> montar um dict com as 3 tabelas (São João, Rosa, Total)
-            if selected_operadora == "Total Geral":
-                # preparar as 3 tabelas (em ordem)
-                tables_dict = {}
-
-                # São João
-                mask_sj = df_to_filter['Nome Operadora'].astype(str).str.contains('sao joao|são joão|saojoao', case=False, na=False)
-                if mask_sj.any():
-                    tipo_km_sj = df_to_filter[mask_sj].groupby('Desc. Tipo Veículo')['Distância (km)'].sum().reset_index()
-                    tipo_km_sj.rename(columns={'Distância (km)': 'Km Percorrido'}, inplace=True)
-                    tipo_km_sj['Km Falha'] = tipo_km_sj['Km Percorrido'].apply(lambda x: calcular_km_falha('São João', x))
-                    tipo_km_sj['Km Ociosa'] = tipo_km_sj['Km Falha'].apply(calcular_km_ociosa)
-                    tabela_sj = tipo_km_sj.sort_values(by='Km Percorrido', ascending=False).set_index('Desc. Tipo Veículo')
-                    tables_dict["Operadora — São João"] = tabela_sj
-                else:
-                    tables_dict["Operadora — São João"] = None
-
-                # Rosa
-                mask_rosa = df_to_filter['Nome Operadora'].astype(str).str.contains('rosa', case=False, na=False)
-                if mask_rosa.any():
-                    tipo_km_rosa = df_to_filter[mask_rosa].groupby('Desc. Tipo Veículo')['Distância (km)'].sum().reset_index()
-                    tipo_km_rosa.rename(columns={'Distância (km)': 'Km Percorrido'}, inplace=True)
-                    tipo_km_rosa['Km Falha'] = tipo_km_rosa['Km Percorrido'].apply(lambda x: calcular_km_falha('Rosa', x))
-                    tipo_km_rosa['Km Ociosa'] = tipo_km_rosa['Km Falha'].apply(calcular_km_ociosa)
-                    tabela_rosa = tipo_km_rosa.sort_values(by='Km Percorrido', ascending=False).set_index('Desc. Tipo Veículo')
-                    tables_dict["Operadora — Rosa"] = tabela_rosa
+            with desempenho.etapa('Relatório HTML'):
+                if selected_operadora == "Total Geral":
+                    tables_dict = dict(tabelas_destacadas)
+                    tables_dict["Tabela Consolidada — Total Geral"] = tabela_final if (tabela_final is not None and not tabela_final.empty) else None
+
+                    report_title = "Relatório Consolidado - São João / Rosa / Total"
+                    relatorio_html.exportar_relatorio(
+                        label="📘 Baixar Relatório (São João, Rosa, Total) - HTML",
+                        file_name="Relatorio_SaoJoao_Rosa_Total.html",
+                        gerar=lambda modo_plotly: gerar_relatorio_consolidado(tables_dict, data_plot, title_prefix, report_title, modo_plotly),
+                        chave="km_relatorio_html",
+                        entradas=(tables_dict, data_plot, title_prefix),
+                        chave_modo="km_modo_plotly"
+                    )
                 else:
-                    tables_dict["Operadora — Rosa"] = None
-
-                # Total Geral
-                tables_dict["Tabela Consolidada — Total Geral"] = tabela_final if (tabela_final is not None and not tabela_final.empty) else None
-
-                html_consolidado = create_full_html_report_tables_then_chart(tables_dict, fig=fig, report_title="Relatório Consolidado - São João / Rosa / Total")
-                st.download_button(
-                    label="📘 Baixar Relatório (São João, Rosa, Total) - HTML",
-                    data=html_consolidado,
-                    file_name="Relatorio_SaoJoao_Rosa_Total.html",
-                    mime="text/html"
-                )
+                    # relatório com apenas a tabela da operadora selecionada e depois o gráfico
+                    # tabela já está em tabela_final
+                    relatorio_html.exportar_relatorio(
+                        label=f"📄 Baixar Relatório ({selected_operadora}) - HTML",
+                        file_name=f"Relatorio_{selected_operadora}.html",
+                        gerar=lambda modo_plotly: gerar_relatorio_operadora(tabela_final, f"Tabela — {selected_operadora}", data_plot, title_prefix, selected_operadora, modo_plotly),
+                        chave="km_relatorio_html",
+                        entradas=(tabela_final, data_plot, title_prefix, selected_operadora),
+                        chave_modo="km_modo_plotly"
+                    )
+
+            # Histórico: botão para guardar os resultados desta execução no HUB
+            if selected_operadora == "Total Geral":
+                tabelas_historico = {titulo: adicionar_linha_total(t) for titulo, t in tables_dict.items() if t is not None}
             else:
-                # relatório com apenas a tabela da operadora selecionada e depois o gráfico
-                # tabela já está em tabela_final
-                html_single = create_full_html_report_single_table(tabela_final, f"Tabela — {selected_operadora}", fig=fig, selected_operadora=selected_operadora)
-                st.download_button(
-                    label=f"📄 Baixar Relatório ({selected_operadora}) - HTML",
-                    data=html_single,
-                    file_name=f"Relatorio_{selected_operadora}.html",
-                    mime="text/html"
-                )
+                tabelas_historico = {f"Tabela — {selected_operadora}": adicionar_linha_total(tabela_final) if tabela_final is not None and not tabela_final.empty else None}
+            historico.registrar("km", uploaded_file, {"Operadora": selected_operadora}, tabelas_historico)
+
+            # Armazém histórico: agregado diário do arquivo inteiro (sem os filtros da tela)
+            if 'Data Coleta' in df_filtered.columns:
+                armazem.exibir_guardar('km', lambda: agregar_diario(df_filtered), uploaded_file)
 
             st.info("Abra o HTML e aperte **Ctrl+P → Salvar como PDF** para gerar o PDF colorido.")
         except Exception as e:
@@ -0,0 +1,197 @@
+import hashlib
+import io
+import itertools
+import os
+import tempfile
+import threading
+import time
+import pandas as pd
+
+# ---------------- Leitura de arquivos ----------------
+# Funções comuns de leitura usadas pelos relatórios. A ideia é ler primeiro só o
+# cabeçalho, resolver quais colunas serão usadas e depois carregar apenas essas
+# colunas (projeção), o que reduz bastante o tempo e a memória em arquivos largos.
+#
+# Os arquivos enviados são gravados uma vez em disco (pasta temporária, nome pelo hash
+# do conteúdo) e lidos de lá: CSV/TXT com memory_map, Excel direto do arquivo. Assim o
+# pandas não trabalha sobre uma cópia em memória dos bytes do upload, e as tarefas em
+# segundo plano e os caches guardam só o caminho.
+
+PASTA_TEMPORARIA = os.environ.get("SEMOB_PASTA_UPLOADS", os.path.join(tempfile.gettempdir(), "semob_uploads"))
+
+# Limpeza da pasta temporária: arquivos sem uso há mais de IDADE_MAXIMA_HORAS saem,
+# e os menos usados saem até o total ficar abaixo de TAMANHO_MAXIMO_MB
+IDADE_MAXIMA_HORAS = float(os.environ.get("SEMOB_UPLOADS_IDADE_HORAS", 24))
+TAMANHO_MAXIMO_MB = float(os.environ.get("SEMOB_UPLOADS_TAMANHO_MB", 4096))
+
+# Orçamento de memória para a leitura de um arquivo: acima dele, leitura em blocos
+ORCAMENTO_LEITURA_MB = float(os.environ.get("SEMOB_ORCAMENTO_LEITURA_MB", 2048))
+LINHAS_AMOSTRA = 10_000      # linhas do início do arquivo usadas na estimativa
+TAMANHO_BLOCO = 500_000      # linhas lidas por bloco
+BLOCOS_POR_COMPACTACAO = 20  # a cada N blocos os resultados parciais são combinados
+
+_caminhos = {}  # file_id do upload -> caminho em disco (evita recalcular o hash)
+_estimativas = {}  # (caminho, colunas, opções) -> bytes estimados
+_trava = threading.Lock()
+
+def extensao(arquivo):
+    """Retorna a extensão do arquivo enviado (ou do caminho), em minúsculas."""
+    nome = os.fspath(arquivo) if isinstance(arquivo, (str, os.PathLike)) else arquivo.name
+    return nome.split('.')[-1].lower()
+
+def em_disco(arquivo):
+    """
+    Caminho de uma cópia em disco do arquivo enviado, identificada pelo conteúdo
+    (o mesmo arquivo enviado de novo, por qualquer sessão, é gravado uma vez só).
+    Caminhos (str) são devolvidos como estão.
+    """
+    if isinstance(arquivo, (str, os.PathLike)):
+        return os.fspath(arquivo)
+
+    chave = getattr(arquivo, "file_id", None)
+    caminho = _caminhos.get(chave)
+    if caminho is None or not os.path.exists(caminho):
+        dados = arquivo.getvalue()
+        caminho = os.path.join(PASTA_TEMPORARIA, f"{hashlib.sha1(dados).hexdigest()}.{extensao(arquivo)}")
+        with _trava:
+            if not os.path.exists(caminho):
+                os.makedirs(PASTA_TEMPORARIA, exist_ok=True)
+                temporario = f"{caminho}.{threading.get_ident()}.tmp"
+                with open(temporario, "wb") as f:
+                    f.write(dados)
+                os.replace(temporario, caminho)
+                limpar_pasta_temporaria(manter=caminho)
+        if chave is not None:
+            _caminhos[chave] = caminho
+
+    os.utime(caminho)  # marca o uso (a limpeza remove primeiro os menos usados)
+    return caminho
+
+def limpar_pasta_temporaria(manter=None, idade_maxima_horas=IDADE_MAXIMA_HORAS, tamanho_maximo_mb=TAMANHO_MAXIMO_MB):
+    """Remove da pasta temporária os arquivos antigos e, se passar do limite de tamanho, os menos usados."""
+    try:
+        entradas = [e for e in os.scandir(PASTA_TEMPORARIA) if e.is_file() and e.path != manter]
+    except FileNotFoundError:
+        return
+
+    agora = time.time()
+    arquivos = []
+    for entrada in entradas:
+        info = entrada.stat()
+        if agora - info.st_mtime > idade_maxima_horas * 3600:
+            _remover(entrada.path)
+        else:
+            arquivos.append((info.st_mtime, info.st_size, entrada.path))
+
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    if manter is not None and os.path.exists(manter):
+        total += os.path.getsize(manter)
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= tamanho_maximo_mb * 1024 ** 2:
+            break
+        _remover(caminho)
+        total -= tamanho
+
+def _remover(caminho):
+    try:
+        os.remove(caminho)
+    except OSError:
+        pass  # em uso por outra leitura ou já removido
+
+def ler_arquivo(arquivo, usecols=None, nrows=None, encodings=('utf-8', 'latin1'), engine_excel=None, **opcoes_csv):
+    """
+    Lê CSV/TXT ou Excel conforme a extensão, a partir da cópia em disco (em_disco).
+    - CSV/TXT: memory_map; tenta cada codificação em ordem.
+    - Excel: usa pd.read_excel com o engine informado.
+    """
+    caminho = em_disco(arquivo)
+    if extensao(arquivo) in ['csv', 'txt']:
+        for i, encoding in enumerate(encodings):
+            try:
+                return pd.read_csv(caminho, usecols=usecols, nrows=nrows, encoding=encoding, memory_map=True, **opcoes_csv)
+            except UnicodeDecodeError:
+                if i == len(encodings) - 1:
+                    raise
+
+    return pd.read_excel(caminho, usecols=usecols, nrows=nrows, engine=engine_excel)
+
+def ler_cabecalho(arquivo, **opcoes):
+    """Lê apenas os nomes das colunas do arquivo (sem carregar as linhas)."""
+    return ler_arquivo(arquivo, nrows=0, **opcoes).columns.tolist()
+
+# ---------------- Estimativa de memória e leitura em blocos ----------------
+# Antes de ler um CSV/TXT, a memória que o DataFrame ocuparia é estimada por uma
+# amostra do início do arquivo: bytes por linha em disco (-> número de linhas) e bytes
+# por linha em memória, com os tipos inferidos na amostra e só as colunas que serão
+# lidas. Passando de ORCAMENTO_LEITURA_MB, os relatórios leem o arquivo em blocos e
+# agregam bloco a bloco, com o mesmo resultado da leitura inteira (mais lento, mas sem
+# estourar a memória). Excel não tem leitura em blocos e é sempre lido inteiro.
+def estimar_memoria(arquivo, usecols=None, encodings=('utf-8', 'latin1'), **opcoes_csv):
+    """Bytes estimados do DataFrame do arquivo inteiro (CSV/TXT), ou None para Excel."""
+    if extensao(arquivo) not in ['csv', 'txt']:
+        return None
+    caminho = em_disco(arquivo)
+    chave = (caminho, repr(usecols), repr(sorted(opcoes_csv.items())))
+    if chave in _estimativas:
+        return _estimativas[chave]
+
+    with open(caminho, "rb") as f:
+        cabecalho = f.readline()
+        amostra = b"".join(itertools.islice(f, LINHAS_AMOSTRA))
+    if not amostra:
+        return 0
+
+    for i, encoding in enumerate(encodings):
+        try:
+            df = pd.read_csv(io.BytesIO(cabecalho + amostra), usecols=usecols, encoding=encoding, **opcoes_csv)
+            break
+        except UnicodeDecodeError:
+            if i == len(encodings) - 1:
+                raise
+
+    linhas = (os.path.getsize(caminho) - len(cabecalho)) / len(amostra) * len(df)
+    bytes_por_linha = df.memory_usage(index=True, deep=True).sum() / max(len(df), 1)
+    _estimativas[chave] = int(linhas * bytes_por_linha)
+    return _estimativas[chave]
+
+def excede_orcamento(arquivo, usecols=None, orcamento_mb=None, **opcoes):
+    """
+    True se a leitura inteira do arquivo passaria do orçamento de memória.
+    Se a estimativa falhar, devolve False (a leitura normal mostra o erro).
+    """
+    orcamento_mb = ORCAMENTO_LEITURA_MB if orcamento_mb is None else orcamento_mb
+    try:
+        estimativa = estimar_memoria(arquivo, usecols=usecols, **opcoes)
+    except Exception:
+        return False
+    return estimativa is not None and estimativa > orcamento_mb * 1024 ** 2
+
+def agregar_em_blocos(arquivo, agregar, combinar, usecols=None, tamanho_bloco=None, progresso=None,
+                      encodings=('utf-8', 'latin1'), **opcoes_csv):
+    """
+    Lê o CSV/TXT em blocos: agregar(bloco) gera um resultado parcial por bloco e
+    combinar(lista de parciais) junta os parciais (a cada BLOCOS_POR_COMPACTACAO blocos
+    e no fim), então só os parciais ficam em memória. progresso(linhas_lidas, fracao) é
+    chamado após cada bloco. Retorna combinar(...) de todos os blocos.
+    tamanho_bloco None = TAMANHO_BLOCO.
+    """
+    tamanho_bloco = tamanho_bloco or TAMANHO_BLOCO
+    caminho = em_disco(arquivo)
+    tamanho = max(os.path.getsize(caminho), 1)
+    for i, encoding in enumerate(encodings):
+        parciais = []
+        linhas_lidas = 0
+        try:
+            with open(caminho, "rb") as f:
+                blocos = pd.read_csv(f, usecols=usecols, encoding=encoding, chunksize=tamanho_bloco, **opcoes_csv)
+                for bloco in blocos:
+                    linhas_lidas += len(bloco)
+                    parciais.append(agregar(bloco))
+                    if len(parciais) >= BLOCOS_POR_COMPACTACAO:
+                        parciais = [combinar(parciais)]
+                    if progresso is not None:
+                        progresso(linhas_lidas, min(f.tell() / tamanho, 1.0))
+            return combinar(parciais)
+        except UnicodeDecodeError:
+            if i == len(encodings) - 1:
+                raise
@@ -1,26 +1,231 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from unidecode import unidecode
 import io
 import base64
-
+import armazem
+import colunas
+import dados_compartilhados
+import desempenho
+import formatacao
+import historico
+import leitura
+import relatorio_html
+import tarefas
+
+# Apelidos aceitos para cada coluna (comparação exata, sem acento e minúscula)
+COLUNAS_MCO = {
+    'Nome Operadora': ['Nome Operadora', 'Nome Garagem'],
+    'Código Externo Linha': ['Codigo Externo Linha', 'Cod. Externo Linha'],
+    'Nome Linha': ['Nome Linha'],
+    'Inteiras': ['Inteiras'],
+    'VT': ['VT'],
+    'VT Integração': ['VT Integracao', 'VT Integração'],
+    'Gratuidade': ['Gratuidade'],
+    'Passagens': ['Passagens'],
+    'Passagens Integração': ['Passagens Integracao', 'Passagens Integração'],
+    'Estudantes': ['Estudantes'],
+    'Estudantes Integração': ['Estudantes Integracao', 'Estudantes Integração']
+}
+
+# Colunas de quantidade de passagens (somadas nos relatórios)
+COLUNAS_NUMERICAS_MCO = ['Inteiras', 'VT', 'VT Integração', 'Gratuidade',
+                         'Passagens', 'Passagens Integração',
+                         'Estudantes', 'Estudantes Integração']
+
+# Funções utilitárias
+def format_brazil(number):
+    """Formata número ao padrão brasileiro."""
+    return formatacao.formatar_numero_br(number, casas=0, truncar=True)
+
+def format_table_brazil(df):
+    """Aplica formatação brasileira a colunas numéricas (todas as linhas de uma vez)."""
+    cols_to_exclude = ['Operadora', 'Tipo de Passagem', 'Nome Operadora', 'Nome Linha', 'Código Externo Linha']
+    cols = [col for col in df.columns if col not in cols_to_exclude]
+    return formatacao.formatar_tabela_br(df, colunas=cols, casas=0, truncar=True)
+
+# ---------------- Gráficos ----------------
+def criar_grafico_tipos(total_df, plotly_template):
+    """Gráfico de barras com a quantidade de passagens por tipo."""
+    fig = px.bar(
+        total_df,
+        x='Tipo de Passagem',
+        y='Quantidade',
+        title='Quantidade de Passagens por Tipo',
+        labels={'Quantidade': 'Total de Passagens'},
+        color='Tipo de Passagem',
+        text='Quantidade',
+        template=plotly_template
+    )
+    fig.update_traces(texttemplate='%{text}', textposition='outside')
+    fig.update_layout(margin=dict(t=50), height=500)
+    return fig
+
+def criar_grafico_operadoras(df_op, plotly_template):
+    """Gráfico de barras com o total de passagens por operadora."""
+    fig = px.bar(
+        df_op,
+        x='Operadora',
+        y='Total',
+        title='Comparativo de Passagens por Operadora',
+        labels={'Total': 'Total de Passagens'},
+        color='Operadora',
+        text='Total',
+        template=plotly_template
+    )
+    fig.update_traces(texttemplate='%{text:,.0f}', textposition='outside')
+    fig.update_layout(margin=dict(t=50), height=500)
+    return fig
+
+# ---------------- Relatório HTML ----------------
+@st.cache_data(show_spinner="Gerando relatório...")
+def gerar_relatorio_html(total_df, df_op, total_geral_passagens, plotly_template, bg_color, text_color, neon_color, modo_plotly="offline"):
+    """
+    Monta o relatório HTML completo (gerado só quando o usuário pede e guardado em cache).
+    modo_plotly: 'offline' (plotly.js embutido uma vez no arquivo) ou 'cdn'.
+    """
+    html_parts = []
+    # Cabeçalho
+    html_parts.append("<h1>Análise de Passagens de Ônibus</h1>")
+
+    # Gráfico 1
+    html_parts.append("<h2>Quantidade de Passagens por Tipo</h2>")
+    html_parts.append(f"""
+    <div style="transform: scaleX(0.8); transform-origin: left top; width: 100%;">
+        {relatorio_html.grafico_html(criar_grafico_tipos(total_df, plotly_template), config={'responsive': True})}
+    </div>
+    """)
+
+    # Card total geral
+    html_parts.append(f"""
+    <div style="
+        background-color: {bg_color};
+        color: {text_color};
+        padding: 12px;
+        border-radius: 12px;
+        text-align: center;
+        border: 1px solid {neon_color};
+        box-shadow: 0 0 6px {neon_color};
+        margin: 12px auto;
+        max-width: 420px;">
+    
+        <h3 style="
+            margin: 6px 0;
+            font-size: 18px;
+            font-weight: 700;
+            color: {text_color};">
+            TOTAL GERAL DE PASSAGEIROS
+        </h3>
+    
+        <p style="
+            font-size: 22px;
+            font-weight: 800;
+            margin: 4px 0;
+            color: black;">
+            {format_brazil(total_geral_passagens)}
+        </p>
+    </div>
+    """)
+
+    # Gráfico 2
+    html_parts.append("<h2>Total de Passagens por Operadora</h2>")
+    html_parts.append(relatorio_html.grafico_html(criar_grafico_operadoras(df_op, plotly_template), config={'responsive': True}))
+
+    # Tabela
+    html_parts.append("<h3>Tabela por Operadora</h3>")
+    # Usar pandas to_html para a tabela (sem índice extra), com a mesma formatação da tela
+    html_parts.append(format_table_brazil(df_op).to_html(index=False))
+
+    full_html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="utf-8">
+        <title>Relatório de Passagens</title>
+        {relatorio_html.script_plotly(modo_plotly)}
+        <style>
+            body {{ font-family: Arial, sans-serif; margin: 20px; }}
+            h1, h2, h3 {{ color: #003366; }}
+            table {{ border-collapse: collapse; width: 100%; margin-top: 10px; }}
+            table, th, td {{
+                border: 1px solid #ccc;
+            }}
+            th, td {{
+                padding: 8px;
+                text-align: center;
+                font-size: 14px;
+            }}
+            th {{
+                background-color: #f2f2f2;
+            }}
+            @media print {{
+            img, .js-plotly-plot-svg {{
+                max-width: 100% !important;
+                height: auto !important;
+            }}
+            h1, h2, h3 {{ page-break-after: avoid; }}
+            table {{ page-break-inside: auto; }}
+            tr    {{ page-break-inside: avoid; page-break-after: auto; }}
+            thead {{ display: table-header-group; }}
+            tfoot {{ display: table-footer-group; }}
+            }}
+        </style>
+    </head>
+    <body>
+        {''.join(html_parts)}
+    </body>
+    </html>
+    """
+    return full_html
+
+# ---------------- Leitura (somas por operadora e linha) ----------------
+# O relatório, os filtros e o armazém só usam as colunas de passagens somadas por
+# operadora e linha: a leitura reduz o arquivo a essas somas uma vez (tarefa em segundo
+# plano, base compartilhada entre as sessões) e trocar de operadora ou linha na barra
+# lateral só filtra a tabela de somas, sem voltar ao arquivo.
+CHAVES_MCO = ['Nome Operadora', 'Nome Linha']
+
+def _somar(df):
+    return df.groupby(CHAVES_MCO, dropna=False)[COLUNAS_NUMERICAS_MCO].sum().reset_index()
+
+def _converter_numericas(df):
+    for col in COLUNAS_NUMERICAS_MCO:
+        df[col] = pd.to_numeric(df.get(col, 0), errors='coerce').fillna(0)
+    return df
+
+def somar_passagens(arquivo, rename_dict, em_blocos=False):
+    """Somas das colunas de passagens por operadora e linha (leitura inteira ou em blocos)."""
+    if em_blocos:
+        return somar_passagens_em_blocos(arquivo, rename_dict)
+    tarefas.informar_progresso(0.1, "lendo o arquivo")
+    df = leitura.ler_arquivo(arquivo, usecols=list(rename_dict), sep=';').rename(columns=rename_dict)
+    tarefas.informar_progresso(0.8, "somando por operadora e linha")
+    return _somar(_converter_numericas(df))
+
+def somar_passagens_em_blocos(arquivo, rename_dict):
+    """
+    Leitura em blocos (arquivos acima do orçamento de memória): cada bloco é somado por
+    operadora e linha, e as somas ficam no lugar dos registros. O resultado é o mesmo da
+    leitura inteira.
+    """
+    def agregar(bloco):
+        return _somar(_converter_numericas(bloco.rename(columns=rename_dict)))
+
+    def combinar(parciais):
+        if not parciais:
+            return pd.DataFrame(columns=CHAVES_MCO + COLUNAS_NUMERICAS_MCO)
+        return _somar(pd.concat(parciais, ignore_index=True))
+
+    def progresso(linhas_lidas, fracao):
+        tarefas.informar_progresso(0.1 + 0.8 * fracao, f"{linhas_lidas:,} linhas lidas (em blocos)".replace(",", "."))
+
+    return leitura.agregar_em_blocos(arquivo, agregar, combinar, usecols=list(rename_dict), progresso=progresso, sep=';')
+
+@desempenho.instrumentar('mco')
 def main():
     # Configuração de Página
     st.set_page_config(layout="wide")
 
-    # Funções utilitárias
-    def format_brazil(number):
-        """Formata número ao padrão brasileiro."""
-        formatted = f"{int(number):,}".replace(',', 'X').replace('.', ',').replace('X', '.')
-        return formatted
-
-    def format_table_brazil(df):
-        """Aplica formatação brasileira a colunas numéricas."""
-        cols_to_exclude = ['Operadora', 'Tipo de Passagem', 'Nome Operadora', 'Nome Linha', 'Código Externo Linha']
-        fmt = {col: format_brazil for col in df.columns if col not in cols_to_exclude}
-        return df.style.format(fmt)
-
     # --- UI principal ---
     st.title('🚌 Análise de Passagens de Ônibus')
     st.markdown('Faça o upload da sua planilha para visualizar os dados de passagens e gerar gráficos interativos.')
@@ -32,80 +237,49 @@ def main():
 
     if uploaded_file:
         try:
-            # Leitura do arquivo
-            file_extension = uploaded_file.name.split('.')[-1].lower()
-            if file_extension in ['csv', 'txt']:
-                uploaded_file.seek(0)
-                try:
-                    df = pd.read_csv(uploaded_file, encoding='utf-8', sep=';')
-                except UnicodeDecodeError:
-                    try:
-                        df = pd.read_csv(uploaded_file, encoding='latin1', sep=';')
-                    except Exception:
-                        uploaded_file.seek(0)
-                        df = pd.read_csv(uploaded_file, sep=';')
-            else:
-                df = pd.read_excel(uploaded_file)
-            
-            st.success('✅ Arquivo carregado com sucesso!')
+            # Leitura do cabeçalho e resolução das colunas antes de carregar os dados
+            with desempenho.etapa('Leitura (cabeçalho)'):
+                cabecalho = leitura.ler_cabecalho(uploaded_file, sep=';')
 
             # Mapeamento e normalização de colunas
-            col_map = {
-                'Nome Operadora': ['Nome Operadora', 'Nome Garagem'],
-                'Código Externo Linha': ['Codigo Externo Linha', 'Cod. Externo Linha'],
-                'Nome Linha': ['Nome Linha'],
-                'Inteiras': ['Inteiras'],
-                'VT': ['VT'],
-                'VT Integração': ['VT Integracao', 'VT Integração'],
-                'Gratuidade': ['Gratuidade'],
-                'Passagens': ['Passagens'],
-                'Passagens Integração': ['Passagens Integracao', 'Passagens Integração'],
-                'Estudantes': ['Estudantes'],
-                'Estudantes Integração': ['Estudantes Integracao', 'Estudantes Integração']
-            }
-
-            rename_dict = {}
-            for new_name, possibles in col_map.items():
-                normalized = [unidecode(p).lower() for p in possibles]
-                for col in df.columns:
-                    if unidecode(col).lower() in normalized:
-                        rename_dict[col] = new_name
-                        break
-
-            df.rename(columns=rename_dict, inplace=True)
-
-            required_cols = list(col_map.keys())
-            missing = [c for c in required_cols if c not in df.columns]
+            with desempenho.etapa('Resolução de colunas'):
+                rename_dict, missing = colunas.resolver_colunas(cabecalho, COLUNAS_MCO)
             if missing:
-                st.error(f'❌ Colunas não encontradas: {", ".join(missing)}')
-                st.write("Colunas encontradas:", df.columns.tolist())
-                st.stop()
-
-            # Conversão de colunas numéricas
-            numeric_cols = ['Inteiras', 'VT', 'VT Integração', 'Gratuidade',
-                            'Passagens', 'Passagens Integração',
-                            'Estudantes', 'Estudantes Integração']
-            for col in numeric_cols:
-                df[col] = pd.to_numeric(df.get(col, 0), errors='coerce').fillna(0)
-
-            # Criação de colunas unificadas
-            df['Passagens_Inteiras'] = df['Inteiras']
-            df['Passagens_VT'] = df['VT']
-            df['Passagens_Gratuidade'] = df['Gratuidade']
-            df['Passagens_Social'] = df['Passagens']
-            df['Passagens_Estudantes'] = df['Estudantes']
-            df['Passagens_Integracao'] = (df['VT Integração'] + 
-                                        df['Passagens Integração'] + 
-                                        df['Estudantes Integração'])
-
-            total_geral_passagens = (
-                df['Passagens_Inteiras'].sum() +
-                df['Passagens_VT'].sum() +
-                df['Passagens_Gratuidade'].sum() +
-                df['Passagens_Social'].sum() +
-                df['Passagens_Estudantes'].sum() +
-                df['Passagens_Integracao'].sum()
-            )
+                colunas.exibir_divergencia(cabecalho, COLUNAS_MCO)
+                return
+
+            # Leitura apenas das colunas usadas no relatório, reduzida às somas por operadora e linha
+            with desempenho.etapa('Leitura'):
+                em_blocos = leitura.excede_orcamento(uploaded_file, usecols=list(rename_dict), sep=';')
+                chave = tarefas.chave_tarefa('mco', uploaded_file)
+                somas = dados_compartilhados.carregar(
+                    chave, somar_passagens, uploaded_file, rename_dict, em_blocos, texto='Carregando o arquivo...'
+                )
+                if em_blocos:
+                    st.caption('O arquivo passaria do orçamento de memória na leitura inteira: lido em blocos.')
+
+            st.success('✅ Arquivo carregado com sucesso!')
+
+            # Colunas unificadas (sobre uma cópia: a base de somas é compartilhada)
+            with desempenho.etapa('Limpeza'):
+                df = somas.copy()
+                df['Passagens_Inteiras'] = df['Inteiras']
+                df['Passagens_VT'] = df['VT']
+                df['Passagens_Gratuidade'] = df['Gratuidade']
+                df['Passagens_Social'] = df['Passagens']
+                df['Passagens_Estudantes'] = df['Estudantes']
+                df['Passagens_Integracao'] = (df['VT Integração'] + 
+                                            df['Passagens Integração'] + 
+                                            df['Estudantes Integração'])
+
+                total_geral_passagens = (
+                    df['Passagens_Inteiras'].sum() +
+                    df['Passagens_VT'].sum() +
+                    df['Passagens_Gratuidade'].sum() +
+                    df['Passagens_Social'].sum() +
+                    df['Passagens_Estudantes'].sum() +
+                    df['Passagens_Integracao'].sum()
+                )
 
             # Filtros
             st.sidebar.header('Filtros')
@@ -120,7 +294,7 @@ def main():
             linhas = ['Todas'] + sorted(linhas_disponiveis)
             selected_linha = st.sidebar.selectbox('Linha', linhas)
 
-            df_filtered = df.copy()
+            df_filtered = df
             if selected_operadora != 'Todas':
                 df_filtered = df_filtered[df_filtered['Nome Operadora'] == selected_operadora]
             if selected_linha != 'Todas':
@@ -131,32 +305,22 @@ def main():
 
             if not df_filtered.empty:
                 # Gráfico 1
-                st.header('📊 Tipos de Passagens')
-                total_data = {
-                    'Tipo de Passagem': ['Inteiras', 'VT', 'Gratuidade', 'Social', 'Estudantes', 'Integração'],
-                    'Quantidade': [
-                        df_filtered['Passagens_Inteiras'].sum(),
-                        df_filtered['Passagens_VT'].sum(),
-                        df_filtered['Passagens_Gratuidade'].sum(),
-                        df_filtered['Passagens_Social'].sum(),
-                        df_filtered['Passagens_Estudantes'].sum(),
-                        df_filtered['Passagens_Integracao'].sum()
-                    ]
-                }
-                total_df = pd.DataFrame(total_data)
-                fig_tipos = px.bar(
-                    total_df,
-                    x='Tipo de Passagem',
-                    y='Quantidade',
-                    title='Quantidade de Passagens por Tipo',
-                    labels={'Quantidade': 'Total de Passagens'},
-                    color='Tipo de Passagem',
-                    text='Quantidade',
-                    template=plotly_template
-                )
-                fig_tipos.update_traces(texttemplate='%{text}', textposition='outside')
-                fig_tipos.update_layout(margin=dict(t=50), height=500)
-                st.plotly_chart(fig_tipos, use_container_width=True)
+                with desempenho.etapa('Gráfico (Plotly)'):
+                    st.header('📊 Tipos de Passagens')
+                    total_data = {
+                        'Tipo de Passagem': ['Inteiras', 'VT', 'Gratuidade', 'Social', 'Estudantes', 'Integração'],
+                        'Quantidade': [
+                            df_filtered['Passagens_Inteiras'].sum(),
+                            df_filtered['Passagens_VT'].sum(),
+                            df_filtered['Passagens_Gratuidade'].sum(),
+                            df_filtered['Passagens_Social'].sum(),
+                            df_filtered['Passagens_Estudantes'].sum(),
+                            df_filtered['Passagens_Integracao'].sum()
+                        ]
+                    }
+                    total_df = pd.DataFrame(total_data)
+                    fig_tipos = criar_grafico_tipos(total_df, plotly_template)
+                    st.plotly_chart(fig_tipos, use_container_width=True)
 
                 # CSS do card
                 if is_dark_mode:
@@ -216,40 +380,25 @@ def main():
 
                 # Gráfico 2 + Aggregação por Operadora
                 st.header('🏢 Total de Passagens por Operadora')
-                cols_sum = ['Passagens_Inteiras', 'Passagens_VT', 'Passagens_Gratuidade',
-                            'Passagens_Social', 'Passagens_Estudantes', 'Passagens_Integracao']
-                df_op = df_filtered.groupby('Nome Operadora')[cols_sum].sum().reset_index()
-                df_op['Total'] = df_op[cols_sum].sum(axis=1)
-                df_op.columns = ['Operadora', 'Inteiras', 'VT', 'Gratuidade', 'Social', 'Estudantes', 'Integração', 'Total']
-
-                fig_op = px.bar(
-                    df_op,
-                    x='Operadora',
-                    y='Total',
-                    title='Comparativo de Passagens por Operadora',
-                    labels={'Total': 'Total de Passagens'},
-                    color='Operadora',
-                    text='Total',
-                    template=plotly_template
-                )
-                fig_op.update_traces(texttemplate='%{text:,.0f}', textposition='outside')
-                fig_op.update_layout(margin=dict(t=50), height=500)
-                st.plotly_chart(fig_op, use_container_width=True)
+                with desempenho.etapa('Agrupamento'):
+                    cols_sum = ['Passagens_Inteiras', 'Passagens_VT', 'Passagens_Gratuidade',
+                                'Passagens_Social', 'Passagens_Estudantes', 'Passagens_Integracao']
+                    df_op = df_filtered.groupby('Nome Operadora')[cols_sum].sum().reset_index()
+                    df_op['Total'] = df_op[cols_sum].sum(axis=1)
+                    df_op.columns = ['Operadora', 'Inteiras', 'VT', 'Gratuidade', 'Social', 'Estudantes', 'Integração', 'Total']
+
+                with desempenho.etapa('Gráfico (Plotly)'):
+                    fig_op = criar_grafico_operadoras(df_op, plotly_template)
+                    st.plotly_chart(fig_op, use_container_width=True)
 
                 st.subheader('Tabela por Operadora')
 
-                styled = format_table_brazil(df_op)
-                try:
-                    st.data_editor(
-                        styled,
+                with desempenho.etapa('Tabelas'):
+                    formatacao.exibir_tabela(
+                        format_table_brazil(df_op),
+                        chave="mco_tabela_operadora",
                         use_container_width=True,
-                        hide_index=True,
-                        disabled=df_op.columns
-                    )
-                except:
-                    st.dataframe(
-                        df_op.style.format({c: "{:,.0f}" for c in df_op.columns if c != 'Operadora'}),
-                        use_container_width=True
+                        hide_index=True
                     )
 
                 # --- EXPORTAÇÃO HTML (Opção A) ---
@@ -257,106 +406,35 @@ def main():
                 st.header("📥 Exportar relatório")
 
                 # Preparar o HTML
-                html_parts = []
-                # Cabeçalho
-                html_parts.append("<h1>Análise de Passagens de Ônibus</h1>")
+                with desempenho.etapa('Relatório HTML'):
+                    relatorio_html.exportar_relatorio(
+                        label="📄 Baixar Relatório em HTML",
+                        file_name="relatorio_passagens.html",
+                        gerar=lambda modo_plotly: gerar_relatorio_html(
+                            total_df, df_op, total_geral_passagens, plotly_template, bg_color, text_color, neon_color, modo_plotly
+                        ),
+                        chave="mco_relatorio_html",
+                        entradas=(total_df, df_op, total_geral_passagens, plotly_template, bg_color, text_color, neon_color),
+                        chave_modo="mco_modo_plotly"
+                    )
 
-                # Gráfico 1
-                html_parts.append("<h2>Quantidade de Passagens por Tipo</h2>")
-                html_parts.append(f"""
-                <div style="transform: scaleX(0.8); transform-origin: left top; width: 100%;">
-                    {fig_tipos.to_html(full_html=False, include_plotlyjs='cdn', config={'responsive': True})}
-                </div>
-                """)
-
-                # Card total geral
-                html_parts.append(f"""
-                <div style="
-                    background-color: {bg_color};
-                    color: {text_color};
-                    padding: 12px;
-                    border-radius: 12px;
-                    text-align: center;
-                    border: 1px solid {neon_color};
-                    box-shadow: 0 0 6px {neon_color};
-                    margin: 12px auto;
-                    max-width: 420px;">
-                    
-                    <h3 style="
-                        margin: 6px 0;
-                        font-size: 18px;
-                        font-weight: 700;
-                        color: {text_color};">
-                        TOTAL GERAL DE PASSAGEIROS
-                    </h3>
-                    
-                    <p style="
-                        font-size: 22px;
-                        font-weight: 800;
-                        margin: 4px 0;
-                        color: black;">
-                        {format_brazil(total_geral_passagens)}
-                    </p>
-                </div>
-                """)
-
-                # Gráfico 2
-                html_parts.append("<h2>Total de Passagens por Operadora</h2>")
-                html_parts.append(fig_op.to_html(full_html=False, include_plotlyjs=False, config={'responsive': True}))
-
-                # Tabela
-                html_parts.append("<h3>Tabela por Operadora</h3>")
-                # Usar pandas to_html para a tabela (sem índice extra)
-                html_parts.append(df_op.to_html(index=False))
-
-                full_html = f"""
-                <!DOCTYPE html>
-                <html>
-                <head>
-                    <meta charset="utf-8">
-                    <title>Relatório de Passagens</title>
-                    <style>
-                        body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                        h1, h2, h3 {{ color: #003366; }}
-                        table {{ border-collapse: collapse; width: 100%; margin-top: 10px; }}
-                        table, th, td {{
-                            border: 1px solid #ccc;
-                        }}
-                        th, td {{
-                            padding: 8px;
-                            text-align: center;
-                            font-size: 14px;
-                        }}
-                        th {{
-                            background-color: #f2f2f2;
-                        }}
-                        @media print {{
-                        img, .js-plotly-plot-svg {{
-                            max-width: 100% !important;
-                            height: auto !important;
-                        }}
-                        h1, h2, h3 {{ page-break-after: avoid; }}
-                        table {{ page-break-inside: auto; }}
-                        tr    {{ page-break-inside: avoid; page-break-after: auto; }}
-                        thead {{ display: table-header-group; }}
-                        tfoot {{ display: table-footer-group; }}
-                        }}
-                    </style>
-                </head>
-                <body>
-                    {''.join(html_parts)}
-                </body>
-                </html>
-                """
-
-                st.download_button(
-                    label="📄 Baixar Relatório em HTML",
-                    data=full_html,
-                    file_name="relatorio_passagens.html",
-                    mime="text/html"
+                st.info("Depois de baixar o HTML, abra no navegador e use **Ctrl+P → Salvar como PDF**.")
+
+                # Histórico: botão para guardar os resultados desta execução no HUB
+                historico.registrar(
+                    "mco",
+                    uploaded_file,
+                    {"Operadora": selected_operadora, "Linha": selected_linha},
+                    {"Quantidade de Passagens por Tipo": total_df, "Tabela por Operadora": df_op}
                 )
 
-                st.info("Depois de baixar o HTML, abra no navegador e use **Ctrl+P → Salvar como PDF**.")
+                # Armazém histórico: somas por operadora e linha do arquivo inteiro (sem os filtros da tela)
+                armazem.exibir_guardar(
+                    'mco',
+                    lambda: somas,
+                    uploaded_file,
+                    por_mes=True
+                )
 
             else:
                 st.warning('⚠️ Nenhum dado para os filtros selecionados.')
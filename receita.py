@@ -1,8 +1,120 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import math
+import armazem
+import formatacao
+import leitura
+import desempenho
+import historico
+
+# --- Tarifas vigentes (créditos eletrônicos / espécie) ---
+TARIFA_ELETRONICA = 5.40
+TARIFA_ESPECIE = 5.90
+
+# --- Limites da simulação de tarifas ---
+TARIFA_MAXIMA_SIMULADA = 20.0
+MAX_TARIFAS_SIMULADAS = 100
+
+# ----------------------------------------------------------------
+# --- ARREDONDAMENTO PERSONALIZADO (VETORIZADO) ---
+# ----------------------------------------------------------------
+def arredondar_personalizado(valores):
+    """
+    Parte decimal <= 0.5 arredonda para baixo (mantém o inteiro) e > 0.5 para cima
+    (inteiro + 1); NaN vira 0. Aceita escalar, Series ou array de qualquer formato.
+    """
+    valores = np.nan_to_num(np.asarray(valores, dtype=float), nan=0.0)
+    inteiros = np.trunc(valores)
+    return np.where(valores - inteiros > 0.5, inteiros + 1, inteiros).astype(np.int64)
+
+# ----------------------------------------------------------------
+# --- SIMULAÇÃO DE TARIFAS ---
+# ----------------------------------------------------------------
+def simular_tarifas(receitas, tarifas):
+    """
+    Passageiro equivalente de cada operadora (linhas) em cada tarifa (colunas),
+    calculado de uma vez: receitas[:, None] / tarifas[None, :].
+    """
+    receitas = np.asarray(receitas, dtype=float)[:, None]
+    tarifas = np.asarray(tarifas, dtype=float)[None, :]
+    return arredondar_personalizado(receitas / tarifas)
+
+def grade_tarifas(minima, maxima, passo):
+    """
+    Tarifas de minima a maxima (inclusive) no passo dado, sempre com a eletrônica e a em
+    espécie. Se o passo gerar mais de MAX_TARIFAS_SIMULADAS tarifas, o intervalo é dividido
+    em MAX_TARIFAS_SIMULADAS valores. Retorna (tarifas, passo_ajustado).
+    """
+    maxima = max(maxima, minima)
+    ajustado = (maxima - minima) / passo + 1 > MAX_TARIFAS_SIMULADAS
+    if ajustado:
+        grade = np.linspace(minima, maxima, MAX_TARIFAS_SIMULADAS)
+    else:
+        grade = np.arange(minima, maxima + passo / 2, passo)
+    return np.unique(np.round(np.concatenate([grade, [TARIFA_ELETRONICA, TARIFA_ESPECIE]]), 2)), ajustado
+
+def rotulo_tarifa(tarifa):
+    rotulo = f"R$ {tarifa:.2f}".replace(".", ",")
+    if np.isclose(tarifa, TARIFA_ELETRONICA):
+        rotulo += " (eletrônico)"
+    elif np.isclose(tarifa, TARIFA_ESPECIE):
+        rotulo += " (espécie)"
+    return rotulo
+
+def tabela_cenarios(df_receita, tarifas, coluna_operadora):
+    """Passageiro equivalente das operadoras (linhas) em cada tarifa (colunas), mais a linha SIT (total)."""
+    cenarios = pd.DataFrame(
+        simular_tarifas(df_receita["Receita (R$)"].to_numpy(), tarifas),
+        index=pd.Index(df_receita[coluna_operadora].to_numpy(), name=coluna_operadora),
+        columns=pd.Index(tarifas, name="Tarifa (R$)")
+    )
+    cenarios.loc["SIT"] = cenarios.sum()
+    return cenarios
+
+@st.fragment
+def exibir_simulacao_tarifas(df_receita, coluna_operadora):
+    """
+    Seção de simulação (fragmento): passageiro equivalente de cada operadora em uma grade
+    de tarifas, sem reexecutar o fechamento a cada valor.
+    """
+    col1, col2, col3 = st.columns(3)
+    minima = col1.number_input("Tarifa mínima (R$):", min_value=0.05, max_value=TARIFA_MAXIMA_SIMULADA,
+                               value=5.00, step=0.10, format="%.2f", key="receita_sim_min")
+    maxima = col2.number_input("Tarifa máxima (R$):", min_value=0.05, max_value=TARIFA_MAXIMA_SIMULADA,
+                               value=6.50, step=0.10, format="%.2f", key="receita_sim_max")
+    passo = col3.number_input("Passo (R$):", min_value=0.01, max_value=TARIFA_MAXIMA_SIMULADA,
+                              value=0.10, step=0.05, format="%.2f", key="receita_sim_passo")
+
+    tarifas, ajustado = grade_tarifas(minima, maxima, passo)
+    cenarios = tabela_cenarios(df_receita, tarifas, coluna_operadora)
+    st.caption(f"{len(tarifas)} tarifas simuladas (a eletrônica e a em espécie estão sempre incluídas).")
+    if ajustado:
+        st.caption(f"O passo geraria mais de {MAX_TARIFAS_SIMULADAS} tarifas: o intervalo foi dividido em {MAX_TARIFAS_SIMULADAS} valores.")
+
+    tabela = cenarios.set_axis([rotulo_tarifa(t) for t in tarifas], axis=1).reset_index()
+    formatacao.exibir_tabela(
+        formatacao.formatar_tabela_br(tabela, casas=0),
+        chave="receita_cenarios",
+        use_container_width=True,
+        hide_index=True
+    )
 
+    grafico = cenarios.drop(index="SIT").stack().rename("Passageiro Equivalente").reset_index()
+    fig = px.line(
+        grafico,
+        x="Tarifa (R$)",
+        y="Passageiro Equivalente",
+        color=coluna_operadora,
+        markers=True,
+        title="Passageiro Equivalente por Tarifa"
+    )
+    for tarifa, nome in ((TARIFA_ELETRONICA, "eletrônico"), (TARIFA_ESPECIE, "espécie")):
+        fig.add_vline(x=tarifa, line_dash="dot", annotation_text=nome)
+    st.plotly_chart(fig, use_container_width=True)
+
+@desempenho.instrumentar('receita')
 def main():
     # --- Configuração da Página ---
     st.set_page_config(
@@ -17,7 +129,7 @@ def main():
     st.markdown("Tarifa atual: Créditos eletrônicos - 5,40 / Espécie - 5,90")
 
     # --- Constantes ---
-    TARIFA = 5.40
+    TARIFA = TARIFA_ELETRONICA
 
     # --- Colunas esperadas ---
     COLUNA_OPERADORA = 'Nome Operadora'
@@ -29,28 +141,129 @@ def main():
     TERMO_SAO_JOAO = "sao joao"
     TERMO_VIA_FEIRA = "viafeira"
 
+    # --- Palavras-chave das colunas de detalhamento por tipo ---
+    TERMOS_TIPO = ["inteira", "vt", "estud", "grat", "social", "integra", "passe", "vale", "passag"]
+
+    # ----------------------------------------------------------------
+    # --- FUNÇÃO: colunas usadas no fechamento ---
+    # ----------------------------------------------------------------
+    def selecionar_colunas_tipo(colunas):
+        """Colunas de detalhamento por tipo (identificadas por palavra-chave)."""
+        return [
+            col for col in colunas
+            if (
+                any(k in col.lower() for k in TERMOS_TIPO)
+                and "passageiro" not in col.lower()
+                and col != COLUNA_VALOR
+            )
+        ]
+
+    def colunas_necessarias(colunas):
+        """Todas as colunas usadas no fechamento: operadora, valor, passageiros e as do detalhamento."""
+        fixas = [c for c in [COLUNA_OPERADORA, COLUNA_VALOR, COLUNA_PASSAGEIROS] if c in colunas]
+        return fixas + planejar_detalhamento(colunas)["colunas"]
+
+    # ----------------------------------------------------------------
+    # --- FUNÇÃO: plano do detalhamento por tipo ---
+    # ----------------------------------------------------------------
+    # Colunas de exibição: (nome exibido, termos obrigatórios, termos proibidos)
+    COLUNAS_EXIBICAO_TIPO = [
+        ('VT', ['vt'], ['valor', 'integra']),
+        ('Gratuidade', ['gratuidade'], []),
+        ('Estudantes', ['estudante'], ['valor', 'integra', 'gratuito']),
+        ('Inteiras', ['inteira'], ['valor', 'integra']),
+        ('Passagens', ['passagen'], ['valor', 'integra', 'passageiro']),
+    ]
+
+    def planejar_detalhamento(colunas):
+        """
+        Resolve, só pelos nomes do cabeçalho e uma única vez, quais colunas o
+        detalhamento usa: as exibidas (renomeadas) e as de integração (somadas).
+        Nada é lido nem convertido aqui; as demais colunas de tipo nem são carregadas.
+        """
+        candidatas = selecionar_colunas_tipo(colunas)
+        minusculas = {c: c.lower() for c in candidatas}
+
+        exibicao = {}
+        for nome, termos_ok, termos_proibidos in COLUNAS_EXIBICAO_TIPO:
+            coluna = next((
+                c for c in candidatas
+                if all(t in minusculas[c] for t in termos_ok)
+                and not any(t in minusculas[c] for t in termos_proibidos)
+            ), None)
+            if coluna is not None:
+                exibicao[coluna] = nome
+
+        integracao = [
+            c for c in candidatas
+            if 'integra' in minusculas[c] and 'valor' not in minusculas[c] and 'r$' not in minusculas[c]
+        ]
+
+        usadas = list(exibicao) + [c for c in integracao if c not in exibicao]
+        return {"exibicao": exibicao, "integracao": integracao, "colunas": usadas}
+
+    def executar_detalhamento(df, plano):
+        """
+        Executa o plano: converte só as colunas usadas e faz um único groupby por operadora.
+        Retorna as somas (float) por operadora, com as colunas renomeadas e "Soma Integração".
+        """
+        dados = {COLUNA_OPERADORA: df[COLUNA_OPERADORA]}
+        for col in plano["colunas"]:
+            serie = df[col]
+            # Só números de verdade (Excel) pulam a limpeza de texto; no CSV essas colunas chegam como texto
+            if "gratuidade" not in col.lower() and not pd.api.types.is_numeric_dtype(serie):
+                serie = (
+                    serie.astype(str)
+                    .str.replace('.', '', regex=False)
+                    .str.replace(',', '.', regex=False)
+                    .str.replace('R$', '', regex=False)
+                    .str.strip()
+                )
+            dados[col] = pd.to_numeric(serie, errors="coerce").fillna(0).astype(float)
+
+        somas = pd.DataFrame(dados).groupby(COLUNA_OPERADORA)[plano["colunas"]].sum()
+
+        tabela = somas[list(plano["exibicao"])].rename(columns=plano["exibicao"])
+        tabela["Soma Integração"] = somas[plano["integracao"]].sum(axis=1) if plano["integracao"] else 0.0
+        return tabela
+
     # ----------------------------------------------------------------
     # --- FUNÇÃO: carregar dados ---
     # ----------------------------------------------------------------
     @st.cache_data
     def carregar_dados(uploaded_file):
         try:
-            df = None
             if uploaded_file.name.endswith('.csv'):
-                # Tenta ler com separador automático ou ponto e vírgula (comum no Brasil)
+                # Tenta ler com ponto e vírgula (comum no Brasil) ou separador automático
+                opcoes = {'sep': ';', 'engine': 'python', 'encodings': ('latin-1',)}
                 try:
-                    df = pd.read_csv(uploaded_file, sep=';', engine='python', encoding='latin-1')
-                    if df.shape[1] < 2:
-                        uploaded_file.seek(0)
-                        df = pd.read_csv(uploaded_file, sep=None, engine='python', encoding='latin-1')
+                    cabecalho = leitura.ler_cabecalho(uploaded_file, **opcoes)
+                    if len(cabecalho) < 2:
+                        opcoes['sep'] = None
+                        cabecalho = leitura.ler_cabecalho(uploaded_file, **opcoes)
                 except:
-                     uploaded_file.seek(0)
-                     df = pd.read_csv(uploaded_file, sep=None, engine='python', encoding='latin-1')
+                    opcoes['sep'] = None
+                    cabecalho = leitura.ler_cabecalho(uploaded_file, **opcoes)
             elif uploaded_file.name.endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(uploaded_file, engine='openpyxl')
+                opcoes = {'engine_excel': 'openpyxl'}
+                cabecalho = leitura.ler_cabecalho(uploaded_file, **opcoes)
             else:
                 return None, "Tipo de arquivo não suportado."
-            
+
+            # Projeção: lê apenas as colunas usadas no fechamento
+            # (a comparação é feita com os nomes sem espaços nas pontas)
+            nomes_limpos = [str(c).strip() for c in cabecalho]
+            usadas = set(colunas_necessarias(nomes_limpos))
+            usecols = [c for c, limpo in zip(cabecalho, nomes_limpos) if limpo in usadas]
+
+            # No CSV as colunas do detalhamento são lidas como texto: a limpeza pt-BR
+            # (ponto de milhar, vírgula decimal) é feita sobre o texto original ("1.234" = 1234)
+            if 'engine_excel' not in opcoes:
+                detalhamento = set(planejar_detalhamento(nomes_limpos)["colunas"])
+                opcoes['dtype'] = {c: str for c, limpo in zip(cabecalho, nomes_limpos) if limpo in detalhamento}
+
+            df = leitura.ler_arquivo(uploaded_file, usecols=usecols, **opcoes)
+
             if df is not None:
                 # Remove espaços em branco dos nomes das colunas para evitar erros de busca
                 df.columns = df.columns.str.strip()
@@ -171,21 +384,6 @@ def main():
 
         return df_res, via_pass, quota
 
-    # ----------------------------------------------------------------
-    # --- FUNÇÃO AUXILIAR: ARREDONDAMENTO PERSONALIZADO ---
-    # ----------------------------------------------------------------
-    def arredondar_personalizado(valor):
-        if pd.isna(valor):
-            return 0
-        inteiro = int(valor)
-        decimal = valor - inteiro
-        # Se decimal <= 0.5 arredonda para baixo (mantém o inteiro)
-        # Se decimal > 0.5 arredonda para cima (inteiro + 1)
-        if decimal > 0.5:
-            return inteiro + 1
-        else:
-            return inteiro
-
     # ----------------------------------------------------------------
     # --- UPLOAD ---
     # ----------------------------------------------------------------
@@ -195,7 +393,8 @@ def main():
         st.info("Aguardando upload...")
         return
 
-    df, erro = carregar_dados(file)
+    with desempenho.etapa('Leitura'):
+        df, erro = carregar_dados(file)
 
     if erro:
         st.error(erro)
@@ -206,185 +405,141 @@ def main():
     # ---------------------------------------------------------
     # -------- CALCULAR RECEITA PRINCIPAL ---------------------
     # ---------------------------------------------------------
-    resultado_receita, via_val, via_cota, nome_via = calcular_receita(df)
+    with desempenho.etapa('Cálculo da receita'):
+        resultado_receita, via_val, via_cota, nome_via = calcular_receita(df)
 
     if resultado_receita is None:
         return
 
-    df_ops = df[[COLUNA_OPERADORA]].drop_duplicates()
-    _, nome_rosa, nome_sj = encontrar_nomes_operadoras(df_ops)
+    with desempenho.etapa('Passageiros e equivalente'):
+        df_ops = df[[COLUNA_OPERADORA]].drop_duplicates()
+        _, nome_rosa, nome_sj = encontrar_nomes_operadoras(df_ops)
 
-    df_pass, via_pass, via_cota_pass = calcular_passageiros_e_equivalente(df, nome_via, nome_rosa, nome_sj)
+        df_pass, via_pass, via_cota_pass = calcular_passageiros_e_equivalente(df, nome_via, nome_rosa, nome_sj)
 
-    # Construir tabela final
-    df_final = resultado_receita.copy()
+        # Construir tabela final
+        df_final = resultado_receita.copy()
 
-    if df_pass is not None:
-        df_final = df_final.merge(df_pass, on=COLUNA_OPERADORA, how="left")
+        if df_pass is not None:
+            df_final = df_final.merge(df_pass, on=COLUNA_OPERADORA, how="left")
         
-        # --- CÁLCULO E ARREDONDAMENTO PERSONALIZADO DO PASSAGEIRO EQUIVALENTE ---
-        valores_brutos = df_final["Receita (R$)"] / TARIFA
-        df_final["Passageiro Equivalente"] = valores_brutos.apply(arredondar_personalizado)
-
-        nova_linha = {
-            COLUNA_OPERADORA: "SIT",
-            "Receita (R$)": df_final["Receita (R$)"].sum(),
-            "Total Passageiros": df_final["Total Passageiros"].sum(),
-            "Passageiro Equivalente": df_final["Passageiro Equivalente"].sum()
-        }
-        df_final = pd.concat([df_final, pd.DataFrame([nova_linha])], ignore_index=True)
+            # --- CÁLCULO E ARREDONDAMENTO PERSONALIZADO DO PASSAGEIRO EQUIVALENTE ---
+            valores_brutos = df_final["Receita (R$)"] / TARIFA
+            df_final["Passageiro Equivalente"] = arredondar_personalizado(valores_brutos)
+
+            nova_linha = {
+                COLUNA_OPERADORA: "SIT",
+                "Receita (R$)": df_final["Receita (R$)"].sum(),
+                "Total Passageiros": df_final["Total Passageiros"].sum(),
+                "Passageiro Equivalente": df_final["Passageiro Equivalente"].sum()
+            }
+            df_final = pd.concat([df_final, pd.DataFrame([nova_linha])], ignore_index=True)
 
     # ---------------------------------------------------------
     # --- TABELA: Receita Final ---
     # ---------------------------------------------------------
     st.header("Resultado Consolidado por Operadora")
 
-    st.dataframe(
-        df_final.style.format({
-            "Receita (R$)": "R$ {:,.2f}",
-            "Total Passageiros": "{:,.0f}",
-            "Passageiro Equivalente": "{:,.2f}",
-        }),
-        use_container_width=True
-    )
+    with desempenho.etapa('Tabelas (Styler)'):
+        st.dataframe(
+            df_final.style.format({
+                "Receita (R$)": "R$ {:,.2f}",
+                "Total Passageiros": "{:,.0f}",
+                "Passageiro Equivalente": "{:,.2f}",
+            }),
+            use_container_width=True
+        )
 
     # ---------------------------------------------------------
     # --- GRÁFICO ---
     # ---------------------------------------------------------
-    df_graf = df_final[df_final[COLUNA_OPERADORA] != "SIT"]
-
-    st.subheader("Gráfico de Receita por Operadora")
-    fig = px.bar(
-        df_graf,
-        x=COLUNA_OPERADORA,
-        y="Receita (R$)",
-        color=COLUNA_OPERADORA,
-        text="Receita (R$)",
-        title="Receita por Operadora"
-    )
-    fig.update_traces(texttemplate="R$ %{text:,.2f}", textposition="outside")
-    st.plotly_chart(fig, use_container_width=True)
+    with desempenho.etapa('Gráfico (Plotly)'):
+        df_graf = df_final[df_final[COLUNA_OPERADORA] != "SIT"]
+
+        st.subheader("Gráfico de Receita por Operadora")
+        fig = px.bar(
+            df_graf,
+            x=COLUNA_OPERADORA,
+            y="Receita (R$)",
+            color=COLUNA_OPERADORA,
+            text="Receita (R$)",
+            title="Receita por Operadora"
+        )
+        fig.update_traces(texttemplate="R$ %{text:,.2f}", textposition="outside")
+        st.plotly_chart(fig, use_container_width=True)
+
+    # ---------------------------------------------------------
+    # --- SIMULAÇÃO: PASSAGEIRO EQUIVALENTE x TARIFA ---
+    # ---------------------------------------------------------
+    st.header("🎯 Simulação de Tarifas")
+    st.markdown("Passageiro equivalente de cada operadora para várias tarifas de uma vez.")
+    exibir_simulacao_tarifas(resultado_receita, COLUNA_OPERADORA)
 
     # ===================================================================
     # === SEÇÃO: TABELA POR TIPO (FILTRADA) =============================
     # ===================================================================
     st.header("🧾 Detalhamento por Tipo (Quantidade e Integração)")
 
-    colunas_receita_tipo = [
-        col for col in df.columns
-        if (
-            any(k in col.lower() for k in [
-                "inteira", "vt", "estud", "grat", "social", "integra", "passe", "vale", "passag"
-            ])
-            and "passageiro" not in col.lower()
-            and col != COLUNA_VALOR
-        )
-    ]
+    plano_detalhamento = planejar_detalhamento(df.columns)
 
-    if not colunas_receita_tipo:
+    if not plano_detalhamento["colunas"]:
         st.warning("Nenhuma coluna de detalhamento encontrada.")
     else:
-        df_receita_tipos = df[colunas_receita_tipo + [COLUNA_OPERADORA]].copy()
-
-        # Limpeza robusta das colunas selecionadas
-        for col in colunas_receita_tipo:
-            if "gratuidade" in col.lower():
-                 df_receita_tipos[col] = pd.to_numeric(df_receita_tipos[col], errors="coerce").fillna(0)
-            else:
-                df_receita_tipos[col] = (
-                    df_receita_tipos[col].astype(str)
-                    .str.replace('.', '', regex=False)
-                    .str.replace(',', '.', regex=False)
-                    .str.replace('R$', '', regex=False)
-                    .str.strip()
-                )
-                df_receita_tipos[col] = pd.to_numeric(df_receita_tipos[col], errors="coerce").fillna(0)
-
-        # -------------------------------------------------------
-        # 1. Identificação e Cálculo da Integração (QUANTIDADE)
-        # -------------------------------------------------------
-        cols_int_qtd = [
-            c for c in df_receita_tipos.columns 
-            if ('integra' in c.lower() and 'valor' not in c.lower() and 'r$' not in c.lower())
-        ]
-
-        # -------------------------------------------------------
-        # 2. Definição das Colunas de Exibição (QUANTIDADES)
-        # -------------------------------------------------------
-        colunas_display_map = {}
-        
-        def achar_coluna(termos_ok, termos_proibidos=None):
-            if termos_proibidos is None: termos_proibidos = []
-            matches = [
-                c for c in df_receita_tipos.columns
-                if all(t in c.lower() for t in termos_ok)
-                and not any(p in c.lower() for p in termos_proibidos)
-                and c != COLUNA_OPERADORA
-            ]
-            return matches[0] if matches else None
-
-        c_vt = achar_coluna(['vt'], termos_proibidos=['valor', 'integra'])
-        if c_vt: colunas_display_map[c_vt] = 'VT'
-
-        c_grat = achar_coluna(['gratuidade'])
-        if c_grat: colunas_display_map[c_grat] = 'Gratuidade'
-
-        c_est = achar_coluna(['estudante'], termos_proibidos=['valor', 'integra', 'gratuito'])
-        if c_est: colunas_display_map[c_est] = 'Estudantes'
-
-        c_int = achar_coluna(['inteira'], termos_proibidos=['valor', 'integra'])
-        if c_int: colunas_display_map[c_int] = 'Inteiras'
-
-        c_soc = achar_coluna(['passagen'], termos_proibidos=['valor', 'integra', 'passageiro'])
-        if c_soc: colunas_display_map[c_soc] = 'Passagens'
-
-        cols_finais_lista = list(colunas_display_map.keys())
-
-        # -------------------------------------------------------
-        # 3. Montagem da Tabela Por Operadora
-        # -------------------------------------------------------
-        tabela_por_operadora = df_receita_tipos.groupby(COLUNA_OPERADORA)[cols_finais_lista].sum()
-        tabela_por_operadora = tabela_por_operadora.astype(float)
-        
-        if cols_int_qtd:
-            vals_integra = df_receita_tipos.groupby(COLUNA_OPERADORA)[cols_int_qtd].sum().sum(axis=1)
-            tabela_por_operadora["Soma Integração"] = vals_integra
-        else:
-            tabela_por_operadora["Soma Integração"] = 0.0
-
-        # --- DISTRIBUIÇÃO DA COTA (VIA FEIRA -> ROSA/SÃO JOÃO) ---
-        if nome_via in tabela_por_operadora.index:
-            valores_via = tabela_por_operadora.loc[nome_via]
-            cota = valores_via / 2
+        with desempenho.etapa('Detalhamento por tipo'):
+            # -------------------------------------------------------
+            # 1. Somas por operadora (quantidades e integração)
+            # -------------------------------------------------------
+            tabela_por_operadora = executar_detalhamento(df, plano_detalhamento)
+
+            # -------------------------------------------------------
+            # 2. Distribuição da cota (VIA FEIRA -> ROSA/SÃO JOÃO)
+            # -------------------------------------------------------
+            if nome_via in tabela_por_operadora.index:
+                valores_via = tabela_por_operadora.loc[nome_via]
+                cota = valores_via / 2
             
-            if nome_rosa in tabela_por_operadora.index:
-                tabela_por_operadora.loc[nome_rosa] += cota
-            else:
-                 tabela_por_operadora.loc[nome_rosa] = cota
+                if nome_rosa in tabela_por_operadora.index:
+                    tabela_por_operadora.loc[nome_rosa] += cota
+                else:
+                     tabela_por_operadora.loc[nome_rosa] = cota
 
-            if nome_sj in tabela_por_operadora.index:
-                tabela_por_operadora.loc[nome_sj] += cota
-            else:
-                tabela_por_operadora.loc[nome_sj] = cota
+                if nome_sj in tabela_por_operadora.index:
+                    tabela_por_operadora.loc[nome_sj] += cota
+                else:
+                    tabela_por_operadora.loc[nome_sj] = cota
 
-            tabela_por_operadora = tabela_por_operadora.drop(index=nome_via)
+                tabela_por_operadora = tabela_por_operadora.drop(index=nome_via)
 
-        # Renomeia e Reordena
-        tabela_por_operadora = tabela_por_operadora.rename(columns=colunas_display_map)
-        ordem_desejada = ['VT', 'Gratuidade', 'Estudantes', 'Inteiras', 'Passagens', 'Soma Integração']
-        cols_presentes = [c for c in ordem_desejada if c in tabela_por_operadora.columns]
-        tabela_por_operadora = tabela_por_operadora[cols_presentes]
-
-        # -------------------------------------------------------
-        # 4. Adicionar Linha TOTAL na Tabela Principal
-        # -------------------------------------------------------
-        tabela_por_operadora.loc["TOTAL"] = tabela_por_operadora.sum()
+            # -------------------------------------------------------
+            # 3. Adicionar Linha TOTAL na Tabela Principal
+            # -------------------------------------------------------
+            tabela_por_operadora.loc["TOTAL"] = tabela_por_operadora.sum()
 
         st.subheader("Receita por Tipo Separada por Operadora")
-        st.dataframe(
-            tabela_por_operadora.style.format("R$ {:,.2f}"),
-            use_container_width=True
-        )
+        with desempenho.etapa('Tabelas (Styler)'):
+            st.dataframe(
+                tabela_por_operadora.style.format("R$ {:,.2f}"),
+                use_container_width=True
+            )
+
+    # --- Histórico: botão para guardar os resultados desta execução no HUB ---
+    historico.registrar(
+        "receita",
+        file,
+        {"Tarifa": TARIFA},
+        {
+            "Resultado Consolidado por Operadora": df_final,
+            "Receita por Tipo Separada por Operadora": tabela_por_operadora if plano_detalhamento["colunas"] else None,
+        }
+    )
+
+    # --- Armazém histórico: resultado por operadora (sem a linha SIT), por mês de referência ---
+    armazem.exibir_guardar(
+        "receita",
+        lambda: df_final[df_final[COLUNA_OPERADORA] != "SIT"],
+        file,
+        por_mes=True
+    )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,115 @@
+import functools
+import hashlib
+import html
+import pandas as pd
+import streamlit as st
+import formatacao
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+# ---------------- Relatórios HTML sob demanda ----------------
+# Os relatórios HTML (tabelas + gráficos) só são montados quando o usuário pede,
+# e o resultado fica em cache pelo conteúdo das tabelas de entrada.
+
+# Acima deste número de linhas a tabela é montada por template simples (sem Styler)
+LIMITE_STYLER = 200
+
+ESTILO_DESTAQUE = 'font-weight: bold; background-color: #e0f7fa; color: #333;'
+
+def assinatura(*objetos):
+    """Hash do conteúdo das entradas (DataFrames, dicionários, textos) para identificar o relatório."""
+    h = hashlib.sha1()
+
+    def atualizar(obj):
+        if isinstance(obj, pd.DataFrame):
+            h.update(str(list(obj.columns)).encode())
+            h.update(pd.util.hash_pandas_object(obj, index=True).values.tobytes())
+        elif isinstance(obj, dict):
+            for chave, valor in obj.items():
+                h.update(str(chave).encode())
+                atualizar(valor)
+        else:
+            h.update(repr(obj).encode())
+
+    for obj in objetos:
+        atualizar(obj)
+    return h.hexdigest()
+
+def tabela_html(df, linha_destaque=None, classes='dataframe table-striped table-hover', casas=2):
+    """
+    HTML de uma tabela com as colunas numéricas no padrão brasileiro (formatadas de uma vez).
+    Tabelas pequenas usam o pandas Styler; tabelas grandes usam um template simples,
+    bem mais rápido que o Styler.
+    """
+    df = formatacao.formatar_tabela_br(df, casas=casas)
+
+    if len(df) <= LIMITE_STYLER:
+        styler = df.style.set_table_attributes(f'border="1" class="{classes}"')
+        if linha_destaque is not None and linha_destaque in df.index:
+            styler.apply(lambda row: [ESTILO_DESTAQUE if row.name == linha_destaque else ''] * len(row), axis=1)
+        return styler.to_html()
+
+    nome_indice = html.escape(str(df.index.name)) if df.index.name is not None else ''
+    cabecalho = ''.join(f'<th>{html.escape(str(c))}</th>' for c in df.columns)
+
+    linhas = []
+    for indice, valores in zip(df.index, df.itertuples(index=False, name=None)):
+        estilo = f' style="{ESTILO_DESTAQUE}"' if indice == linha_destaque else ''
+        celulas = ''.join(f'<td>{html.escape(str(v))}</td>' for v in valores)
+        linhas.append(f'<tr{estilo}><th>{html.escape(str(indice))}</th>{celulas}</tr>')
+
+    return (
+        f'<table border="1" class="{classes}">'
+        f'<thead><tr><th>{nome_indice}</th>{cabecalho}</tr></thead>'
+        f'<tbody>{"".join(linhas)}</tbody></table>'
+    )
+
+# ---------------- Plotly nos relatórios ----------------
+# No modo offline o plotly.js é embutido UMA vez no <head> do relatório e cada gráfico
+# entra só com a sua div + dados. O plotly serializa arrays numéricos (numpy) em
+# binário base64 ("bdata"), o que mantém o arquivo pequeno mesmo com muitos gráficos.
+MODOS_PLOTLY = {
+    "Offline (plotly.js embutido no arquivo)": "offline",
+    "Online (plotly.js pela internet / CDN)": "cdn",
+}
+
+@functools.lru_cache(maxsize=1)
+def plotly_js():
+    """Bundle minificado do plotly.js, lido do pacote uma única vez por processo."""
+    return get_plotlyjs()
+
+def script_plotly(modo="offline"):
+    """Tag <script> que carrega o plotly.js no relatório (embutido ou via CDN)."""
+    if modo == "cdn":
+        return f'<script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js" charset="utf-8"></script>'
+    return f'<script type="text/javascript">{plotly_js()}</script>'
+
+def grafico_html(fig, **opcoes):
+    """Div de um gráfico, sem o plotly.js (que já vem do script_plotly no <head>)."""
+    return fig.to_html(full_html=False, include_plotlyjs=False, **opcoes)
+
+def escolher_modo_plotly(chave):
+    """Seletor do modo de exportação dos gráficos. Retorna 'offline' ou 'cdn'."""
+    rotulo = st.radio("Gráficos no relatório:", list(MODOS_PLOTLY), horizontal=True, key=chave)
+    return MODOS_PLOTLY[rotulo]
+
+def download_sob_demanda(label, file_name, gerar, chave, assinatura_entrada, mime="text/html"):
+    """
+    Mostra primeiro um botão "Preparar"; só depois do clique o relatório é gerado (gerar())
+    e o botão de download aparece. Se as entradas mudarem, volta a pedir o preparo.
+    """
+    if st.session_state.get(chave) != assinatura_entrada:
+        if not st.button(f"⚙️ Preparar: {label}", key=f"{chave}_preparar"):
+            return
+        st.session_state[chave] = assinatura_entrada
+
+    st.download_button(label=label, data=gerar(), file_name=file_name, mime=mime)
+
+@st.fragment
+def exportar_relatorio(label, file_name, gerar, chave, entradas, chave_modo):
+    """
+    Seção de exportação: seletor do modo dos gráficos e botões Preparar / download.
+    É um fragmento: mexer nesses widgets reexecuta só esta seção, não a página inteira.
+    gerar(modo_plotly) monta o HTML; entradas são os dados que identificam o relatório.
+    """
+    modo_plotly = escolher_modo_plotly(chave_modo)
+    download_sob_demanda(label, file_name, lambda: gerar(modo_plotly), chave, assinatura(*entradas, modo_plotly))
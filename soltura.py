@@ -1,8 +1,299 @@
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import streamlit as st
 import datetime
+import dados_compartilhados
+import desempenho
+import formatacao
+import graficos
+import historico
+import leitura
+import tarefas
 
+# --- Definição do mapa de cores ---
+MAPA_DE_CORES = {
+    'AUTO ONIBUS SAO JOAO LTDA': '#222a74', # Azul escuro
+    'EMPRESA DE ONIBUS ROSA LTDA': '#46b7ac'  # Verde água
+}
+
+# ---------------- Leitura ----------------
+def ler_arquivos_soltura(arquivos):
+    """
+    Lê e junta os arquivos enviados, já com as colunas renomeadas e padronizadas
+    (roda como tarefa em segundo plano; o resultado é compartilhado, não deve ser alterado).
+    """
+    lista_de_dfs = []
+    for i, arquivo in enumerate(arquivos):
+        tarefas.informar_progresso(i / len(arquivos), f"lendo {arquivo.name} ({i + 1} de {len(arquivos)})")
+        df_temp = pd.read_excel(leitura.em_disco(arquivo), usecols=[0, 1, 2, 3, 6, 7, 9, 12])
+        df_temp["Arquivo"] = arquivo.name  # origem de cada registro (relatório de duplicatas)
+        lista_de_dfs.append(df_temp)
+
+    df = pd.concat(lista_de_dfs, ignore_index=True)
+
+    # Renomear e padronizar as colunas
+    tarefas.informar_progresso(0.95, "padronizando as colunas")
+    df.columns = ["Empresa", "Linha", "Atendimento", "Sentido", "Atividade", "Ponto Início", "Veículo", "Início", "Arquivo"]
+    df["Sentido"] = df["Sentido"].str.strip().str.lower()
+    df["Atividade"] = df["Atividade"].str.strip().str.lower()
+    df["Empresa"] = df["Empresa"].str.strip().str.upper() # Usar upper para padronizar
+    df["Linha"] = df["Linha"].astype(str).str.strip()
+    df["Atendimento"] = df["Atendimento"].astype(str).str.strip()
+    df["Veículo"] = df["Veículo"].astype(str).str.strip()
+    df["Ponto Início"] = df["Ponto Início"].astype(str).str.lower()
+
+    # Converter a coluna 'Início' para datetime ANTES de usar como chave
+    df["Início"] = pd.to_datetime(df["Início"], format="%d/%m/%Y %H:%M:%S", errors='coerce')
+    return df.dropna(subset=['Início'])
+
+# ---------------- Deduplicação e contagens ----------------
+CHAVE_REGISTRO = ['Empresa', 'Linha', 'Veículo', 'Início']
+
+def chave_registro(df):
+    """
+    Chave composta (Empresa, Linha, Veículo, Início) como um inteiro por linha: o número
+    do grupo da combinação exata das quatro colunas (cada coluna é fatorada em códigos e
+    os códigos são combinados sem perda), então registros diferentes nunca colidem.
+    """
+    return df.groupby(CHAVE_REGISTRO, sort=False, dropna=False).ngroup().to_numpy()
+
+def relatorio_duplicatas(df, chave):
+    """
+    Registros repetidos entre (ou dentro de) arquivos: para cada par
+    arquivo mantido → arquivo do duplicado, quantos registros foram removidos.
+    """
+    repetidos = pd.Series(chave).duplicated(keep=False).to_numpy()
+    if not repetidos.any():
+        return pd.DataFrame(columns=['Arquivo mantido', 'Arquivo do duplicado', 'Registros removidos'])
+
+    dup = pd.DataFrame({'chave': chave[repetidos], 'Arquivo': df['Arquivo'].to_numpy()[repetidos]})
+    # O primeiro registro de cada chave é o mantido; os demais são os removidos
+    dup['Arquivo mantido'] = dup.groupby('chave')['Arquivo'].transform('first')
+    removidos = dup[dup['chave'].duplicated(keep='first')]
+    return (
+        removidos.groupby(['Arquivo mantido', 'Arquivo'])
+        .size()
+        .reset_index(name='Registros removidos')
+        .rename(columns={'Arquivo': 'Arquivo do duplicado'})
+        .sort_values('Registros removidos', ascending=False, ignore_index=True)
+    )
+
+def contar_veiculos_unicos(df, colunas_grupo):
+    """
+    Veículos distintos por grupo para várias colunas de agrupamento de uma só vez.
+    Veículos e grupos são fatorados em inteiros e empacotados em um único int64 por
+    registro; uma única passada (pd.unique) reduz os registros às combinações distintas
+    (veículo, grupos) e cada contagem sai dessas combinações.
+    Retorna {coluna: DataFrame[coluna, 'Qtd_Veiculos']} ordenado pela coluna (como o groupby).
+    """
+    codigos_veiculo, veiculos = pd.factorize(df['Veículo'])
+    fatorados = {coluna: pd.factorize(df[coluna]) for coluna in colunas_grupo}
+
+    # Empacotamento em base mista: veículo + n_veículos * (grupo1 + 1) + ... (ausentes = -1 → 0)
+    bases = [max(len(veiculos), 1)] + [len(grupos) + 1 for _, grupos in fatorados.values()]
+    pacote = codigos_veiculo.astype(np.int64)
+    peso = bases[0]
+    for (codigos, _), base in zip(fatorados.values(), bases[1:]):
+        pacote = pacote + peso * (codigos.astype(np.int64) + 1)
+        peso *= base
+
+    combinacoes = pd.unique(pacote[codigos_veiculo >= 0])
+    veiculo_comb = combinacoes % bases[0]
+    resto = combinacoes // bases[0]
+
+    resultado = {}
+    for (coluna, (_, grupos)), base in zip(fatorados.items(), bases[1:]):
+        grupo_comb = resto % base - 1
+        resto = resto // base
+        validos = grupo_comb >= 0
+        pares = pd.unique(grupo_comb[validos] * bases[0] + veiculo_comb[validos])
+        contagem = np.bincount(pares // bases[0], minlength=len(grupos))
+        tabela = pd.DataFrame({coluna: grupos, 'Qtd_Veiculos': contagem})
+        resultado[coluna] = tabela[tabela['Qtd_Veiculos'] > 0].sort_values(coluna, ignore_index=True)
+    return resultado
+
+# ---------------- Base da soltura (uma vez por conjunto de arquivos) ----------------
+# Deduplicação, 'Linha_Completa' e a marca das viagens da soltura dependem só dos
+# arquivos: a base pronta é montada uma vez (tarefa em segundo plano, compartilhada
+# entre as sessões) e o filtro de empresas da barra lateral só escolhe quais resultados
+# em cache (por base e empresas) exibir.
+HORA_INICIO_SOLTURA = datetime.time(3, 40)
+HORA_FIM_SOLTURA = datetime.time(8, 0)
+
+@st.cache_data(show_spinner=False)
+def duplicatas_soltura(_df, chave):
+    """(registros duplicados a remover, relatório de duplicatas) da base lida `chave`."""
+    chave_linhas = chave_registro(_df)
+    return pd.Series(chave_linhas).duplicated(keep='first').to_numpy(), relatorio_duplicatas(_df, chave_linhas)
+
+def preparar_soltura(df, duplicados):
+    """
+    Base lida -> sem os registros duplicados, com 'Linha_Completa' e a coluna 'Soltura'
+    (viagem ociosa saindo da garagem no período fixo da soltura).
+    """
+    tarefas.informar_progresso(0.2, "removendo duplicatas")
+    base = df[~duplicados].dropna(subset=['Linha', 'Atendimento'])
+    base = base.assign(Linha_Completa=base['Linha'] + " - " + base['Atendimento'])
+
+    tarefas.informar_progresso(0.6, "marcando as viagens da soltura")
+    horario = base["Início"].dt.time
+    return base.assign(Soltura=(
+        (horario >= HORA_INICIO_SOLTURA) & (horario <= HORA_FIM_SOLTURA)
+        & (base["Sentido"] == 'ocioso')
+        & base["Ponto Início"].str.contains('garagem', na=False)
+    ))
+
+@st.cache_data(show_spinner=False)
+def empresas_soltura(_base, chave):
+    return [empresa.upper() for empresa in _base.loc[_base["Soltura"], "Empresa"].unique()]
+
+@st.cache_data(show_spinner=False)
+def resultados_empresas(_base, chave, empresas):
+    """
+    (veículos por empresa, veículos por linha, linha do tempo por veículo-dia, curva de
+    veículos na rua) das empresas escolhidas na base `chave`.
+    """
+    da_empresa = _base[_base["Empresa"].isin(empresas)]
+    contagens = contar_veiculos_unicos(da_empresa[da_empresa["Soltura"]], ["Empresa", "Linha_Completa"])
+    tempos, curva = linha_do_tempo_veiculos(da_empresa)
+    return contagens["Empresa"], contagens["Linha_Completa"], tempos, curva
+
+# ---------------- Linha do tempo da soltura por veículo ----------------
+# Atividades que não contam como viagem comercial, mesmo com sentido ida/volta
+TERMOS_ATIVIDADE_NAO_COMERCIAL = ('ocios', 'recolh')
+
+def _primeiro_por_segmento(segmento, marcados, n_segmentos):
+    """Índice da primeira linha marcada de cada segmento (-1 se não houver). Exige segmento ordenado."""
+    posicoes = np.flatnonzero(marcados)
+    primeiro = np.full(n_segmentos, -1, dtype=np.int64)
+    segmentos, inicio = np.unique(segmento[posicoes], return_index=True)
+    primeiro[segmentos] = posicoes[inicio]
+    return primeiro
+
+def linha_do_tempo_veiculos(df):
+    """
+    Para cada veículo e dia: primeira saída da garagem (viagem ociosa saindo da garagem),
+    primeira viagem comercial depois dela e os minutos entre as duas.
+    Os registros são ordenados uma única vez por veículo e horário; cada veículo-dia é
+    um segmento contíguo e os cálculos são feitos com operações vetorizadas por segmento.
+    Retorna (tabela por veículo-dia, curva de veículos na rua por minuto).
+    """
+    dados = df[['Empresa', 'Veículo', 'Início', 'Sentido', 'Atividade', 'Ponto Início', 'Linha_Completa']]
+    dados = dados.sort_values(['Veículo', 'Início'], kind='stable', ignore_index=True)
+    if dados.empty:
+        return pd.DataFrame(), pd.DataFrame(columns=['Minuto', 'Veículos na rua'])
+
+    veiculo = pd.factorize(dados['Veículo'])[0]
+    minuto = dados['Início'].to_numpy().astype('datetime64[m]').astype(np.int64)
+    dia = minuto // (24 * 60)
+
+    # Segmentos: blocos contíguos de mesmo veículo e mesmo dia
+    novo = np.r_[True, (veiculo[1:] != veiculo[:-1]) | (dia[1:] != dia[:-1])]
+    segmento = np.cumsum(novo) - 1
+    n_segmentos = int(segmento[-1]) + 1
+    ultimo = np.r_[np.flatnonzero(novo)[1:] - 1, len(dados) - 1]
+
+    ocioso = (dados['Sentido'] == 'ocioso').to_numpy()
+    saida_garagem = ocioso & dados['Ponto Início'].str.contains('garagem', na=False).to_numpy()
+    atividade_nao_comercial = dados['Atividade'].str.contains('|'.join(TERMOS_ATIVIDADE_NAO_COMERCIAL), na=False).to_numpy()
+
+    idx_saida = _primeiro_por_segmento(segmento, saida_garagem, n_segmentos)
+
+    # Viagem comercial: não ociosa, depois da saída da garagem do mesmo segmento
+    saida_da_linha = idx_saida[segmento]
+    comercial = ~ocioso & ~atividade_nao_comercial & (saida_da_linha >= 0) & (np.arange(len(dados)) > saida_da_linha)
+    idx_comercial = _primeiro_por_segmento(segmento, comercial, n_segmentos)
+
+    com_saida = np.flatnonzero(idx_saida >= 0)
+    saidas = idx_saida[com_saida]
+    comerciais = idx_comercial[com_saida]
+    tem_comercial = comerciais >= 0
+
+    # Só as linhas de saída e de primeira viagem comercial são convertidas em texto
+    idx_viagem = np.maximum(comerciais, 0)
+    inicio_saida = dados['Início'].iloc[saidas]
+    inicio_viagem = dados['Início'].iloc[idx_viagem]
+    tabela = pd.DataFrame({
+        'Empresa': dados['Empresa'].to_numpy()[saidas],
+        'Veículo': dados['Veículo'].to_numpy()[saidas],
+        'Data': inicio_saida.dt.date.to_numpy(),
+        'Saída da garagem': inicio_saida.dt.strftime('%H:%M').to_numpy(),
+        'Primeira viagem comercial': np.where(tem_comercial, inicio_viagem.dt.strftime('%H:%M').to_numpy(), None),
+        'Linha': np.where(tem_comercial, dados['Linha_Completa'].to_numpy()[idx_viagem], None),
+        'Minutos até a viagem comercial': np.where(tem_comercial, (minuto[idx_viagem] - minuto[saidas]).astype(float), np.nan),
+    }).sort_values(['Data', 'Saída da garagem', 'Veículo'], ignore_index=True)
+    if not len(com_saida):
+        return tabela, pd.DataFrame(columns=['Minuto', 'Veículos na rua'])
+
+    # Veículos na rua: da saída da garagem até o último registro do dia (+1 na entrada, -1 depois da saída)
+    entrada = minuto[saidas]
+    fim = minuto[ultimo[com_saida]]
+    origem = entrada.min()
+    variacao = np.zeros(int(fim.max() - origem) + 2, dtype=np.int64)
+    np.add.at(variacao, entrada - origem, 1)
+    np.add.at(variacao, fim - origem + 1, -1)
+    curva = pd.DataFrame({
+        'Minuto': pd.to_datetime(origem + np.arange(len(variacao) - 1), unit='m'),
+        'Veículos na rua': np.cumsum(variacao)[:-1],
+    })
+    return tabela, curva
+
+@st.cache_data(show_spinner=False)
+def grafico_veiculos_na_rua(curva):
+    """Curva de veículos na rua por minuto (séries longas, como uma semana, são reduzidas)."""
+    dados = graficos.reduzir_serie(curva, 'Minuto', 'Veículos na rua')
+    fig = px.line(dados, x='Minuto', y='Veículos na rua', title='Veículos na Rua por Minuto')
+    fig.update_layout(autosize=True, margin=dict(l=20, r=20, t=50, b=20))
+    return fig
+
+# ---------------- Gráficos (em cache pelos dados agregados) ----------------
+@st.cache_data(show_spinner=False)
+def grafico_empresas(contagem_empresa):
+    """Gráfico de pizza com os veículos por empresa."""
+    fig = px.pie(
+        contagem_empresa,
+        names="Empresa",
+        values="Qtd_Veiculos",
+        hole=0.3,
+        color="Empresa",
+        color_discrete_map=MAPA_DE_CORES
+    )
+    fig.update_traces(textinfo="percent+value")
+    fig.update_layout(
+        autosize=True,
+        margin=dict(l=20, r=20, t=50, b=20),
+        legend=dict(orientation="h", y=-0.2)  # legenda horizontal para mobile
+    )
+    return fig
+
+@st.cache_data(show_spinner=False)
+def grafico_linhas(contagem_linha):
+    """
+    Barras horizontais com os veículos por linha. Só as linhas com mais veículos
+    entram no gráfico; as demais são somadas em "Outras".
+    """
+    dados = graficos.top_n_com_outras(contagem_linha, "Linha_Completa", "Qtd_Veiculos")
+    dados = dados.iloc[::-1]  # maior barra no topo
+
+    fig = px.bar(
+        dados,
+        x="Qtd_Veiculos",
+        y="Linha_Completa",
+        orientation="h",
+        title="Veículos Únicos por Linha no Período da Soltura",
+        labels={"Linha_Completa": "Linha", "Qtd_Veiculos": "Quantidade de Veículos"},
+        text="Qtd_Veiculos",
+        height=graficos.altura_barras_horizontais(len(dados))  # altura responsiva
+    )
+    fig.update_traces(textposition="outside")
+    fig.update_layout(
+        autosize=True,
+        margin=dict(l=20, r=20, t=50, b=20)
+    )
+    return fig
+
+@desempenho.instrumentar('soltura')
 def main():
 
     st.title("Dashboard de Análise de Soltura")
@@ -16,65 +307,41 @@ def main():
     )
 
     if arquivos:
-        # 🔹 2. Ler e juntar todos os arquivos enviados
-        lista_de_dfs = []
-        for arquivo in arquivos:
-            df_temp = pd.read_excel(arquivo, usecols=[0, 1, 2, 3, 6, 7, 9, 12])
-            lista_de_dfs.append(df_temp)
-
-        df = pd.concat(lista_de_dfs, ignore_index=True)
-
-        # 🔹 3. Renomear e padronizar as colunas
-        df.columns = ["Empresa", "Linha", "Atendimento", "Sentido", "Atividade", "Ponto Início", "Veículo", "Início"]
-        df["Sentido"] = df["Sentido"].str.strip().str.lower()
-        df["Atividade"] = df["Atividade"].str.strip().str.lower()
-        df["Empresa"] = df["Empresa"].str.strip().str.upper() # Usar upper para padronizar
-        df["Linha"] = df["Linha"].astype(str).str.strip()
-        df["Atendimento"] = df["Atendimento"].astype(str).str.strip()
-        df["Veículo"] = df["Veículo"].astype(str).str.strip()
-        df["Ponto Início"] = df["Ponto Início"].astype(str).str.lower()
-
-        # Converter a coluna 'Início' para datetime ANTES de usar como chave
-        df["Início"] = pd.to_datetime(df["Início"], format="%d/%m/%Y %H:%M:%S", errors='coerce')
-        df.dropna(subset=['Início'], inplace=True)
-
-        # Verificação e remoção de duplicatas entre arquivos
-        registros_antes = len(df)
-        df.drop_duplicates(subset=['Empresa', 'Linha', 'Veículo', 'Início'], keep='first', inplace=True)
-        registros_depois = len(df)
-        
-        st.success(f"✔ Verificação concluída: {registros_antes - registros_depois} registros duplicados foram removidos.")
-        st.markdown("---")
-        
-        # Criar a coluna com o nome completo da linha
-        df.dropna(subset=['Linha', 'Atendimento'], inplace=True)
-        df['Linha_Completa'] = df['Linha'] + " - " + df['Atendimento']
+        # 🔹 2. Ler, juntar e padronizar todos os arquivos enviados (em segundo plano)
+        with desempenho.etapa('Leitura e limpeza'):
+            chave_leitura = tarefas.chave_tarefa('soltura', arquivos)
+            df = dados_compartilhados.carregar(chave_leitura, ler_arquivos_soltura, arquivos, texto='Lendo os arquivos...')
+
+        # Verificação e remoção de duplicatas entre arquivos, limpeza e marca da soltura (uma vez por base)
+        with desempenho.etapa('Deduplicação'):
+            duplicados, duplicatas = duplicatas_soltura(df, chave_leitura)
+            df = dados_compartilhados.carregar(
+                f"{chave_leitura}_base", preparar_soltura, df, duplicados, texto='Removendo duplicatas...'
+            )
 
-        # 🔹 4. Aplicar a filtragem correta da Soltura
-        hora_inicio = datetime.time(3, 40)
-        hora_fim = datetime.time(8, 0)
-        df_filtrado_tempo = df[(df["Início"].dt.time >= hora_inicio) & (df["Início"].dt.time <= hora_fim)]
-        df_filtrado_ocioso = df_filtrado_tempo[df_filtrado_tempo["Sentido"] == 'ocioso']
-        df_soltura = df_filtrado_ocioso[df_filtrado_ocioso["Ponto Início"].str.contains('garagem', na=False)]
+        st.success(f"✔ Verificação concluída: {int(duplicados.sum())} registros duplicados foram removidos.")
+        if not duplicatas.empty:
+            with st.expander("Ver origem dos registros duplicados"):
+                st.dataframe(duplicatas, use_container_width=True, hide_index=True)
+        st.markdown("---")
 
         # Filtro de empresa na barra lateral
         st.sidebar.header("Filtros")
-        opcoes_filtro = [empresa.upper() for empresa in df_soltura["Empresa"].unique()]
-        
+        opcoes_filtro = empresas_soltura(df, chave_leitura)
+
         empresa_filtro = st.sidebar.multiselect(
             "Selecione a Empresa:",
             options=opcoes_filtro,
             default=opcoes_filtro
         )
-        df_filtrado_final = df_soltura[df_soltura["Empresa"].isin(empresa_filtro)]
 
         # 🔹 Contagem por empresa
-        contagem_empresa = df_filtrado_final.groupby("Empresa")["Veículo"].nunique().reset_index()
-        contagem_empresa.rename(columns={"Veículo": "Qtd_Veiculos"}, inplace=True)
-
         # 🔹 Contagem por linha (destino da soltura)
-        contagem_linha = df_filtrado_final.groupby("Linha_Completa")["Veículo"].nunique().reset_index()
-        contagem_linha.rename(columns={"Veículo": "Qtd_Veiculos"}, inplace=True)
+        # 🔹 Linha do tempo da soltura (dia inteiro, empresas selecionadas)
+        with desempenho.etapa('Agrupamento'):
+            contagem_empresa, contagem_linha, tempos, curva = resultados_empresas(
+                df, chave_leitura, tuple(sorted(empresa_filtro))
+            )
 
         # 🔹 Gráfico de pizza (Empresa)
         st.subheader("Distribuição de Veículos por Empresa")
@@ -82,53 +349,57 @@ def main():
         total_veiculos_grafico = contagem_empresa['Qtd_Veiculos'].sum()
         st.metric(label="Total de Veículos Analisados", value=f"🚍 {total_veiculos_grafico}")
         
-        # --- Definição do mapa de cores ---
-        mapa_de_cores = {
-            'AUTO ONIBUS SAO JOAO LTDA': '#222a74', # Azul escuro
-            'EMPRESA DE ONIBUS ROSA LTDA': '#46b7ac'  # Verde água
-        }
-
-        fig1 = px.pie(
-            contagem_empresa,
-            names="Empresa",
-            values="Qtd_Veiculos",
-            hole=0.3,
-            color="Empresa",
-            color_discrete_map=mapa_de_cores
-        )
-        fig1.update_traces(textinfo="percent+value")
-        fig1.update_layout(
-            autosize=True,
-            margin=dict(l=20, r=20, t=50, b=20),
-            legend=dict(orientation="h", y=-0.2)  # legenda horizontal para mobile
-        )
-        st.plotly_chart(fig1, use_container_width=True)
+        with desempenho.etapa('Gráfico (Plotly)'):
+            st.plotly_chart(grafico_empresas(contagem_empresa), use_container_width=True)
 
         # 🔹 Gráfico de barras horizontal (Linha)
         st.subheader("Quantidade de Veículos por Linha de Destino (após Soltura)")
 
-        contagem_linha_filtrada = contagem_linha[contagem_linha["Qtd_Veiculos"] > 0]
-        contagem_linha_filtrada = contagem_linha_filtrada.sort_values("Qtd_Veiculos", ascending=True)
-
-        altura_dinamica = len(contagem_linha_filtrada) * 35
-        altura_final = max(400, min(altura_dinamica, 1000))  # altura responsiva
-
-        fig2 = px.bar(
-            contagem_linha_filtrada,
-            x="Qtd_Veiculos",
-            y="Linha_Completa",
-            orientation="h",
-            title="Veículos Únicos por Linha no Período da Soltura",
-            labels={"Linha_Completa": "Linha", "Qtd_Veiculos": "Quantidade de Veículos"},
-            text="Qtd_Veiculos",
-            height=altura_final
-        )
-        fig2.update_traces(textposition="outside")
-        fig2.update_layout(
-            autosize=True,
-            margin=dict(l=20, r=20, t=50, b=20)
+        with desempenho.etapa('Gráfico (Plotly)'):
+            contagem_linha_filtrada = contagem_linha[contagem_linha["Qtd_Veiculos"] > 0]
+            st.plotly_chart(grafico_linhas(contagem_linha_filtrada), use_container_width=True)
+
+            if len(contagem_linha_filtrada) > graficos.LIMITE_CATEGORIAS:
+                with st.expander(f"Ver todas as {len(contagem_linha_filtrada)} linhas"):
+                    st.dataframe(
+                        contagem_linha_filtrada.sort_values("Qtd_Veiculos", ascending=False),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+
+        # 🔹 Linha do tempo da soltura (dia inteiro, empresas selecionadas)
+        st.markdown("---")
+        st.subheader("Linha do Tempo da Soltura por Veículo")
+
+        if tempos.empty:
+            st.info("Nenhuma saída de garagem encontrada para as empresas selecionadas.")
+        else:
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Saídas de garagem (veículo/dia)", len(tempos))
+            mediana = tempos['Minutos até a viagem comercial'].median()
+            col2.metric("Mediana até a 1ª viagem comercial", f"{mediana:.0f} min" if pd.notna(mediana) else "-")
+            col3.metric("Pico de veículos na rua", int(curva['Veículos na rua'].max()))
+
+            with desempenho.etapa('Gráfico (Plotly)'):
+                st.plotly_chart(grafico_veiculos_na_rua(curva), use_container_width=True)
+
+            formatacao.exibir_tabela(
+                formatacao.formatar_tabela_br(tempos, colunas=['Minutos até a viagem comercial'], casas=0, na_rep='-'),
+                chave="soltura_linha_do_tempo",
+                use_container_width=True,
+                hide_index=True
+            )
+
+        # Histórico: botão para guardar os resultados desta execução no HUB
+        historico.registrar(
+            "soltura",
+            arquivos,
+            {"Empresas": sorted(empresa_filtro)},
+            {
+                "Veículos por Empresa": contagem_empresa,
+                "Veículos por Linha de Destino": contagem_linha.sort_values("Qtd_Veiculos", ascending=False),
+            }
         )
-        st.plotly_chart(fig2, use_container_width=True)
 
     else:
         st.warning("Por favor, faça o upload de um ou mais arquivos para iniciar a análise.")
@@ -0,0 +1,171 @@
+import collections
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import streamlit as st
+import historico
+
+# ---------------- Tarefas em segundo plano ----------------
+# Leituras e agregações pesadas rodam em um pool de threads do processo (compartilhado
+# por todas as sessões), fora da execução do script. A página só acompanha o progresso:
+# mexer em um widget durante a leitura reexecuta o script, mas a tarefa continua de onde
+# estava. Cada tarefa é identificada pelo conteúdo dos arquivos de entrada (e parâmetros),
+# então o mesmo arquivo enviado de novo, ou por outro usuário, reaproveita o resultado.
+#
+# Uso:
+#     chave = tarefas.chave_tarefa('viabilidade', arquivo)
+#     tarefas.submeter(chave, carregar_dados, arquivo)
+#     df = tarefas.aguardar(chave, "Carregando a planilha...")
+#
+# Dentro da função da tarefa, tarefas.informar_progresso(fracao, texto) atualiza a barra.
+# A função da tarefa não deve usar widgets do Streamlit (roda fora da sessão).
+#
+# Quem pega o resultado normalmente o guarda em outro lugar (dados_compartilhados) e
+# descarta a tarefa. As concluídas que ninguém buscou ficam limitadas em quantidade e em
+# memória (as menos usadas saem primeiro).
+
+MAX_TAREFAS_SIMULTANEAS = int(os.environ.get("SEMOB_MAX_TAREFAS", 2))
+
+# Limites das tarefas concluídas mantidas para reaproveitamento
+MAX_TAREFAS_CONCLUIDAS = 16
+ORCAMENTO_TAREFAS_MB = float(os.environ.get("SEMOB_ORCAMENTO_TAREFAS_MB", 512))
+
+# Intervalo (s) entre as atualizações da barra de progresso enquanto a tarefa roda
+INTERVALO_ATUALIZACAO = 0.5
+
+_tarefa_atual = threading.local()
+
+@st.cache_resource
+def _executor():
+    """Pool de threads e tabela de tarefas, criados uma vez por processo."""
+    return {
+        "pool": ThreadPoolExecutor(max_workers=MAX_TAREFAS_SIMULTANEAS, thread_name_prefix="semob-tarefa"),
+        "tarefas": collections.OrderedDict(),
+        "trava": threading.Lock(),
+    }
+
+def chave_tarefa(nome, arquivos, *parametros):
+    """Identificador da tarefa: nome + hash do conteúdo dos arquivos + parâmetros."""
+    texto = historico.assinatura_arquivos(arquivos) + repr(parametros)
+    return f"{nome}_{hashlib.sha1(texto.encode()).hexdigest()[:16]}"
+
+def _tamanho(resultado):
+    """Bytes em memória do resultado (DataFrames e Series, também dentro de tuplas e listas)."""
+    if isinstance(resultado, pd.DataFrame):
+        return int(resultado.memory_usage(index=True, deep=True).sum())
+    if isinstance(resultado, pd.Series):
+        return int(resultado.memory_usage(index=True, deep=True))
+    if isinstance(resultado, (tuple, list)):
+        return sum(_tamanho(item) for item in resultado)
+    return 0
+
+def _rodar(executor, chave, tarefa, funcao, args, kwargs):
+    _tarefa_atual.registro = tarefa
+    try:
+        resultado = funcao(*args, **kwargs)
+        tarefa["bytes"] = _tamanho(resultado)
+        return resultado
+    finally:
+        tarefa["fim"] = time.time()
+        _tarefa_atual.registro = None
+        # Aplica os limites assim que o resultado existe (a própria tarefa fica)
+        with executor["trava"]:
+            _descartar_antigas(executor["tarefas"], manter=chave)
+
+def submeter(chave, funcao, *args, **kwargs):
+    """
+    Envia a tarefa ao pool, se ainda não houver uma com a mesma chave rodando ou concluída.
+    Tarefas que terminaram com erro são enviadas de novo.
+    """
+    executor = _executor()
+    with executor["trava"]:
+        tarefa = executor["tarefas"].get(chave)
+        if tarefa is not None and not (tarefa["futuro"].done() and tarefa["futuro"].exception() is not None):
+            executor["tarefas"].move_to_end(chave)
+            return
+
+        tarefa = {"fracao": 0.0, "texto": "", "inicio": time.time(), "fim": None, "bytes": 0}
+        tarefa["futuro"] = executor["pool"].submit(_rodar, executor, chave, tarefa, funcao, args, kwargs)
+        executor["tarefas"][chave] = tarefa
+        _descartar_antigas(executor["tarefas"])
+
+def _descartar_antigas(tarefas, manter=None):
+    """
+    Remove as tarefas concluídas menos usadas até caberem em MAX_TAREFAS_CONCLUIDAS e
+    em ORCAMENTO_TAREFAS_MB. manter é a tarefa que acabou de terminar: entra na conta,
+    mas nunca é removida.
+    """
+    concluidas = [chave for chave, tarefa in tarefas.items() if tarefa["futuro"].done() or chave == manter]
+    restantes = len(concluidas)
+    total = sum(tarefas[chave]["bytes"] for chave in concluidas)
+    limite = ORCAMENTO_TAREFAS_MB * 1024 ** 2
+    for chave in concluidas:
+        if restantes <= MAX_TAREFAS_CONCLUIDAS and total <= limite:
+            break
+        if chave == manter:
+            continue
+        restantes -= 1
+        total -= tarefas[chave]["bytes"]
+        del tarefas[chave]
+
+def descartar(chave):
+    """Esquece uma tarefa concluída (o resultado passou a ser guardado em outro lugar)."""
+    executor = _executor()
+    with executor["trava"]:
+        tarefa = executor["tarefas"].get(chave)
+        if tarefa is not None and tarefa["futuro"].done():
+            del executor["tarefas"][chave]
+
+def informar_progresso(fracao, texto=""):
+    """Chamado de dentro da tarefa para atualizar a barra de progresso (fracao entre 0 e 1)."""
+    tarefa = getattr(_tarefa_atual, "registro", None)
+    if tarefa is not None:
+        tarefa["fracao"] = min(max(float(fracao), 0.0), 1.0)
+        tarefa["texto"] = texto
+
+def estado(chave):
+    """'executando', 'concluida', 'erro' ou None (tarefa desconhecida)."""
+    tarefa = _executor()["tarefas"].get(chave)
+    if tarefa is None:
+        return None
+    if not tarefa["futuro"].done():
+        return "executando"
+    return "erro" if tarefa["futuro"].exception() is not None else "concluida"
+
+@st.fragment(run_every=INTERVALO_ATUALIZACAO)
+def acompanhar(chave, texto):
+    """
+    Barra de progresso da tarefa (fragmento): só ela é atualizada enquanto a tarefa roda,
+    sem prender a execução da página; quando a tarefa termina, a página é reexecutada.
+    Usada direto pelas páginas que seguem desenhando enquanto a tarefa roda.
+    """
+    tarefa = _executor()["tarefas"].get(chave)
+    if tarefa is None or tarefa["futuro"].done():
+        st.rerun()
+    decorrido = time.time() - tarefa["inicio"]
+    detalhe = f" — {tarefa['texto']}" if tarefa["texto"] else ""
+    st.progress(tarefa["fracao"], text=f"{texto}{detalhe} ({decorrido:.0f} s)")
+
+def aguardar(chave, texto="Processando..."):
+    """
+    Devolve o resultado da tarefa. Enquanto ela roda, mostra a barra de progresso
+    (atualizada a cada INTERVALO_ATUALIZACAO) e interrompe a página ali: o resto da
+    página é desenhado quando a tarefa termina. Se a tarefa falhou, a exceção dela é
+    levantada aqui.
+    """
+    executor = _executor()
+    tarefa = executor["tarefas"].get(chave)
+    if tarefa is None:
+        raise KeyError(f"tarefa não encontrada: {chave}")
+
+    if not tarefa["futuro"].done():
+        acompanhar(chave, texto)
+        st.stop()
+
+    with executor["trava"]:
+        if chave in executor["tarefas"]:
+            executor["tarefas"].move_to_end(chave)
+    return tarefa["futuro"].result()
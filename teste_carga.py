@@ -0,0 +1,377 @@
+import argparse
+import datetime
+import io
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+# Histórico, armazém, uploads e bases do teste ficam fora das pastas do app. Definido antes
+# de importar qualquer módulo do app, que leem essas variáveis uma única vez na importação.
+PASTA_TESTE = tempfile.mkdtemp(prefix="semob_carga_")
+os.environ["SEMOB_HISTORICO"] = os.path.join(PASTA_TESTE, "historico")
+os.environ["SEMOB_ARMAZEM"] = os.path.join(PASTA_TESTE, "armazem")
+os.environ["SEMOB_PASTA_UPLOADS"] = os.path.join(PASTA_TESTE, "uploads")
+os.environ["SEMOB_PASTA_DADOS"] = os.path.join(PASTA_TESTE, "dados")
+
+import desempenho
+import tarefas
+
+# ---------------- Teste de carga do HUB ----------------
+# Simula N sessões simultâneas com o AppTest do Streamlit (sem navegador): cada sessão
+# abre os relatórios, "envia" arquivos sintéticos (o file_uploader é substituído) e
+# mexe em um filtro. Mede a latência de cada interação e o pico de memória do processo
+# e grava um relatório JSON que pode ser comparado entre versões.
+#
+# Uso:
+#     python teste_carga.py --sessoes 8 --rodadas 3 --saida carga.json
+#     python teste_carga.py --sessoes 8 --comparar carga_anterior.json
+#
+# Todas as sessões rodam no mesmo processo, como no servidor: caches, tarefas em segundo
+# plano e bases compartilhadas valem para todas. Com --arquivos-distintos cada sessão
+# recebe arquivos diferentes (pior caso, nada é reaproveitado entre sessões).
+
+PASTA_PROJETO = os.path.dirname(os.path.abspath(__file__))
+PAGINAS = ["km", "mco", "soltura", "ipk", "viabilidade", "receita"]
+PERCENTIS = [50, 90, 95, 99]
+
+# Script executado pelo AppTest em cada sessão
+SCRIPT_SESSAO = f'''
+import runpy, sys
+sys.path.insert(0, {PASTA_PROJETO!r})
+import teste_carga
+teste_carga.instalar_upload_falso()
+runpy.run_path({os.path.join(PASTA_PROJETO, "app.py")!r}, run_name="__main__")
+'''
+
+# ---------------- Arquivos sintéticos ----------------
+def _csv(df, encoding="utf-8"):
+    return df.to_csv(sep=";", index=False).encode(encoding)
+
+def gerar_km(rng, n):
+    return _csv(pd.DataFrame({
+        "Nome Operadora": rng.choice(["AUTO ONIBUS SAO JOAO LTDA", "EMPRESA DE ONIBUS ROSA LTDA", "VIAFEIRA"], n),
+        "Viagem": rng.choice(["Nor.", "Nor.", "Oci."], n),
+        "Distância": rng.integers(1000, 30000, n),
+        "Passageiros": rng.integers(0, 60, n),
+        "Intervalo Viagem": [f"00:{m:02d}:00" for m in rng.integers(0, 59, n)],
+        "Desc. Tipo Veículo": rng.choice(["Convencional", "Micro", "Articulado"], n),
+        "Código Externo Linha": [f"L{c}" for c in rng.integers(100, 140, n)],
+        "Data Coleta": [f"{d:02d}/03/2025" for d in rng.integers(1, 28, n)],
+    }))
+
+def gerar_mco(rng, n):
+    return _csv(pd.DataFrame({
+        "Nome Operadora": rng.choice(["ROSA", "SAO JOAO"], n),
+        "Codigo Externo Linha": rng.integers(100, 400, n),
+        "Nome Linha": [f"Linha {c}" for c in rng.integers(100, 400, n)],
+        "Inteiras": rng.integers(0, 100, n), "VT": rng.integers(0, 100, n),
+        "VT Integração": rng.integers(0, 10, n), "Gratuidade": rng.integers(0, 30, n),
+        "Passagens": rng.integers(0, 40, n), "Passagens Integração": rng.integers(0, 5, n),
+        "Estudantes": rng.integers(0, 40, n), "Estudantes Integração": rng.integers(0, 5, n),
+    }))
+
+def gerar_soltura(rng, n):
+    inicio = pd.Timestamp("2025-03-03 03:00") + pd.to_timedelta(rng.integers(0, 6 * 60, n), unit="min")
+    df = pd.DataFrame({
+        "Empresa": rng.choice(["AUTO ONIBUS SAO JOAO LTDA", "EMPRESA DE ONIBUS ROSA LTDA"], n),
+        "Linha": rng.integers(100, 180, n).astype(str),
+        "Atendimento": rng.choice(["A", "B"], n),
+        "Sentido": rng.choice(["Ocioso", "Ida", "Volta"], n),
+        "x4": 0, "x5": 0,
+        "Atividade": rng.choice(["Viagem", "Recolhimento"], n),
+        "Ponto Início": rng.choice(["Garagem Central", "Terminal"], n),
+        "x8": 0,
+        "Veículo": rng.integers(1000, 1100, n).astype(str),
+        "x10": 0, "x11": 0,
+        "Início": inicio.strftime("%d/%m/%Y %H:%M:%S"),
+    })
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+def gerar_ipk(rng, n):
+    df = pd.DataFrame({f"c{i}": rng.integers(0, 5, n) for i in range(14)})
+    df["c2"] = rng.choice(["Empresa Rosa", "Auto Onibus Sao Joao", "VIAFEIRA"], n)
+    df["c9"] = rng.integers(0, 80, n)
+    df["c11"] = [f"{v:.2f}".replace(".", ",") for v in rng.uniform(5, 40, n)]
+    df["c4"] = rng.integers(100, 140, n)
+    return _csv(df.rename(columns={"c2": "Nome Operadora", "c9": "Passageiros", "c11": "KM", "c4": "Código Externo Linha"}))
+
+def gerar_viabilidade(rng, n):
+    df = pd.DataFrame({f"col{i}": rng.integers(0, 3, n) for i in range(44)})
+    df["col4"] = rng.choice(["101", "102", "103", "210", "305"], n)
+    df["col28"] = rng.integers(0, 5, n)
+    inicio = pd.Timestamp("2025-03-03") + pd.to_timedelta(rng.integers(0, 7 * 24 * 60, n), unit="min")
+    df["col42"] = inicio.strftime("%Y-%m-%d %H:%M:%S")
+    return _csv(df, encoding="latin1")
+
+def gerar_receita(rng, n):
+    return _csv(pd.DataFrame({
+        "Nome Operadora": rng.choice(["EMPRESA ROSA", "SAO JOAO LTDA", "VIAFEIRA"], n),
+        "Valor Passageiros": [f"{v:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".") for v in rng.uniform(100, 5000, n)],
+        "Passageiros": rng.integers(10, 900, n),
+        "Qtd Inteira": rng.integers(0, 100, n), "Qtd VT": rng.integers(0, 100, n),
+        "Estudante": rng.integers(0, 50, n), "Gratuidade": rng.integers(0, 50, n),
+        "Passagens Social": rng.integers(0, 50, n), "Integração VT": rng.integers(0, 9, n),
+    }), encoding="latin1")
+
+# Página: (nome do arquivo, gerador, linhas por unidade de --tamanho)
+ARQUIVOS_SINTETICOS = {
+    "km": ("viagens.txt", gerar_km, 20_000),
+    "mco": ("mco.csv", gerar_mco, 5_000),
+    "soltura": ("soltura.xlsx", gerar_soltura, 2_000),
+    "ipk": ("ipk.csv", gerar_ipk, 20_000),
+    "viabilidade": ("viabilidade.csv", gerar_viabilidade, 20_000),
+    "receita": ("faturamento.csv", gerar_receita, 2_000),
+}
+
+def gerar_arquivos(pasta, paginas, tamanho, semente):
+    """Grava os arquivos sintéticos de cada página e devolve {página: [(nome, caminho)]}."""
+    os.makedirs(pasta, exist_ok=True)
+    rng = np.random.default_rng(semente)
+    arquivos = {}
+    for pagina in paginas:
+        nome, gerar, linhas = ARQUIVOS_SINTETICOS[pagina]
+        caminho = os.path.join(pasta, nome)
+        with open(caminho, "wb") as f:
+            f.write(gerar(rng, max(int(linhas * tamanho), 10)))
+        arquivos[pagina] = [(nome, caminho)]
+    return arquivos
+
+# ---------------- file_uploader substituído (dentro das sessões) ----------------
+_bytes_arquivos = {}
+
+def _upload_falso(*args, **kwargs):
+    import streamlit as st
+    from streamlit.runtime.uploaded_file_manager import UploadedFile, UploadedFileRec
+
+    arquivos = st.session_state.get("_carga_arquivos", {}).get(st.session_state.get("pagina"), [])
+    enviados = []
+    for nome, caminho in arquivos:
+        if caminho not in _bytes_arquivos:
+            with open(caminho, "rb") as f:
+                _bytes_arquivos[caminho] = f.read()
+        enviados.append(UploadedFile(UploadedFileRec(file_id=caminho, name=nome, type="", data=_bytes_arquivos[caminho]), None))
+
+    if kwargs.get("accept_multiple_files"):
+        return enviados
+    return enviados[0] if enviados else None
+
+def instalar_upload_falso():
+    """Troca st.file_uploader (também o da barra lateral) pelo envio dos arquivos sintéticos."""
+    import streamlit as st
+    from streamlit.delta_generator import DeltaGenerator
+
+    st.file_uploader = _upload_falso
+    DeltaGenerator.file_uploader = lambda self, *args, **kwargs: _upload_falso(*args, **kwargs)
+
+# ---------------- Sessões ----------------
+def _mudar_filtro(at):
+    """Muda o primeiro filtro da barra lateral (ou da página): selectbox vai para a última opção, multiselect fica com a primeira."""
+    for area in (at.sidebar, at.main):
+        if len(area.selectbox):
+            caixa = area.selectbox[0]
+            return caixa.set_value(caixa.options[-1])
+        if len(area.multiselect):
+            lista = area.multiselect[0]
+            return lista.set_value(lista.options[:1])
+    return None
+
+def _executar(at):
+    """
+    Roda o script e, se a página parou na barra de progresso de uma tarefa em segundo
+    plano (no navegador o fragmento se atualiza sozinho), espera as tarefas terminarem
+    e roda de novo, até a página ficar pronta.
+    """
+    at.run()
+    while len(at.get("progress")) and not at.exception:
+        while any(not tarefa["futuro"].done() for tarefa in list(tarefas._executor()["tarefas"].values())):
+            time.sleep(tarefas.INTERVALO_ATUALIZACAO)
+        at.run()
+    return at
+
+def rodar_sessao(indice, paginas, rodadas, arquivos, tempo_limite, medicoes, erros):
+    """Uma sessão: para cada rodada e página, abre a página, muda um filtro e reexecuta."""
+    from streamlit.testing.v1 import AppTest
+
+    for rodada in range(rodadas):
+        for pagina in paginas:
+            at = AppTest.from_string(SCRIPT_SESSAO, default_timeout=tempo_limite)
+            at.session_state["pagina"] = pagina
+            at.session_state["_carga_arquivos"] = arquivos
+
+            etapas = [
+                ("Abrir", lambda: _executar(at)),
+                ("Filtro", lambda: (_mudar_filtro(at), _executar(at))),
+                ("Reexecução", lambda: _executar(at)),
+            ]
+            for interacao, executar in etapas:
+                inicio = time.perf_counter()
+                try:
+                    executar()
+                    falhou = len(at.exception) > 0
+                except Exception as e:
+                    falhou = True
+                    erros.append({"sessao": indice, "pagina": pagina, "interacao": interacao, "erro": str(e)})
+                medicoes.append({
+                    "sessao": indice, "rodada": rodada, "pagina": pagina, "interacao": interacao,
+                    "segundos": time.perf_counter() - inicio, "falhou": falhou,
+                })
+                if at.exception:
+                    erros.append({"sessao": indice, "pagina": pagina, "interacao": interacao, "erro": at.exception[0].message})
+                    break
+
+def _arquivos_projeto():
+    """Arquivos do projeto (fora .git e caches do Python) com a data de modificação."""
+    arquivos = {}
+    for pasta, subpastas, nomes in os.walk(PASTA_PROJETO):
+        subpastas[:] = [s for s in subpastas if s not in (".git", "__pycache__", ".pytest_cache")]
+        for nome in nomes:
+            caminho = os.path.join(pasta, nome)
+            arquivos[caminho] = os.path.getmtime(caminho)
+    return arquivos
+
+def _amostrar_memoria(parar, amostras, intervalo=0.1):
+    while not parar.is_set():
+        memoria = desempenho._memoria_mb()
+        if memoria is not None:
+            amostras.append(memoria)
+        parar.wait(intervalo)
+
+# ---------------- Relatório ----------------
+def resumir(medicoes):
+    """Percentis de latência por página e interação (e no total)."""
+    df = pd.DataFrame(medicoes)
+    resumo = {}
+    for (pagina, interacao), grupo in df.groupby(["pagina", "interacao"], sort=False):
+        segundos = grupo["segundos"].to_numpy()
+        resumo.setdefault(pagina, {})[interacao] = {
+            "n": int(len(segundos)),
+            "falhas": int(grupo["falhou"].sum()),
+            "media": float(segundos.mean()),
+            **{f"p{p}": float(np.percentile(segundos, p)) for p in PERCENTIS},
+            "max": float(segundos.max()),
+        }
+    segundos = df["segundos"].to_numpy()
+    resumo["_total"] = {
+        "n": int(len(segundos)),
+        "falhas": int(df["falhou"].sum()),
+        **{f"p{p}": float(np.percentile(segundos, p)) for p in PERCENTIS},
+    }
+    return resumo
+
+def _versao():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PASTA_PROJETO,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def tabela_resumo(relatorio):
+    """Tabela (página, interação) x percentis, para impressão."""
+    linhas = []
+    for pagina, interacoes in relatorio["latencias"].items():
+        if pagina == "_total":
+            continue
+        for interacao, valores in interacoes.items():
+            linhas.append({"Página": pagina, "Interação": interacao, **{k: valores[k] for k in ["n", "falhas", "p50", "p95", "max"]}})
+    return pd.DataFrame(linhas)
+
+def comparar(relatorio, anterior):
+    """Variação do p95 de cada interação em relação a um relatório anterior."""
+    linhas = []
+    for pagina, interacoes in relatorio["latencias"].items():
+        if pagina == "_total":
+            continue
+        for interacao, valores in interacoes.items():
+            base = anterior["latencias"].get(pagina, {}).get(interacao)
+            if base is None:
+                continue
+            linhas.append({
+                "Página": pagina, "Interação": interacao,
+                "p95 anterior": base["p95"], "p95 atual": valores["p95"],
+                "Var. %": (valores["p95"] - base["p95"]) / base["p95"] * 100 if base["p95"] else None,
+            })
+    linhas.append({
+        "Página": "(memória)", "Interação": "pico MB",
+        "p95 anterior": anterior.get("memoria_pico_mb"), "p95 atual": relatorio.get("memoria_pico_mb"),
+        "Var. %": None,
+    })
+    return pd.DataFrame(linhas)
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do HUB com sessões simultâneas (AppTest).")
+    parser.add_argument("--sessoes", type=int, default=4, help="sessões simultâneas")
+    parser.add_argument("--rodadas", type=int, default=2, help="vezes que cada sessão percorre as páginas")
+    parser.add_argument("--paginas", nargs="+", default=PAGINAS, choices=PAGINAS)
+    parser.add_argument("--tamanho", type=float, default=1.0, help="multiplicador do número de linhas dos arquivos sintéticos")
+    parser.add_argument("--arquivos-distintos", action="store_true", help="arquivos diferentes para cada sessão")
+    parser.add_argument("--tempo-limite", type=float, default=300, help="tempo máximo (s) de cada interação")
+    parser.add_argument("--saida", default="carga.json", help="arquivo JSON do relatório")
+    parser.add_argument("--comparar", help="relatório JSON anterior para comparação")
+    args = parser.parse_args()
+
+    arquivos_projeto = _arquivos_projeto()
+
+    print(f"Gerando arquivos sintéticos (tamanho {args.tamanho})...")
+    pasta_arquivos = os.path.join(PASTA_TESTE, "arquivos")
+    if args.arquivos_distintos:
+        arquivos = [gerar_arquivos(os.path.join(pasta_arquivos, str(i)), args.paginas, args.tamanho, semente=i) for i in range(args.sessoes)]
+    else:
+        arquivos = [gerar_arquivos(pasta_arquivos, args.paginas, args.tamanho, semente=0)] * args.sessoes
+
+    medicoes, erros, amostras = [], [], []
+    parar = threading.Event()
+    amostrador = threading.Thread(target=_amostrar_memoria, args=(parar, amostras), daemon=True)
+    memoria_inicial = desempenho._memoria_mb()
+    amostrador.start()
+
+    print(f"Rodando {args.sessoes} sessões x {args.rodadas} rodadas em {', '.join(args.paginas)}...")
+    inicio = time.perf_counter()
+    sessoes = [
+        threading.Thread(target=rodar_sessao, args=(i, args.paginas, args.rodadas, arquivos[i], args.tempo_limite, medicoes, erros))
+        for i in range(args.sessoes)
+    ]
+    for sessao in sessoes:
+        sessao.start()
+    for sessao in sessoes:
+        sessao.join()
+    duracao = time.perf_counter() - inicio
+    parar.set()
+    amostrador.join()
+
+    alterados = sorted(set(_arquivos_projeto().items()) - set(arquivos_projeto.items()))
+    assert not alterados, f"o teste gravou dentro do projeto: {[caminho for caminho, _ in alterados]}"
+
+    relatorio = {
+        "data_hora": datetime.datetime.now().isoformat(timespec="seconds"),
+        "versao": _versao(),
+        "parametros": {k: v for k, v in vars(args).items() if k not in ("saida", "comparar")},
+        "duracao_s": duracao,
+        "memoria_inicial_mb": memoria_inicial,
+        "memoria_pico_mb": max(amostras) if amostras else None,
+        "latencias": resumir(medicoes) if medicoes else {},
+        "erros": erros,
+    }
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+
+    pd.set_option("display.width", 200)
+    print(tabela_resumo(relatorio).round(3).to_string(index=False))
+    if relatorio["memoria_pico_mb"] is not None:
+        print(f"Memória: {memoria_inicial:.0f} MB no início, pico de {relatorio['memoria_pico_mb']:.0f} MB")
+    print(f"{len(erros)} erro(s). Relatório gravado em {args.saida} ({duracao:.1f} s)")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            anterior = json.load(f)
+        print(f"\nComparação com {args.comparar} (versão {anterior.get('versao')}):")
+        print(comparar(relatorio, anterior).round(2).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
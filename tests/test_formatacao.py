@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import formatacao
+
+
+def _formato_antigo(valor, casas):
+    return format(valor, f",.{casas}f").replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def test_arredondamento_igual_ao_str_format():
+    valores = [0.005, 2.675, 0.125, 0.375, 0.995, 999999.995, -0.001, 1234567.891, 0.0]
+    assert formatacao.formatar_serie_br(pd.Series(valores)).tolist() == [
+        "0,01", "2,67", "0,12", "0,38", "0,99", "999.999,99", "-0,00", "1.234.567,89", "0,00",
+    ]
+
+
+def test_valores_aleatorios_iguais_ao_formatador_antigo():
+    rng = np.random.default_rng(0)
+    valores = np.concatenate([rng.random(20_000) * 1e7 - 5e6, rng.integers(-10**6, 10**6, 20_000) / 200])
+    for casas in (0, 1, 2):
+        esperado = [_formato_antigo(v, casas) for v in valores]
+        assert formatacao.formatar_serie_br(pd.Series(valores), casas=casas).tolist() == esperado
+
+
+def test_truncar_igual_ao_int():
+    valores = [0.29 * 100, 1999.999, -0.5, -1234.9]
+    assert formatacao.formatar_serie_br(pd.Series(valores), casas=0, truncar=True).tolist() == ["28", "1.999", "0", "-1.234"]
+
+
+def test_ausentes_e_textos():
+    serie = pd.Series([1.5, None, "Total"], dtype=object)
+    assert formatacao.formatar_serie_br(serie, na_rep="-").tolist() == ["1,50", "-", "Total"]
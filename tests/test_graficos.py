@@ -0,0 +1,16 @@
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+import graficos
+
+
+def test_reduzir_serie_independe_da_ordem_das_linhas():
+    minutos = np.arange(3000)
+    df = pd.DataFrame({"Minuto": minutos, "Veículos na rua": np.sin(minutos / 40) * 100})
+    ordenada = graficos.reduzir_serie(df, "Minuto", "Veículos na rua", max_pontos=100)
+    embaralhada = graficos.reduzir_serie(df.sample(frac=1, random_state=0), "Minuto", "Veículos na rua", max_pontos=100)
+
+    assert len(ordenada) <= 100
+    assert ordenada["Minuto"].is_monotonic_increasing
+    assert_frame_equal(embaralhada, ordenada)
@@ -0,0 +1,51 @@
+import os
+import tempfile
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+import historico
+
+
+class _Upload:
+    """Arquivo enviado mínimo (nome + bytes), como o UploadedFile do Streamlit."""
+
+    def __init__(self, nome, dados):
+        self.name = nome
+        self.file_id = nome
+        self._dados = dados
+
+    def getvalue(self):
+        return self._dados
+
+
+TABELA = pd.DataFrame({"Operadora": ["ROSA", "SAO JOAO"], "KM": [10.5, 20.0]})
+
+
+def test_salvar_e_carregar_execucao(tmp_path, monkeypatch):
+    monkeypatch.setattr(historico, "PASTA_HISTORICO", str(tmp_path))
+    arquivo = _Upload("viagens.txt", b"a;b\n1;2\n")
+    id_execucao = historico.salvar_execucao("km", arquivo, {"periodo": "03/2025"}, {"KM por operadora": TABELA})
+
+    assert historico.salvar_execucao("km", arquivo, {"periodo": "03/2025"}, {"KM por operadora": TABELA}) == id_execucao
+    assert [r["id"] for r in historico.listar_execucoes()] == [id_execucao]
+    registro, tabelas = historico.carregar_execucao(id_execucao)
+    assert_frame_equal(tabelas["KM por operadora"], TABELA)
+
+
+def test_salvar_execucao_gravada_por_outra_sessao(tmp_path, monkeypatch):
+    """Se outra sessão grava a mesma execução durante a escrita, a gravação conta como feita."""
+    monkeypatch.setattr(historico, "PASTA_HISTORICO", str(tmp_path))
+    arquivo = _Upload("viagens.txt", b"a;b\n1;2\n")
+    mkdtemp = tempfile.mkdtemp
+
+    def mkdtemp_com_concorrente(prefix, suffix, dir):
+        pasta = os.path.join(dir, prefix.rstrip("."))
+        os.makedirs(pasta)
+        TABELA.to_parquet(os.path.join(pasta, "0.parquet"))
+        return mkdtemp(prefix=prefix, suffix=suffix, dir=dir)
+
+    monkeypatch.setattr(historico.tempfile, "mkdtemp", mkdtemp_com_concorrente)
+    id_execucao = historico.salvar_execucao("km", arquivo, {}, {"KM por operadora": TABELA})
+
+    assert os.listdir(tmp_path) == [id_execucao]
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+import colunas
+import ipk
+import km
+import leitura
+import mco
+import viabilidade
+
+# Blocos pequenos, para o arquivo de teste ser lido em vários blocos
+LINHAS_POR_BLOCO = 7
+N_LINHAS = 60
+
+
+def _ler_em_blocos(monkeypatch):
+    """Orçamento de leitura mínimo (SEMOB_ORCAMENTO_LEITURA_MB): todo CSV passa a ser lido em blocos."""
+    monkeypatch.setattr(leitura, "ORCAMENTO_LEITURA_MB", 0.0)
+    monkeypatch.setattr(leitura, "TAMANHO_BLOCO", LINHAS_POR_BLOCO)
+
+
+def _gravar(caminho, df, encoding="utf-8"):
+    caminho.write_bytes(df.to_csv(sep=";", index=False).encode(encoding))
+    return str(caminho)
+
+
+def _codigos(rng, n):
+    """Códigos numéricos de linha com um em branco depois do primeiro bloco."""
+    codigos = rng.choice(["101", "102", "210"], n).astype(object)
+    codigos[LINHAS_POR_BLOCO * 3 + 2] = ""
+    return codigos
+
+
+@pytest.fixture
+def arquivo_km(tmp_path):
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({
+        "Nome Operadora": rng.choice(["AUTO ONIBUS SAO JOAO LTDA", "EMPRESA DE ONIBUS ROSA LTDA", "VIAFEIRA"], N_LINHAS),
+        "Viagem": rng.choice(["Nor.", "Nor.", "Oci."], N_LINHAS),
+        "Distância": rng.integers(1000, 30000, N_LINHAS),
+        "Passageiros": rng.integers(0, 60, N_LINHAS),
+        "Intervalo Viagem": [f"00:{m:02d}:00" for m in rng.integers(0, 59, N_LINHAS)],
+        "Desc. Tipo Veículo": rng.choice(["Convencional", "Micro"], N_LINHAS),
+        "Código Externo Linha": _codigos(rng, N_LINHAS),
+        "Data Coleta": [f"{d:02d}/03/2025" for d in rng.integers(1, 28, N_LINHAS)],
+    })
+    return _gravar(tmp_path / "viagens.txt", df)
+
+
+@pytest.fixture
+def arquivo_ipk(tmp_path):
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame({f"c{i}": rng.integers(0, 5, N_LINHAS) for i in range(12)})
+    df["c2"] = rng.choice(["Empresa Rosa", "Auto Onibus Sao Joao", "VIAFEIRA"], N_LINHAS)
+    df["c9"] = rng.integers(0, 80, N_LINHAS)
+    df["c11"] = [f"{v:.2f}".replace(".", ",") for v in rng.uniform(5, 40, N_LINHAS)]
+    df["c4"] = _codigos(rng, N_LINHAS)
+    df["c5"] = [f"{d:02d}/03/2025 {h:02d}:10:00" for d, h in zip(rng.integers(1, 28, N_LINHAS), rng.integers(4, 23, N_LINHAS))]
+    df = df.rename(columns={"c2": "Nome Operadora", "c9": "Passageiros", "c11": "KM",
+                            "c4": "Código Externo Linha", "c5": "Data Hora Início"})
+    return _gravar(tmp_path / "ipk.csv", df)
+
+
+@pytest.fixture
+def arquivo_mco(tmp_path):
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame({
+        "Nome Operadora": rng.choice(["ROSA", "SAO JOAO"], N_LINHAS),
+        "Codigo Externo Linha": _codigos(rng, N_LINHAS),
+        "Nome Linha": rng.choice(["Linha 101", "Linha 102", "Linha 210"], N_LINHAS),
+    })
+    for coluna in mco.COLUNAS_NUMERICAS_MCO:
+        df[coluna] = rng.integers(0, 100, N_LINHAS)
+    df["Inteiras"] = df["Inteiras"].astype(object)
+    df.loc[LINHAS_POR_BLOCO * 5, "Inteiras"] = ""
+    return _gravar(tmp_path / "mco.csv", df)
+
+
+@pytest.fixture
+def arquivo_viabilidade(tmp_path):
+    rng = np.random.default_rng(4)
+    df = pd.DataFrame({f"col{i}": rng.integers(0, 3, N_LINHAS) for i in range(44)})
+    df["col4"] = _codigos(rng, N_LINHAS)
+    df["col28"] = rng.integers(0, 5, N_LINHAS)
+    inicio = pd.Timestamp("2025-03-03") + pd.to_timedelta(rng.integers(0, 7 * 24 * 60, N_LINHAS), unit="min")
+    df["col42"] = inicio.strftime("%d/%m/%Y %H:%M:%S")
+    return _gravar(tmp_path / "viab.csv", df, encoding="latin1")
+
+
+class _Upload:
+    """Arquivo enviado mínimo (nome + bytes), como o UploadedFile do Streamlit."""
+
+    def __init__(self, caminho):
+        self.name = caminho.rsplit("/", 1)[-1]
+        self.file_id = caminho
+        with open(caminho, "rb") as f:
+            self._dados = f.read()
+
+    def getvalue(self):
+        return self._dados
+
+
+def test_km_em_blocos_igual_a_leitura_inteira(arquivo_km, monkeypatch):
+    monkeypatch.setattr(leitura, "ORCAMENTO_LEITURA_MB", 1e9)
+    inteira = km.carregar_viagens(arquivo_km)
+    _ler_em_blocos(monkeypatch)
+    assert_frame_equal(km.carregar_viagens(arquivo_km), inteira)
+    assert {"101", "102", "210"} <= set(inteira["Código Externo Linha"])
+
+
+def test_ipk_em_blocos_igual_a_leitura_inteira(arquivo_ipk, monkeypatch):
+    base, dimensoes, contagens = ipk.carregar_base_ipk.__wrapped__(arquivo_ipk)
+    _ler_em_blocos(monkeypatch)
+    base_blocos, dimensoes_blocos, contagens_blocos = ipk.carregar_base_ipk_streaming(arquivo_ipk)
+    assert_frame_equal(base_blocos, base)
+    assert dimensoes_blocos == dimensoes
+    assert contagens_blocos == contagens
+
+
+def test_mco_em_blocos_igual_a_leitura_inteira(arquivo_mco, monkeypatch):
+    rename_dict, _ = colunas.resolver_colunas(leitura.ler_cabecalho(arquivo_mco, sep=";"), mco.COLUNAS_MCO)
+    inteira = mco.somar_passagens(arquivo_mco, rename_dict)
+    _ler_em_blocos(monkeypatch)
+    assert leitura.excede_orcamento(arquivo_mco, usecols=list(rename_dict), sep=";")
+    assert_frame_equal(mco.somar_passagens(arquivo_mco, rename_dict, em_blocos=True), inteira)
+
+
+def test_viabilidade_em_blocos_igual_a_leitura_inteira(arquivo_viabilidade, tmp_path, monkeypatch):
+    monkeypatch.setattr(leitura, "PASTA_TEMPORARIA", str(tmp_path / "uploads"))
+    monkeypatch.setattr(leitura, "ORCAMENTO_LEITURA_MB", 1e9)
+    inteira = viabilidade.carregar_dados(_Upload(arquivo_viabilidade))
+    _ler_em_blocos(monkeypatch)
+    em_blocos = viabilidade.carregar_dados(_Upload(arquivo_viabilidade))
+    assert_frame_equal(em_blocos, inteira[em_blocos.columns])
+    assert {"101", "102", "210"} <= set(inteira["Código Externo Linha"])
@@ -0,0 +1,43 @@
+import pandas as pd
+import soltura
+
+
+def _registros(sentidos, pontos):
+    n = len(sentidos)
+    return pd.DataFrame({
+        'Empresa': ['ROSA'] * n,
+        'Veículo': ['101'] * n,
+        'Início': pd.date_range('2024-03-04 05:00', periods=n, freq='30min'),
+        'Sentido': sentidos,
+        'Atividade': ['regular'] * n,
+        'Ponto Início': pontos,
+        'Linha_Completa': ['001 - CENTRO'] * n,
+    })
+
+
+def test_linha_do_tempo_sem_saida_da_garagem():
+    df = _registros(['ida', 'volta'], ['terminal', 'centro'])
+    tabela, curva = soltura.linha_do_tempo_veiculos(df)
+    assert tabela.empty
+    assert curva.empty
+    assert list(curva.columns) == ['Minuto', 'Veículos na rua']
+
+
+def test_linha_do_tempo_com_saida_da_garagem():
+    df = _registros(['ocioso', 'ida', 'volta'], ['garagem', 'terminal', 'centro'])
+    tabela, curva = soltura.linha_do_tempo_veiculos(df)
+    assert tabela['Saída da garagem'].tolist() == ['05:00']
+    assert tabela['Primeira viagem comercial'].tolist() == ['05:30']
+    assert tabela['Minutos até a viagem comercial'].tolist() == [30.0]
+    assert curva['Veículos na rua'].max() == 1
+
+
+def test_chave_registro_exata():
+    df = pd.DataFrame({
+        'Empresa': ['ROSA', 'ROSA', 'ROSA', 'SAO JOAO'],
+        'Linha': ['001', '001', '002', '001'],
+        'Veículo': ['101', '101', '101', '101'],
+        'Início': pd.to_datetime(['2024-03-04 05:00', '2024-03-04 05:00', '2024-03-04 05:00', '2024-03-04 05:00']),
+    })
+    chave = soltura.chave_registro(df)
+    assert pd.Series(chave).duplicated().tolist() == [False, True, False, False]
@@ -1,9 +1,425 @@
 import pandas as pd
 import streamlit as st
 import numpy as np
+from pandas.tseries.api import guess_datetime_format
 import plotly.express as px
 import plotly.graph_objects as go
+import armazem
+import dados_compartilhados
+import desempenho
+import graficos
+import leitura
+import tarefas
+
+# ---------------- Gráficos (em cache pelos dados agregados) ----------------
+@st.cache_data(show_spinner=False)
+def grafico_curvas(df_plot):
+    """Curvas de demanda por hora (uma por tipo de dia), com as séries longas reduzidas."""
+    dados = graficos.reduzir_serie(df_plot, 'Hora', 'Passageiros Agregados', grupo='Tipo de Dia')
+    return px.line(
+        dados,
+        x='Hora',
+        y='Passageiros Agregados',
+        color='Tipo de Dia',
+        title='Demanda de Passageiros (Soma Total na Hora) por Hora',
+        template='plotly_white',
+        labels={'Passageiros Agregados': 'Valor de Passageiros (Soma Total na Hora)'}
+    )
+
+@st.cache_data(show_spinner=False)
+def grafico_detalhe_pico(df_pico_detalhe, agg_name, titulo):
+    """Barras por linha no horário de pico; as linhas menores são somadas em "Outras"."""
+    coluna_valor = f'{agg_name} de Passageiros'
+    dados = graficos.top_n_com_outras(df_pico_detalhe, 'Código Externo Linha', coluna_valor)
+    fig = px.bar(
+        dados,
+        x='Código Externo Linha',
+        y=coluna_valor,
+        title=titulo,
+        labels={'Código Externo Linha': 'Linha', coluna_valor: f'{agg_name} de Pass.'},
+        template='plotly_white',
+        color='Código Externo Linha',
+    )
+    fig.update_layout(showlegend=False, margin=dict(t=50, b=0, l=0, r=0))
+    return fig
+
+# ---------------- Picos em janela móvel ----------------
+# A demanda é acumulada em uma grade de 5 minutos por dia da semana (uma passada pelas
+# linhas). Intervalos maiores (15, 30 min) somam blocos da grade, e a janela móvel de
+# 60 minutos sai de somas acumuladas sobre a grade: o custo depende do número de
+# intervalos, não do número de registros.
+MINUTOS_GRADE = 5
+TAMANHOS_INTERVALO = [5, 15, 30]
+JANELA_PICO_MIN = 60
+DIAS_SEMANA = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+NOME_DIA_UTIL = 'Dia Útil (Média da Soma)'
+
+def grade_demanda(df):
+    """Matriz 7 x 288: passageiros por dia da semana e intervalo de 5 minutos."""
+    data_hora = df['Data Hora Início']
+    intervalo = (data_hora.dt.hour * 60 + data_hora.dt.minute).to_numpy() // MINUTOS_GRADE
+    n_intervalos = 24 * 60 // MINUTOS_GRADE
+    posicao = data_hora.dt.dayofweek.to_numpy() * n_intervalos + intervalo
+    soma = np.bincount(posicao, weights=df['Passageiros'].to_numpy(dtype=float), minlength=7 * n_intervalos)
+    return soma.reshape(7, n_intervalos)
+
+def demanda_por_tipo_dia(grade, minutos):
+    """
+    Demanda por intervalo de `minutos` para Dia Útil (média das somas de Seg a Sex com dados),
+    Sábado e Domingo, no mesmo formato da tabela por hora.
+    """
+    por_intervalo = grade.reshape(7, -1, minutos // MINUTOS_GRADE).sum(axis=2)
+    uteis = por_intervalo[:5][por_intervalo[:5].sum(axis=1) > 0]
+    return {
+        NOME_DIA_UTIL: uteis.mean(axis=0) if len(uteis) else np.zeros(por_intervalo.shape[1]),
+        'Sábado': por_intervalo[5],
+        'Domingo': por_intervalo[6],
+    }
+
+def pico_janela_movel(demanda, minutos, janela=JANELA_PICO_MIN):
+    """Início e total da janela de `janela` minutos com mais passageiros (somas acumuladas)."""
+    k = janela // minutos
+    acumulado = np.concatenate([[0.0], np.cumsum(demanda)])
+    somas = acumulado[k:] - acumulado[:-k]
+    i = int(np.argmax(somas))
+    return i * minutos, somas[i]
+
+def _hhmm(minutos_do_dia):
+    return f"{minutos_do_dia // 60:02d}:{minutos_do_dia % 60:02d}"
+
+def tabela_picos_janela(grade, minutos):
+    """Uma linha por tipo de dia com o início, o fim e o total da janela de pico de 60 minutos."""
+    linhas = []
+    for tipo, demanda in demanda_por_tipo_dia(grade, minutos).items():
+        if demanda.sum() <= 0:
+            linhas.append({'Tipo de Dia': tipo, 'Início do Pico': 'N/A', 'Fim do Pico': 'N/A', 'Passageiros na Janela': 0.0})
+            continue
+        inicio, total = pico_janela_movel(demanda, minutos)
+        linhas.append({
+            'Tipo de Dia': tipo,
+            'Início do Pico': _hhmm(inicio),
+            'Fim do Pico': _hhmm((inicio + JANELA_PICO_MIN) % (24 * 60)),
+            'Passageiros na Janela': round(float(total), 2),
+        })
+    return pd.DataFrame(linhas)
+
+@st.cache_data(show_spinner=False)
+def grafico_demanda_intervalos(demanda_intervalos, minutos, picos):
+    """Curvas de demanda por intervalo com a janela de pico de cada tipo de dia destacada."""
+    fig = px.line(
+        demanda_intervalos,
+        x='Horário',
+        y='Passageiros',
+        color='Tipo de Dia',
+        title=f'Demanda por Intervalo de {minutos} min',
+        template='plotly_white'
+    )
+    for _, pico in picos[picos['Início do Pico'] != 'N/A'].iterrows():
+        fim = pico['Fim do Pico'] if pico['Fim do Pico'] > pico['Início do Pico'] else demanda_intervalos['Horário'].iloc[-1]
+        fig.add_vrect(x0=pico['Início do Pico'], x1=fim, opacity=0.08, line_width=0,
+                      annotation_text=f"Pico {pico['Tipo de Dia'].split(' ')[0]}", annotation_position="top left")
+    return fig
+
+# ---------------- Leitura e pré-processamento ----------------
+# Índices das colunas usadas (base 0)
+COLUNA_CODIGO_LINHA = 4
+COLUNA_PASSAGEIROS = 28
+COLUNA_DATA_HORA = 42
+
+# Nomes dos dias da semana para as colunas
+NOMES_DIAS = {
+    0: 'Segunda', 1: 'Terça', 2: 'Quarta', 3: 'Quinta', 
+    4: 'Sexta', 5: 'Sábado', 6: 'Domingo'
+}
+DIAS_UTEIS_NUM = [0, 1, 2, 3, 4]
+
+# A leitura roda como tarefa em segundo plano (tarefas.py): sem widgets aqui dentro,
+# os erros são levantados e exibidos pelo main.
+def carregar_dados(uploaded_file):
+    """Carrega o arquivo (CSV ou Excel) e faz o pré-processamento inicial."""
+    # 1. Detectar o tipo de arquivo e carregar
+    tarefas.informar_progresso(0.1, "lendo o arquivo")
+    file_extension = uploaded_file.name.split('.')[-1].lower()
+
+    if file_extension == 'csv':
+        if leitura.excede_orcamento(uploaded_file, sep=';', encodings=('latin1',)):
+            return carregar_dados_em_blocos(uploaded_file)
+        tipos = tipos_colunas(colunas_importantes(leitura.ler_cabecalho(uploaded_file, sep=';', encodings=('latin1',))))
+        df = pd.read_csv(leitura.em_disco(uploaded_file), sep=';', encoding='latin1', memory_map=True, dtype=tipos)
+    elif file_extension in ['xlsx', 'xls']:
+        df = pd.read_excel(leitura.em_disco(uploaded_file))
+    else:
+        raise ValueError("Formato de arquivo não suportado. Use CSV, XLSX ou XLS.")
+
+    # 2. Renomeia e prepara colunas
+    tarefas.informar_progresso(0.7, "pré-processando")
+    df = preparar_dados(df.rename(columns=colunas_importantes(df.columns)))
+
+    # Ordena por linha (estável): cada linha vira um bloco contíguo (ver indice_linhas)
+    tarefas.informar_progresso(0.9, "indexando as linhas")
+    return finalizar_dados(df)
+
+def carregar_dados_em_blocos(uploaded_file):
+    """
+    Como carregar_dados, para CSVs acima do orçamento de memória: lê só as três
+    colunas usadas, em blocos, pré-processando cada bloco (mesmo resultado).
+    """
+    cabecalho = leitura.ler_cabecalho(uploaded_file, sep=';', encodings=('latin1',))
+    renomear = colunas_importantes(cabecalho)
+    formato = {}  # formato da data, inferido do primeiro valor (como na leitura inteira)
+
+    def agregar(bloco):
+        bloco = bloco.rename(columns=renomear)
+        if 'data' not in formato:
+            for valor in bloco['Data Hora Início']:
+                # Vazios são pulados como no pd.to_datetime; o primeiro valor preenchido define o formato
+                if pd.isna(valor) or valor in ('', 'now', 'today', 'NaT', 'nat', 'NAT', 'nan', 'NaN', 'NAN'):
+                    continue
+                formato['data'] = guess_datetime_format(valor) if type(valor) is str else None
+                break
+        return preparar_dados(bloco, formato.get('data'))
+
+    def progresso(linhas_lidas, fracao):
+        tarefas.informar_progresso(0.1 + 0.8 * fracao, f"{linhas_lidas:,} linhas lidas (em blocos)".replace(",", "."))
+
+    df = leitura.agregar_em_blocos(
+        uploaded_file, agregar, lambda parciais: pd.concat(parciais),
+        usecols=list(renomear), dtype=tipos_colunas(renomear), progresso=progresso, sep=';', encodings=('latin1',)
+    )
+    tarefas.informar_progresso(0.9, "indexando as linhas")
+    return finalizar_dados(df)
+
+def colunas_importantes(colunas_arquivo):
+    """Renomeação das colunas E (4), AC (28) e AQ (42) pela posição."""
+    max_col_index = max(COLUNA_CODIGO_LINHA, COLUNA_PASSAGEIROS, COLUNA_DATA_HORA)
+    if len(colunas_arquivo) <= max_col_index:
+        raise ValueError(f"O arquivo tem apenas {len(colunas_arquivo)} colunas. Certifique-se de que ele tem as colunas E (4), AC (28) e AQ (42).")
+
+    return {
+        colunas_arquivo[COLUNA_CODIGO_LINHA]: 'Código Externo Linha',
+        colunas_arquivo[COLUNA_DATA_HORA]: 'Data Hora Início',
+        colunas_arquivo[COLUNA_PASSAGEIROS]: 'Passageiros'
+    }
+
+def tipos_colunas(renomear):
+    """
+    Código da linha lido como texto: com um código em branco, o pandas leria a coluna
+    como número decimal ("101.0") só nos blocos em que o branco aparece.
+    """
+    return {coluna: str for coluna, nome in renomear.items() if nome == 'Código Externo Linha'}
+
+def preparar_dados(df, formato_data=None):
+    """Pré-processamento linha a linha (do arquivo inteiro ou de um bloco)."""
+    df['Data Hora Início'] = pd.to_datetime(df['Data Hora Início'], errors='coerce', format=formato_data)
+    df = df.dropna(subset=['Data Hora Início'])
+
+    df['Hora'] = df['Data Hora Início'].dt.hour.astype(str).str.zfill(2) + ':00'
+    df['Dia da Semana'] = df['Data Hora Início'].dt.dayofweek
+
+    df['Passageiros'] = pd.to_numeric(df['Passageiros'], errors='coerce').fillna(0).astype(int)
+
+    # Cria a coluna granular do dia da semana (Segunda, Terça, etc.)
+    df['Dia Nome'] = df['Data Hora Início'].dt.dayofweek.map(NOMES_DIAS)
+    return df
+
+def finalizar_dados(df):
+    """Código da linha como texto (depois de juntar os blocos, para o tipo ser o do arquivo todo) e ordenação por linha."""
+    df['Código Externo Linha'] = df['Código Externo Linha'].astype(str)
+    return df.sort_values('Código Externo Linha', kind='stable', ignore_index=True)
+
+# ---------------- Índice de linhas ----------------
+# A base carregada fica ordenada por linha; o índice guarda onde começa e termina o
+# bloco de cada linha, e qualquer seleção é montada juntando esses blocos, sem
+# varrer a base inteira a cada troca de linhas.
+@st.cache_data(show_spinner=False)
+def indice_linhas(_df, chave):
+    """
+    Linha -> posições [Início, Fim) do bloco da linha na base ordenada.
+    chave identifica a base (o DataFrame em si não é hasheado).
+    """
+    codigos = _df['Código Externo Linha'].to_numpy()
+    if len(codigos) == 0:
+        return pd.DataFrame({'Início': [], 'Fim': []}, index=pd.Index([], name='Código Externo Linha'), dtype='int64')
+    inicios = np.flatnonzero(np.r_[True, codigos[1:] != codigos[:-1]])
+    fins = np.r_[inicios[1:], len(codigos)]
+    return pd.DataFrame({'Início': inicios, 'Fim': fins}, index=pd.Index(codigos[inicios], name='Código Externo Linha'))
+
+def selecionar_linhas(df, indice, linhas):
+    """Registros das linhas escolhidas, montados pelos blocos do índice (na ordem da base)."""
+    blocos = indice.loc[indice.index.isin(linhas)]
+    if len(blocos) == 1:
+        return df.iloc[blocos['Início'].iloc[0]:blocos['Fim'].iloc[0]]
+    posicoes = np.concatenate([np.arange(i, f) for i, f in zip(blocos['Início'], blocos['Fim'])] or [np.arange(0)])
+    return df.take(posicoes)
+
+@st.cache_data(show_spinner=False)
+def grade_selecao(_df, _indice, chave_selecao):
+    """
+    Grade de demanda (grade_demanda) das linhas escolhidas. chave_selecao = (base, linhas):
+    voltar a uma seleção já vista na barra lateral não passa de novo pelos registros.
+    """
+    return grade_demanda(selecionar_linhas(_df, _indice, list(chave_selecao[1])))
+
+# ---------------- Pré-cálculo por linha ----------------
+# Logo após a leitura, uma tarefa em segundo plano agrega a base inteira por linha,
+# hora e dia da semana (uma passada agrupada) e guarda no registro compartilhado duas
+# tabelas compactas: a demanda por hora de cada linha e o resumo por linha (picos e
+# totais diários). Qualquer seleção passa a ser montada somando as tabelas das linhas
+# escolhidas, sem voltar aos registros, e o ranking da rede sai do resumo.
+TIPOS_PICO = [NOME_DIA_UTIL, 'Sábado', 'Domingo']
+ROTULOS_PICO = {NOME_DIA_UTIL: 'Dia Útil', 'Sábado': 'Sábado', 'Domingo': 'Domingo'}
+COLUNAS_RESUMO_DIARIO = ['Dia Útil (Média do Total Diário)', 'Sábado (Total Diário)', 'Domingo (Total Diário)']
+
+def media_dias_uteis(tabela, nivel=None):
+    """
+    Média das colunas de Seg a Sex presentes (com algum registro, não NaN). Com nivel,
+    a presença é avaliada por grupo do índice (ex.: por linha), como na tabela de cada linha.
+    """
+    uteis = [d for d in DIAS_SEMANA[:5] if d in tabela.columns]
+    if not uteis:
+        return pd.Series(0.0, index=tabela.index)
+    presentes = tabela[uteis].notna()
+    if nivel is not None:
+        presentes = presentes.groupby(level=nivel).transform('any')
+    n = presentes.sum(axis=1)
+    return (tabela[uteis].fillna(0).sum(axis=1) / n.where(n > 0)).fillna(0).round(2)
+
+def precalcular_linhas(df):
+    """
+    Tarefa: (demanda por linha e hora, resumo por linha) para todas as linhas da base.
+    horas: índice (linha, Hora), uma coluna por dia (NaN = sem registros) + Dia Útil.
+    resumo: índice linha, hora e valor do pico por tipo de dia e totais diários.
+    """
+    linha = 'Código Externo Linha'
+
+    tarefas.informar_progresso(0.1, "agregando por linha e hora")
+    horas = df.groupby([linha, 'Hora', 'Dia Nome'])['Passageiros'].sum().unstack('Dia Nome')
+    horas = horas[[d for d in DIAS_SEMANA if d in horas.columns]].astype(float).rename_axis(columns=None)
+    horas[NOME_DIA_UTIL] = media_dias_uteis(horas, nivel=linha)
+
+    tarefas.informar_progresso(0.5, "identificando os picos")
+    resumo = pd.DataFrame(index=horas.index.unique(level=linha))
+    for tipo in TIPOS_PICO:
+        valores = horas[tipo].fillna(0) if tipo in horas.columns else pd.Series(0.0, index=horas.index)
+        maximo = valores.groupby(level=linha).max()
+        hora = valores.groupby(level=linha).idxmax().str[1]
+        resumo[f'Hora do Pico - {ROTULOS_PICO[tipo]}'] = hora.where(maximo > 0, 'N/A')
+        resumo[f'Pico - {ROTULOS_PICO[tipo]}'] = maximo
+
+    tarefas.informar_progresso(0.8, "totais diários")
+    uteis = df[df['Dia Nome'].isin(DIAS_SEMANA[:5])]
+    totais_uteis = uteis.groupby([uteis[linha], uteis['Data Hora Início'].dt.date])['Passageiros'].sum()
+    resumo[COLUNAS_RESUMO_DIARIO[0]] = totais_uteis.groupby(level=0).mean().round(2).reindex(resumo.index, fill_value=0.0)
+    for dia, coluna in zip(['Sábado', 'Domingo'], COLUNAS_RESUMO_DIARIO[1:]):
+        resumo[coluna] = df[df['Dia Nome'] == dia].groupby(linha)['Passageiros'].sum().reindex(resumo.index, fill_value=0)
+    return horas, resumo
+
+def passageiros_por_dia(df):
+    """Passageiros por dia, hora e linha (grão guardado no armazém histórico)."""
+    return (
+        df.groupby([df['Data Hora Início'].dt.normalize().rename('Data'), 'Hora', 'Código Externo Linha'])['Passageiros']
+        .sum()
+        .reset_index()
+    )
+
+def tarefa_por_linha(chave):
+    """Chave da tarefa de pré-cálculo por linha da base `chave`."""
+    return f"{chave}_por_linha"
+
+def resultados_por_linha(chave, df):
+    """
+    (horas, resumo) pré-calculados da base `chave`, ou None enquanto a tarefa roda.
+    A primeira chamada inicia a tarefa; a página não espera por ela (tarefas.acompanhar).
+    Se a tarefa falhou, a exceção dela é levantada aqui e ela não é enviada de novo.
+    """
+    chave_horas, chave_resumo = f"{chave}_horas", f"{chave}_resumo"
+    horas = dados_compartilhados.obter(chave_horas)
+    resumo = dados_compartilhados.obter(chave_resumo)
+    if horas is not None and resumo is not None:
+        return horas, resumo
+
+    chave_tarefa = tarefa_por_linha(chave)
+    if tarefas.estado(chave_tarefa) == 'erro':
+        tarefas.aguardar(chave_tarefa)  # levanta a exceção da tarefa
+
+    # Verificação e envio sob a trava do registro: se outra sessão acabou de publicar, nada é recalculado
+    if dados_compartilhados.submeter_se_ausente(chave_tarefa, precalcular_linhas, df, chaves=[chave_horas, chave_resumo]):
+        horas = dados_compartilhados.obter(chave_horas)
+        resumo = dados_compartilhados.obter(chave_resumo)
+        return (horas, resumo) if horas is not None and resumo is not None else None
+
+    if tarefas.estado(chave_tarefa) == 'concluida':
+        try:
+            horas, resumo = tarefas.aguardar(chave_tarefa)
+        except KeyError:
+            return None  # publicada por outra sessão nesse meio-tempo: aparece na próxima execução
+        dados_compartilhados.publicar(chave_horas, horas)
+        dados_compartilhados.publicar(chave_resumo, resumo, tarefa=chave_tarefa)
+        return horas, resumo
+    return None
+
+def tabela_por_hora(horas, linhas):
+    """Tabela por hora de um grupo de linhas (mesmo formato do cálculo a partir dos registros)."""
+    dias = [d for d in DIAS_SEMANA if d in horas.columns]
+    selecao = horas.loc[horas.index.get_level_values(0).isin(linhas), dias]
+    tabela = selecao.groupby(level='Hora').sum(min_count=1).dropna(axis=1, how='all').fillna(0).round(2)
+    tabela[NOME_DIA_UTIL] = media_dias_uteis(tabela)
+    return tabela.reset_index()
+
+def demanda_na_hora(horas, linhas, hora, dias):
+    """Por linha, na hora dada: média das somas dos dias (Dia Útil) ou a soma do dia (Sábado/Domingo)."""
+    na_hora = horas.xs(hora, level='Hora')
+    na_hora = na_hora.loc[na_hora.index.isin(linhas), [d for d in dias if d in na_hora.columns]]
+    if len(dias) > 1:
+        return na_hora.mean(axis=1).dropna()
+    return na_hora.iloc[:, 0].dropna().astype('int64')
+
+@st.fragment
+def exibir_ranking_picos(resumo):
+    """Ranking da rede (fragmento): linhas com os maiores picos por hora do tipo de dia escolhido."""
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        tipo = st.radio("Tipo de dia:", TIPOS_PICO, format_func=ROTULOS_PICO.get, horizontal=True, key="viab_ranking_tipo")
+    with col2:
+        quantidade = st.number_input(
+            "Linhas:", min_value=1, max_value=max(len(resumo), 1), value=min(10, max(len(resumo), 1)), key="viab_ranking_qtd"
+        )
+
+    rotulo = ROTULOS_PICO[tipo]
+    ranking = resumo[resumo[f'Pico - {rotulo}'] > 0].nlargest(int(quantidade), f'Pico - {rotulo}')
+    if ranking.empty:
+        st.caption(f"Nenhuma linha com passageiros em {rotulo}.")
+        return
+
+    ranking = ranking[[f'Hora do Pico - {rotulo}', f'Pico - {rotulo}']].rename_axis('Linha').reset_index()
+    ranking[f'Pico - {rotulo}'] = np.ceil(ranking[f'Pico - {rotulo}']).astype(int)
+    st.dataframe(ranking, use_container_width=True, hide_index=True)
+
+@st.fragment
+def exibir_pico_janela_movel(grade):
+    """
+    Seção do pico em janela móvel (fragmento): trocar o tamanho do intervalo
+    reexecuta só esta seção, a partir da grade já calculada.
+    """
+    minutos_intervalo = st.radio(
+        "Tamanho do intervalo (minutos):", TAMANHOS_INTERVALO, index=1, horizontal=True, key="viab_intervalo"
+    )
 
+    picos_janela = tabela_picos_janela(grade, minutos_intervalo)
+    demanda = demanda_por_tipo_dia(grade, minutos_intervalo)
+    horarios = [_hhmm(m) for m in range(0, 24 * 60, minutos_intervalo)]
+    demanda_intervalos = pd.concat(
+        [pd.DataFrame({'Horário': horarios, 'Passageiros': valores, 'Tipo de Dia': tipo}) for tipo, valores in demanda.items()],
+        ignore_index=True
+    )
+
+    picos_janela_exib = picos_janela.copy()
+    picos_janela_exib['Passageiros na Janela'] = np.ceil(picos_janela_exib['Passageiros na Janela']).astype(int)
+    st.dataframe(picos_janela_exib, use_container_width=True, hide_index=True)
+
+    st.plotly_chart(grafico_demanda_intervalos(demanda_intervalos, minutos_intervalo, picos_janela), use_container_width=True)
+
+@desempenho.instrumentar('viabilidade')
 def main():
     # Configuração da página do Streamlit
     st.set_page_config(
@@ -11,18 +427,6 @@ def main():
         layout="wide"
     )
 
-    # --- Índices das Colunas (Base 0) ---
-    COLUNA_CODIGO_LINHA = 4
-    COLUNA_PASSAGEIROS = 28
-    COLUNA_DATA_HORA = 42
-    # ---------------------------------------------
-
-    # Nomes dos dias da semana para as colunas
-    NOMES_DIAS = {
-        0: 'Segunda', 1: 'Terça', 2: 'Quarta', 3: 'Quinta', 
-        4: 'Sexta', 5: 'Sábado', 6: 'Domingo'
-    }
-    DIAS_UTEIS_NUM = [0, 1, 2, 3, 4]
 
     def get_agregacao_info(dia_nome):
         """
@@ -33,63 +437,10 @@ def main():
         # A agregação primária agora é sempre SOMA (total de passageiros na hora)
         return 'sum', 'Soma', 'passageiros (total na hora)'
 
-    # @st.cache_data removido da leitura para evitar MemoryError em arquivos grandes.
-    def carregar_dados(uploaded_file):
-        """Carrega o arquivo (CSV ou Excel) e faz o pré-processamento inicial."""
-        with st.spinner('Carregando e pré-processando a planilha...'):
-            try:
-                # 1. Detectar o tipo de arquivo e carregar
-                file_extension = uploaded_file.name.split('.')[-1].lower()
-                
-                if file_extension == 'csv':
-                    df = pd.read_csv(uploaded_file, sep=';', encoding='latin1')
-                elif file_extension in ['xlsx', 'xls']:
-                    df = pd.read_excel(uploaded_file)
-                else:
-                    st.error("Formato de arquivo não suportado. Use CSV, XLSX ou XLS.")
-                    return pd.DataFrame()
-
-                # 2. Renomeia e prepara colunas
-                max_col_index = max(COLUNA_CODIGO_LINHA, COLUNA_PASSAGEIROS, COLUNA_DATA_HORA)
-                if len(df.columns) <= max_col_index:
-                    st.error(f"Erro: O arquivo tem apenas {len(df.columns)} colunas. Certifique-se de que ele tem as colunas E (4), AC (28) e AQ (42).")
-                    return pd.DataFrame()
-                    
-                colunas_importantes = {
-                    df.columns[COLUNA_CODIGO_LINHA]: 'Código Externo Linha',
-                    df.columns[COLUNA_DATA_HORA]: 'Data Hora Início',
-                    df.columns[COLUNA_PASSAGEIROS]: 'Passageiros'
-                }
-                
-                df = df.rename(columns=colunas_importantes)
-                
-                # Pré-processamento
-                df['Código Externo Linha'] = df['Código Externo Linha'].astype(str)
-                df['Data Hora Início'] = pd.to_datetime(df['Data Hora Início'], errors='coerce')
-                df = df.dropna(subset=['Data Hora Início'])
-                
-                df['Hora'] = df['Data Hora Início'].dt.hour.astype(str).str.zfill(2) + ':00'
-                df['Dia da Semana'] = df['Data Hora Início'].dt.dayofweek
-                
-                df['Passageiros'] = pd.to_numeric(df['Passageiros'], errors='coerce').fillna(0).astype(int)
-                
-                # Cria a coluna granular do dia da semana (Segunda, Terça, etc.)
-                df['Dia Nome'] = df['Data Hora Início'].dt.dayofweek.map(NOMES_DIAS)
-                
-                return df
-
-            except Exception as e:
-                st.error(f"Erro ao carregar ou processar o arquivo: {e}")
-                return pd.DataFrame()
 
 
-    @st.cache_data
-    def calcular_pico_agrupado(df_filtrado):
-        """
-        Calcula o horário de pico com agregação granular por dia da semana.
-        ATUALIZADO: Agregação granular é sempre SOMA. Dia Útil é Média da Soma.
-        """
-        
+    def agregar_por_hora(df_filtrado):
+        """Passos 1 e 2 a partir dos registros: tabela por hora (soma por dia) e a média de Dia Útil."""
         # 1. Agregação Granular (Soma para todos os dias)
         
         df_agregado_granular = pd.DataFrame()
@@ -131,6 +482,27 @@ def main():
         else:
             tabela_granular[NOME_COLUNA_DIA_UTIL] = 0
 
+        return tabela_granular, dias_uteis_cols, NOME_COLUNA_DIA_UTIL
+
+    @st.cache_data
+    def calcular_pico_agrupado(_df_bruto, _indice, chave_selecao, _horas=None):
+        """
+        Calcula o horário de pico com agregação granular por dia da semana.
+        ATUALIZADO: Agregação granular é sempre SOMA. Dia Útil é Média da Soma.
+        O cache é pela chave_selecao (base + linhas escolhidas), sem hashear o DataFrame.
+        Com _horas (pré-cálculo por linha), as tabelas saem dele, sem ler os registros;
+        sem ele, os registros das linhas são separados aqui (só quando não há cache).
+        """
+        linhas_grupo = list(chave_selecao[1])
+        df_filtrado = selecionar_linhas(_df_bruto, _indice, linhas_grupo) if _horas is None else None
+
+        if _horas is not None:
+            tabela_granular = tabela_por_hora(_horas, linhas_grupo)
+            NOME_COLUNA_DIA_UTIL = NOME_DIA_UTIL
+            dias_uteis_cols = [NOMES_DIAS[d] for d in DIAS_UTEIS_NUM if NOMES_DIAS[d] in tabela_granular.columns]
+        else:
+            tabela_granular, dias_uteis_cols, NOME_COLUNA_DIA_UTIL = agregar_por_hora(df_filtrado)
+
         # 3. Identifica o horário de pico
         picos = {}
         
@@ -184,27 +556,34 @@ def main():
                 # Ajusta a função de agregação para o detalhe (Será 'sum' para Sáb/Dom)
                 agg_func, agg_name, _ = get_agregacao_info(dia_ref_nome)
 
-                # Filtra o dataframe original pela HORA do pico e pelo TIPO DE DIA
-                df_pico = df_filtrado[
-                    (df_filtrado['Hora'] == hora_pico) & 
-                    (df_filtrado['Dia Nome'].isin(dias_uteis_cols) if tipo_pico == NOME_COLUNA_DIA_UTIL else (df_filtrado['Dia Nome'] == dia_ref_nome))
-                ]
-                
-                # Se for Dia Útil, o detalhe é a média da SOMA de todos os dias úteis.
-                if tipo_pico == NOME_COLUNA_DIA_UTIL:
-                    
-                    # 1. Agrupa por Linha e Dia para ter a SOMA por Dia (Seg a Sex)
-                    df_linha_diaria = df_pico.groupby(['Código Externo Linha', 'Dia Nome'])['Passageiros'].sum().reset_index()
+                if _horas is not None:
+                    # Pré-cálculo: a demanda de cada linha na hora do pico já está em _horas
+                    dias_pico = dias_uteis_cols if tipo_pico == NOME_COLUNA_DIA_UTIL else [dia_ref_nome]
+                    detalhe_linha = demanda_na_hora(_horas, linhas_grupo, hora_pico, dias_pico).rename('Passageiros').reset_index()
+
+                else:
+                    # Filtra o dataframe original pela HORA do pico e pelo TIPO DE DIA
+                    df_pico = df_filtrado[
+                        (df_filtrado['Hora'] == hora_pico) & 
+                        (df_filtrado['Dia Nome'].isin(dias_uteis_cols) if tipo_pico == NOME_COLUNA_DIA_UTIL else (df_filtrado['Dia Nome'] == dia_ref_nome))
+                    ]
                     
-                    # 2. Calcula a Média dessas Somas Diárias
-                    detalhe_linha = df_linha_diaria.groupby('Código Externo Linha')['Passageiros'].mean().reset_index()
+                    # Se for Dia Útil, o detalhe é a média da SOMA de todos os dias úteis.
+                    if tipo_pico == NOME_COLUNA_DIA_UTIL:
+                        
+                        # 1. Agrupa por Linha e Dia para ter a SOMA por Dia (Seg a Sex)
+                        df_linha_diaria = df_pico.groupby(['Código Externo Linha', 'Dia Nome'])['Passageiros'].sum().reset_index()
+                        
+                        # 2. Calcula a Média dessas Somas Diárias
+                        detalhe_linha = df_linha_diaria.groupby('Código Externo Linha')['Passageiros'].mean().reset_index()
                     
+                    else:
+                        # Sábado e Domingo: Agrega com a função definida ('sum')
+                        detalhe_linha = df_pico.groupby('Código Externo Linha')['Passageiros'].agg(agg_func).reset_index()
+
+                if tipo_pico == NOME_COLUNA_DIA_UTIL:
                     agg_name = 'Média' # O nome do agregado no detalhe é 'Média'
                 
-                else:
-                    # Sábado e Domingo: Agrega com a função definida ('sum')
-                    detalhe_linha = df_pico.groupby('Código Externo Linha')['Passageiros'].agg(agg_func).reset_index()
-                
                 detalhe_linha.rename(
                     columns={'Passageiros': f'{agg_name} de Passageiros'}, inplace=True
                 )
@@ -216,6 +595,46 @@ def main():
                 
         return tabela_granular, picos, df_detalhe
 
+    @st.cache_data
+    def resumo_diario_linhas(_df_bruto, _indice, chave_selecao):
+        """
+        Resumo diário por linha a partir dos registros (enquanto o pré-cálculo por linha
+        não termina), na ordem de chave_selecao = (base, linhas).
+        """
+        dados_resumo = []
+
+        for linha in chave_selecao[1]:
+
+            df_linha = selecionar_linhas(_df_bruto, _indice, [linha])
+
+            # ----- DIA ÚTIL (média do total diário) -----
+            df_uteis = df_linha[df_linha['Dia da Semana'].isin(DIAS_UTEIS_NUM)]
+
+            if not df_uteis.empty:
+                totais_diarios_uteis = (
+                    df_uteis
+                    .groupby(df_uteis['Data Hora Início'].dt.date)['Passageiros']
+                    .sum()
+                )
+                media_dia_util = totais_diarios_uteis.mean()
+            else:
+                media_dia_util = 0
+
+            # ----- SÁBADO (total diário) -----
+            total_sabado = df_linha[df_linha['Dia Nome'] == 'Sábado']['Passageiros'].sum()
+
+            # ----- DOMINGO (total diário) -----
+            total_domingo = df_linha[df_linha['Dia Nome'] == 'Domingo']['Passageiros'].sum()
+
+            dados_resumo.append({
+                'Linha': linha,
+                'Dia Útil (Média do Total Diário)': round(media_dia_util, 2),
+                'Sábado (Total Diário)': round(total_sabado, 2),
+                'Domingo (Total Diário)': round(total_domingo, 2)
+            })
+
+        return pd.DataFrame(dados_resumo)
+
 
     # --- Interface Streamlit ---
 
@@ -229,13 +648,36 @@ def main():
     )
 
     if uploaded_file is not None:
-        df_bruto = carregar_dados(uploaded_file)
+        with desempenho.etapa('Leitura e pré-processamento'):
+            # Em segundo plano: mexer nos widgets durante a leitura não a reinicia.
+            # A base é compartilhada entre as sessões que enviarem o mesmo arquivo.
+            chave = tarefas.chave_tarefa('viabilidade', uploaded_file)
+            try:
+                df_bruto = dados_compartilhados.carregar(chave, carregar_dados, uploaded_file, texto='Carregando e pré-processando a planilha...')
+            except Exception as e:
+                st.error(f"Erro ao carregar ou processar o arquivo: {e}")
+                df_bruto = pd.DataFrame()
         
         if not df_bruto.empty:
             
             st.sidebar.header("Passo 2: Selecionar Linha(s)")
             
-            linhas_disponiveis = sorted(df_bruto['Código Externo Linha'].unique().tolist())
+            # Índice linha -> bloco de posições na base ordenada (calculado uma vez por base)
+            with desempenho.etapa('Índice de linhas'):
+                indice = indice_linhas(df_bruto, chave)
+            linhas_disponiveis = indice.index.tolist()
+
+            # Pré-cálculo de todas as linhas em segundo plano (None enquanto não termina;
+            # se falhar, as análises seguem a partir dos registros)
+            with desempenho.etapa('Pré-cálculo por linha'):
+                erro_por_linha = None
+                try:
+                    horas_linhas, resumo_linhas = resultados_por_linha(chave, df_bruto) or (None, None)
+                except Exception as e:
+                    erro_por_linha = e
+                    horas_linhas = resumo_linhas = None
+            if erro_por_linha is not None:
+                st.warning(f"Falha no pré-cálculo de todas as linhas: {erro_por_linha}. As análises usam os registros da base.")
             
             linhas_selecionadas = st.sidebar.multiselect(
                 "Selecione o(s) Código(s) Externo(s) da(s) Linha(s):",
@@ -243,49 +685,38 @@ def main():
                 default=linhas_disponiveis[:min(3, len(linhas_disponiveis))]
             )
 
+            # Armazém histórico: passageiros por dia, hora e linha da base inteira
+            armazem.exibir_guardar('viabilidade', lambda: passageiros_por_dia(df_bruto), uploaded_file)
+
+            with st.expander("🏆 Ranking de linhas por pico (toda a rede)"):
+                if resumo_linhas is not None:
+                    exibir_ranking_picos(resumo_linhas)
+                elif erro_por_linha is not None:
+                    st.caption("Ranking indisponível: o pré-cálculo de todas as linhas falhou.")
+                else:
+                    # Só a barra é atualizada enquanto o pré-cálculo roda; ao terminar, a página é reexecutada
+                    tarefas.acompanhar(tarefa_por_linha(chave), "⏳ Pré-cálculo de todas as linhas")
+
             if linhas_selecionadas:
                 
-                df_filtrado = df_bruto[df_bruto['Código Externo Linha'].isin(linhas_selecionadas)]
-                
+                # Tabelas e grade ficam em cache por (base, linhas): trocar a seleção na barra
+                # lateral para uma já vista não volta aos registros
+                chave_selecao = (chave, tuple(sorted(linhas_selecionadas)))
+
                 st.subheader(f"Análise de Grupo para: **{', '.join(linhas_selecionadas)}**")
                 
-                tabela_resultados, picos, df_detalhe_linhas = calcular_pico_agrupado(df_filtrado.copy())
+                with desempenho.etapa('Cálculo de picos'):
+                    tabela_resultados, picos, df_detalhe_linhas = calcular_pico_agrupado(
+                        df_bruto, indice, chave_selecao, horas_linhas
+                    )
 
             # ================= TABELA RESUMO DIÁRIO POR LINHA =================
 
-                dados_resumo = []
-
-                for linha in linhas_selecionadas:
-
-                    df_linha = df_filtrado[df_filtrado['Código Externo Linha'] == linha]
-
-                    # ----- DIA ÚTIL (média do total diário) -----
-                    df_uteis = df_linha[df_linha['Dia da Semana'].isin(DIAS_UTEIS_NUM)]
-
-                    if not df_uteis.empty:
-                        totais_diarios_uteis = (
-                            df_uteis
-                            .groupby(df_uteis['Data Hora Início'].dt.date)['Passageiros']
-                            .sum()
-                        )
-                        media_dia_util = totais_diarios_uteis.mean()
+                with desempenho.etapa('Resumo diário por linha'):
+                    if resumo_linhas is not None:
+                        df_resumo_linhas = resumo_linhas.loc[linhas_selecionadas, COLUNAS_RESUMO_DIARIO].rename_axis('Linha').reset_index()
                     else:
-                        media_dia_util = 0
-
-                    # ----- SÁBADO (total diário) -----
-                    total_sabado = df_linha[df_linha['Dia Nome'] == 'Sábado']['Passageiros'].sum()
-
-                    # ----- DOMINGO (total diário) -----
-                    total_domingo = df_linha[df_linha['Dia Nome'] == 'Domingo']['Passageiros'].sum()
-
-                    dados_resumo.append({
-                        'Linha': linha,
-                        'Dia Útil (Média do Total Diário)': round(media_dia_util, 2),
-                        'Sábado (Total Diário)': round(total_sabado, 2),
-                        'Domingo (Total Diário)': round(total_domingo, 2)
-                    })
-
-                df_resumo_linhas = pd.DataFrame(dados_resumo)
+                        df_resumo_linhas = resumo_diario_linhas(df_bruto, indice, (chave, tuple(linhas_selecionadas)))
                 # =================================================================
 
                 if tabela_resultados is not None:
@@ -309,52 +740,44 @@ def main():
                     cols_para_ceil = [c for c in tabela_resultados_exibicao.columns if c != 'Hora']
                     tabela_resultados_exibicao[cols_para_ceil] = np.ceil(tabela_resultados_exibicao[cols_para_ceil])
 
-                    st.dataframe(tabela_resultados_exibicao, use_container_width=True, hide_index=True)
+                    with desempenho.etapa('Tabelas'):
+                        st.dataframe(tabela_resultados_exibicao, use_container_width=True, hide_index=True)
                     
                     # --- GRÁFICO GERAL ---
                     # Os dados dos gráficos NÃO são arredondados para cima para manter a precisão das curvas
-                    df_plot = tabela_resultados.melt(
-                        id_vars='Hora', 
-                        # Colunas de dias úteis e a média da soma
-                        value_vars=[c for c in tabela_resultados.columns if c not in ['Hora', 'Sábado', 'Domingo']], 
-                        var_name='Tipo de Dia', 
-                        value_name='Passageiros Agregados'
-                    )
+                    with desempenho.etapa('Gráficos (Plotly)'):
+                        df_plot = tabela_resultados.melt(
+                            id_vars='Hora', 
+                            # Colunas de dias úteis e a média da soma
+                            value_vars=[c for c in tabela_resultados.columns if c not in ['Hora', 'Sábado', 'Domingo']], 
+                            var_name='Tipo de Dia', 
+                            value_name='Passageiros Agregados'
+                        )
                     
-                    # Adiciona Sábado e Domingo separadamente para o gráfico, se necessário
-                    # AGORA ISSO NÃO VAI DAR ERRO PORQUE GARANTIMOS QUE AS COLUNAS EXISTEM ACIMA
-                    df_plot_fim_semana = tabela_resultados.melt(
-                        id_vars='Hora', 
-                        value_vars=['Sábado', 'Domingo'],
-                        var_name='Tipo de Dia', 
-                        value_name='Passageiros Agregados'
-                    )
+                        # Adiciona Sábado e Domingo separadamente para o gráfico, se necessário
+                        # AGORA ISSO NÃO VAI DAR ERRO PORQUE GARANTIMOS QUE AS COLUNAS EXISTEM ACIMA
+                        df_plot_fim_semana = tabela_resultados.melt(
+                            id_vars='Hora', 
+                            value_vars=['Sábado', 'Domingo'],
+                            var_name='Tipo de Dia', 
+                            value_name='Passageiros Agregados'
+                        )
 
-                    st.markdown("#### Curvas de Demanda dos Dias Úteis e Média Final")
-                    fig_geral = px.line(
-                        df_plot, 
-                        x='Hora', 
-                        y='Passageiros Agregados', 
-                        color='Tipo de Dia',
-                        # TÍTULO ATUALIZADO
-                        title='Demanda de Passageiros (Soma Total na Hora) por Hora', 
-                        template='plotly_white',
-                        # LABEL ATUALIZADO
-                        labels={'Passageiros Agregados': 'Valor de Passageiros (Soma Total na Hora)'}
-                    )
-                    st.plotly_chart(fig_geral, use_container_width=True)
-
-                    st.markdown("#### Curvas de Demanda de Sábado e Domingo (Soma Total)")
-                    fig_fim_semana = px.line(
-                        df_plot_fim_semana, 
-                        x='Hora', 
-                        y='Passageiros Agregados', 
-                        color='Tipo de Dia',
-                        title='Demanda de Passageiros (Soma Total na Hora) por Hora',
-                        template='plotly_white',
-                        labels={'Passageiros Agregados': 'Valor de Passageiros (Soma Total na Hora)'}
-                    )
-                    st.plotly_chart(fig_fim_semana, use_container_width=True)
+                        st.markdown("#### Curvas de Demanda dos Dias Úteis e Média Final")
+                        fig_geral = grafico_curvas(df_plot)
+                        st.plotly_chart(fig_geral, use_container_width=True)
+
+                        st.markdown("#### Curvas de Demanda de Sábado e Domingo (Soma Total)")
+                        fig_fim_semana = grafico_curvas(df_plot_fim_semana)
+                        st.plotly_chart(fig_fim_semana, use_container_width=True)
+
+                    st.markdown("---")
+
+                    # --- PICO EM JANELA MÓVEL DE 60 MINUTOS ---
+                    st.markdown("### ⏱️ Pico em Janela Móvel de 60 Minutos")
+                    with desempenho.etapa('Pico em janela móvel'):
+                        grade = grade_selecao(df_bruto, indice, chave_selecao)
+                        exibir_pico_janela_movel(grade)
 
                     st.markdown("---")
 
@@ -368,55 +791,47 @@ def main():
                     # --- HORÁRIO DE PICO E DETALHAMENTO POR LINHA ---
                     st.markdown("### 2. Horários de Pico e Detalhamento por Linha")
                     
-                    cols_picos = st.columns(3)
+                    with desempenho.etapa('Picos por linha (tabelas e gráficos)'):
+                        cols_picos = st.columns(3)
                     
-                    # Mapeia as chaves de pico para as colunas
-                    NOME_COLUNA_DIA_UTIL = 'Dia Útil (Média da Soma)' # Garantir que o nome é consistente
-                    pico_tipos = [NOME_COLUNA_DIA_UTIL, 'Sábado', 'Domingo']
+                        # Mapeia as chaves de pico para as colunas
+                        NOME_COLUNA_DIA_UTIL = 'Dia Útil (Média da Soma)' # Garantir que o nome é consistente
+                        pico_tipos = [NOME_COLUNA_DIA_UTIL, 'Sábado', 'Domingo']
                     
-                    for i, tipo in enumerate(pico_tipos):
-                        pico_info = picos.get(tipo, {'Hora': 'N/A', 'Valor Pico': 0, 'Agregacao': 'N/A', 'Label': ''})
+                        for i, tipo in enumerate(pico_tipos):
+                            pico_info = picos.get(tipo, {'Hora': 'N/A', 'Valor Pico': 0, 'Agregacao': 'N/A', 'Label': ''})
                         
-                        with cols_picos[i]:
-                            # Ajusta o título para o Dia Útil
-                            display_title = 'Dia Útil' if tipo == NOME_COLUNA_DIA_UTIL else tipo
+                            with cols_picos[i]:
+                                # Ajusta o título para o Dia Útil
+                                display_title = 'Dia Útil' if tipo == NOME_COLUNA_DIA_UTIL else tipo
                             
-                            # --- MODIFICAÇÃO PARA ARREDONDAR PARA CIMA NA EXIBIÇÃO ---
-                            valor_pico_ceil = np.ceil(pico_info['Valor Pico'])
+                                # --- MODIFICAÇÃO PARA ARREDONDAR PARA CIMA NA EXIBIÇÃO ---
+                                valor_pico_ceil = np.ceil(pico_info['Valor Pico'])
                             
-                            cols_picos[i].metric(
-                                f"Pico - {display_title} ({pico_info['Agregacao']})",
-                                f"⏰ {pico_info['Hora']}",
-                                f"{valor_pico_ceil:.0f} {pico_info['Label']}" # Formatado como inteiro (sem casas decimais)
-                            )
-                            # -------------------------------------------------------------------
+                                cols_picos[i].metric(
+                                    f"Pico - {display_title} ({pico_info['Agregacao']})",
+                                    f"⏰ {pico_info['Hora']}",
+                                    f"{valor_pico_ceil:.0f} {pico_info['Label']}" # Formatado como inteiro (sem casas decimais)
+                                )
+                                # -------------------------------------------------------------------
                             
-                            if pico_info['Hora'] != 'N/A' and pico_info['Agregacao'] != 'N/A' and not df_detalhe_linhas.empty:
+                                if pico_info['Hora'] != 'N/A' and pico_info['Agregacao'] != 'N/A' and not df_detalhe_linhas.empty:
                                 
-                                agg_name = pico_info['Agregacao']
-                                st.markdown(f"**{agg_name} de passageiros por linha em {pico_info['Hora']}**")
+                                    agg_name = pico_info['Agregacao']
+                                    st.markdown(f"**{agg_name} de passageiros por linha em {pico_info['Hora']}**")
                                 
-                                df_pico_detalhe_bruto = df_detalhe_linhas[df_detalhe_linhas['Tipo Dia'] == tipo].drop(columns=['Tipo Dia', 'Hora do Pico do Grupo']).sort_values(by=f'{agg_name} de Passageiros', ascending=False)
+                                    df_pico_detalhe_bruto = df_detalhe_linhas[df_detalhe_linhas['Tipo Dia'] == tipo].drop(columns=['Tipo Dia', 'Hora do Pico do Grupo']).sort_values(by=f'{agg_name} de Passageiros', ascending=False)
                                 
-                                # CÓPIA PARA ARREDONDAMENTO P/ CIMA (SOMENTE EXIBIÇÃO)
-                                df_pico_detalhe = df_pico_detalhe_bruto.copy()
-                                df_pico_detalhe[f'{agg_name} de Passageiros'] = np.ceil(df_pico_detalhe[f'{agg_name} de Passageiros']).astype(int)
+                                    # CÓPIA PARA ARREDONDAMENTO P/ CIMA (SOMENTE EXIBIÇÃO)
+                                    df_pico_detalhe = df_pico_detalhe_bruto.copy()
+                                    df_pico_detalhe[f'{agg_name} de Passageiros'] = np.ceil(df_pico_detalhe[f'{agg_name} de Passageiros']).astype(int)
                                 
-                                st.dataframe(df_pico_detalhe, hide_index=True, use_container_width=True)
+                                    st.dataframe(df_pico_detalhe, hide_index=True, use_container_width=True)
                                 
-                                # Gráfico de Detalhe por Linha (Barras)
-                                # Usamos o DataFrame ARREDONDADO para que o gráfico reflita a tabela
-                                fig_detalhe = px.bar(
-                                    df_pico_detalhe,
-                                    x='Código Externo Linha',
-                                    y=f'{agg_name} de Passageiros',
-                                    title=f'{display_title} - {pico_info["Hora"]}',
-                                    labels={'Código Externo Linha': 'Linha', f'{agg_name} de Passageiros': f'{agg_name} de Pass.'},
-                                    template='plotly_white',
-                                    color='Código Externo Linha',
-                                )
-                                fig_detalhe.update_layout(showlegend=False, margin=dict(t=50, b=0, l=0, r=0))
-                                st.plotly_chart(fig_detalhe, use_container_width=True, config={'displayModeBar': False})
+                                    # Gráfico de Detalhe por Linha (Barras)
+                                    # Usamos o DataFrame ARREDONDADO para que o gráfico reflita a tabela
+                                    fig_detalhe = grafico_detalhe_pico(df_pico_detalhe, agg_name, f'{display_title} - {pico_info["Hora"]}')
+                                    st.plotly_chart(fig_detalhe, use_container_width=True, config={'displayModeBar': False})
                                 
             else:
                 st.info("Por favor, selecione pelo menos um Código Externo da Linha no menu lateral para iniciar a análise.")